@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Benchmark comparing the line based and the buffer based tagged readers.
+
+A tagged file with a few scalars and some large real and complex arrays is
+generated and parsed with TaggedReader and TaggedBufferReader. As reference,
+TaggedReader is also timed with converters, which split the data into single
+words before the conversion (as done before bulk conversion was available).
+"""
+from optparse import OptionParser
+import os
+import tempfile
+import time
+import numpy as np
+import valsimp.files.taggedfile as tf
+
+usage = """%prog [options]
+
+Compare parsing times of the tagged readers on a generated file."""
+
+
+def get_cmdlineoptions():
+    """Delivering command line options and arguments."""
+
+    parser = OptionParser(usage=usage)
+    parser.add_option("-n", "--nvalues", dest="nvalues", action="store",
+                      type="int", default=1000000,
+                      help="number of values in each large array "
+                      "(default: 1000000)")
+    parser.add_option("-a", "--narrays", dest="narrays", action="store",
+                      type="int", default=4,
+                      help="number of large arrays (default: 4)")
+    parser.add_option("-r", "--repeat", dest="repeat", action="store",
+                      type="int", default=3,
+                      help="number of repetitions, best time is taken "
+                      "(default: 3)")
+    return parser.parse_args()
+
+def writetestfile(fp, nvalues, narrays):
+    """Writes a tagged file with Fortran like formatting.
+
+    Args:
+        fp: File object to write to.
+        nvalues: Number of values in each large array.
+        narrays: Number of large arrays.
+    """
+    rng = np.random.default_rng(42)
+    for ii in range(10):
+        fp.write("@scalar%d:real:0:\n %24.15E\n" % (ii, rng.normal()))
+    for ii in range(narrays):
+        dtype = "complex" if ii % 2 else "real"
+        nn = 2 * nvalues if ii % 2 else nvalues
+        values = rng.normal(size=nn).reshape(-1, 3)
+        fp.write("@array%d:%s:1:%d\n" % (ii, dtype, nvalues))
+        np.savetxt(fp, values, fmt="%24.15E")
+
+class SplittingConverter:
+    """Wrapper around a converter, which always splits the data into words."""
+
+    def __init__(self, converter):
+        self.converter = converter
+
+    def __call__(self, strvalue):
+        if isinstance(strvalue, bytes):
+            strvalue = str(strvalue, encoding="ascii")
+        return self.converter.convert(strvalue.split())
+
+def timereader(reader, fname, repeat):
+    """Returns the best time needed to read in a file.
+
+    Args:
+        reader: Reader class to use.
+        fname: Name of the file to read.
+        repeat: Nr. of repetitions.
+
+    Returns:
+        Minimal time in seconds.
+    """
+    times = []
+    for ii in range(repeat):
+        start = time.perf_counter()
+        tf.TaggedCollection(reader(fname))
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    """Main routine."""
+
+    options, args = get_cmdlineoptions()
+    # Number of values must be divisible by 3 for the line formatting
+    nvalues = 3 * (options.nvalues // 3)
+    fd, fname = tempfile.mkstemp(suffix=".tag")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            writetestfile(fp, nvalues, options.narrays)
+        print("File size: %.1f MB" % (os.path.getsize(fname) / 1e6))
+        converters = tf.TaggedEntry._CONVERTERS
+        tf.TaggedEntry._CONVERTERS = dict(
+            [ (dtype, SplittingConverter(conv))
+              for dtype, conv in converters.items() ])
+        tsplit = timereader(tf.TaggedReader, fname, options.repeat)
+        tf.TaggedEntry._CONVERTERS = converters
+        print("TaggedReader (split): %8.3f s" % tsplit)
+        tline = timereader(tf.TaggedReader, fname, options.repeat)
+        print("TaggedReader:         %8.3f s  (speedup %4.1f)"
+              % (tline, tsplit / tline))
+        tbuffer = timereader(tf.TaggedBufferReader, fname, options.repeat)
+        print("TaggedBufferReader:   %8.3f s  (speedup %4.1f)"
+              % (tbuffer, tsplit / tbuffer))
+    finally:
+        os.remove(fname)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,7 @@ setup(name="valsimp",
                 "valsimp.io",
                 "valsimp.files",
                 ],
-      scripts=["bin/valsimp", ],
+      scripts=["bin/valsimp", "bin/valsimp-tagconv", ],
       data_files=[("share/doc/valsimp", ["LICENSE",])],
       classifiers=[
         "Programming Language :: Python",
@@ -45,6 +45,6 @@ expected. ValSimP can be also easily extended by the end users to adapt
 the validation procedure to their local environment (e.g. running the
 simulations via a queue system).
 
-Requires Python 3.1 or later and NumPy.
+Requires Python 3.7 or later and NumPy.
 """
      )
@@ -3,6 +3,7 @@
 # See the packages LICENSE file for copyright and licensing conditions.
 ###############################################################################
 """General structures for the ValSimP package."""
+import asyncio
 
 __all__ = [ "STATUS_NOTFINISHED", "STATUS_NOTRUN", "STATUS_OK", "STATUS_FAILED",
             "STATUS_ERROR", "STATUS_INTERRUPTED",
@@ -42,6 +43,14 @@ class Preparator:
         """Cleans up the current test case."""
         raise NotImplementedError
 
+    def dependencies(self):
+        """Returns the files and directories the preparation depends on.
+
+        Returns:
+            List of file and directory names (def.: empty list).
+        """
+        return []
+
 
 class Calculator:
     """Abstract class defining the interface of a calculator."""
@@ -58,6 +67,40 @@ class Calculator:
         """
         raise NotImplementedError
 
+    async def arun(self):
+        """Runs or starts a given calculation without blocking the event loop.
+
+        The default implementation calls run() in a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.run)
+
+    def dependencies(self):
+        """Returns the files and directories the calculation depends on.
+
+        Returns:
+            List of file and directory names (def.: empty list).
+        """
+        return []
+
+    def resources(self):
+        """Returns the resources needed by the calculation.
+
+        Returns:
+            Resources instance (see valsimp.resources) or None if the
+            calculation needs the default resources (one core).
+        """
+        return None
+
+    async def waitfinished(self, interval=1.0):
+        """Waits until the calculation had been finished.
+
+        Args:
+            interval: Optional, seconds between subsequent runfinished() calls.
+        """
+        while not self.runfinished():
+            await asyncio.sleep(interval)
+
 
 class Tester:
     """Abstract class defining the interface of a tester.
@@ -68,6 +111,14 @@ class Tester:
     def test(self):
         raise NotImplementedError
 
+    def dependencies(self):
+        """Returns the files and directories the test depends on.
+
+        Returns:
+            List of file and directory names (def.: empty list).
+        """
+        return []
+
 
 class Testcase(Preparator, Calculator, Tester):
     """Abstract class defining the interface of a test case."""
@@ -3,22 +3,30 @@
 # See the packages LICENSE file for copyright and licensing conditions.
 ###############################################################################
 import os.path
+import shutil
+import asyncio
 import subprocess as sp
 import valsimp as vsp
+import valsimp.scheduler as vspsched
 
 class SimpleCalculator(vsp.Calculator):
     """A very simple calculator executing a given binary."""
 
-    def __init__(self, workdir, cmdline):
+    def __init__(self, workdir, cmdline, resources=None):
         """Initialies SimpleCalculator.
 
         Args:
             workdir: Working directory, where the program should be exectuded.
             cmdline: List of command line parameters (with program name as
                 first entry in the list).
+            resources: Optional, Resources instance with the cores, memory
+                and GPUs the program needs (def.: one core). If it specifies
+                the nr. of threads, the variable OMP_NUM_THREADS is set
+                accordingly in the environment of the program.
         """
         self.workdir = workdir
         self.cmdline = cmdline
+        self._resources = resources
         self.finishfile = os.path.join(self.workdir, ".runfinished")
 
     def run(self):
@@ -30,25 +38,124 @@ class SimpleCalculator(vsp.Calculator):
         line execution finished, a special file will be created to signalise
         finished run.
         """
+        self.execute()
+
+    def execute(self, cancelled=None, interval=1.0):
+        """Runs the specified command line to completion.
+
+        The standard streams are handled as described in run(). The special
+        file signalising finished run is only created, if the command had not
+        been cancelled.
+
+        Args:
+            cancelled: Optional, function without arguments, which is called
+                periodically while the command runs. If it returns True, the
+                command is killed.
+            interval: Optional, seconds between the calls of cancelled
+                (def.: 1.0).
+
+        Returns:
+            Return code of the command or None, if it had been cancelled.
+        """
+        self._setunfinished()
+        fin, fout, ferr = self._openstreams()
+        try:
+            process = sp.Popen(self.cmdline, stdin=fin, stdout=fout,
+                               stderr=ferr, close_fds=True, cwd=self.workdir,
+                               env=self._environment())
+            while True:
+                try:
+                    returncode = process.wait(
+                        None if cancelled is None else interval)
+                    break
+                except sp.TimeoutExpired:
+                    if cancelled():
+                        process.kill()
+                        process.wait()
+                        return None
+        finally:
+            self._closestreams(fin, fout, ferr)
+        self._setfinished()
+        return returncode
+
+    async def arun(self):
+        """Runs the specified command line without blocking the event loop.
+
+        Same as run(), but the process is awaited asynchronously, so that
+        other calculations can be started or finished meanwhile.
+        """
         self._setunfinished()
-        cmdline = self.cmdline
+        fin, fout, ferr = self._openstreams()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.cmdline, stdin=fin, stdout=fout, stderr=ferr,
+                close_fds=True, cwd=self.workdir, env=self._environment())
+            try:
+                await process.wait()
+            except asyncio.CancelledError:
+                process.kill()
+                raise
+        finally:
+            self._closestreams(fin, fout, ferr)
+        self._setfinished()
+
+    def runfinished(self):
+        """Checks whether the special file signalising finished run exists."""
+        return os.path.isfile(self.finishfile)
+
+    def resources(self):
+        """Returns the resources specified at initialization."""
+        return self._resources
+
+    def dependencies(self):
+        """Returns the executable of the command line.
+
+        Executables given by a relative path are ignored, as they are usually
+        provided by the input files of the test case.
+        """
+        executable = self.cmdline[0]
+        if os.path.isabs(executable):
+            return [ executable, ]
+        if os.sep in executable:
+            return []
+        path = shutil.which(executable)
+        return [ path, ] if path else []
+
+    def _environment(self):
+        """Returns the environment of the program.
+
+        Returns:
+            Dictionary with the environment variables or None, if the
+            program should inherit the environment unchanged.
+        """
+        if self._resources is None or self._resources.threads is None:
+            return None
+        env = dict(os.environ)
+        env["OMP_NUM_THREADS"] = str(self._resources.threads)
+        return env
+
+    def _openstreams(self):
+        """Opens the files for the standard streams of the command.
+
+        Returns:
+            Tuple with file objects for standard input (None, if no 'STDIN'
+            file exists), standard output and standard error.
+        """
         stdin = os.path.join(self.workdir, "STDIN")
-        stdout = os.path.join(self.workdir, "STDOUT")
-        stderr = os.path.join(self.workdir, "STDERR")
         if os.path.isfile(stdin):
             fin = open(stdin, "r")
         else:
             fin = None
-        fout = open(stdout, "w")
-        ferr = open(stderr, "w")
-        process = sp.Popen(cmdline, stdin=fin, stdout=fout,
-                           stderr=ferr, close_fds=True, cwd=self.workdir)
-        process.wait()
-        self._setfinished()
+        fout = open(os.path.join(self.workdir, "STDOUT"), "w")
+        ferr = open(os.path.join(self.workdir, "STDERR"), "w")
+        return fin, fout, ferr
 
-    def runfinished(self):
-        """Checks whether the special file signalising finished run exists."""
-        return os.path.isfile(self.finishfile)
+    @staticmethod
+    def _closestreams(*streams):
+        """Closes the files opened for the standard streams."""
+        for stream in streams:
+            if stream:
+                stream.close()
 
     def _setfinished(self):
         """Create the signal file for finished run."""
@@ -58,3 +165,119 @@ class SimpleCalculator(vsp.Calculator):
         """Remove the signal file for finished run."""
         if os.path.isfile(self.finishfile):
             os.remove(self.finishfile)
+
+
+
+class QueueCalculator(SimpleCalculator):
+    """Calculator executing a given binary via a batch queue scheduler.
+
+    The run() method only enqueues the job at the scheduler, which submits
+    the jobs of several calculators together as a job array. The id of the
+    submitted job is stored in the working directory, so that the status of
+    the calculation can be polled also by later invocations.
+    """
+
+    # File containing the id of the submitted job
+    JOBIDFILE = ".vspjobid"
+
+    def __init__(self, workdir, cmdline, scheduler):
+        """Initializes QueueCalculator.
+
+        Args:
+            workdir: Working directory, where the program should be exectuded.
+            cmdline: List of command line parameters (with program name as
+                first entry in the list).
+            scheduler: Scheduler object to submit the job to.
+        """
+        SimpleCalculator.__init__(self, workdir, cmdline)
+        self.scheduler = scheduler
+        self.jobidfile = os.path.join(workdir, self.JOBIDFILE)
+        self.jobid = None
+
+    def run(self):
+        """Enqueues the job at the scheduler."""
+        self._setunfinished()
+        if os.path.isfile(self.jobidfile):
+            os.remove(self.jobidfile)
+        self.jobid = None
+        self.scheduler.enqueue(self)
+
+    async def arun(self):
+        """Enqueues the job at the scheduler (does not block)."""
+        self.run()
+
+    def submitted(self, jobid):
+        """Stores the id of the job after it had been submitted.
+
+        Args:
+            jobid: Id of the submitted job.
+        """
+        self.jobid = jobid
+        with open(self.jobidfile, "w") as fp:
+            fp.write(jobid + "\n")
+
+    async def waitfinished(self, interval=1.0):
+        """Waits until the job had been finished.
+
+        If the job is still waiting for submission after one interval, all
+        jobs enqueued so far are submitted.
+
+        Raises:
+            RuntimeError: If the job had been cancelled or could not be
+                executed.
+        """
+        while not self.runfinished():
+            state = self._getjobstate()
+            if state == vspsched.JOB_CANCELLED:
+                raise RuntimeError("Job %s had been cancelled" % self.jobid)
+            if state == vspsched.JOB_FAILED:
+                raise RuntimeError("Job %s could not be executed"
+                                   % self.jobid)
+            await asyncio.sleep(interval)
+            if self.scheduler.ispending(self):
+                self.scheduler.flush()
+
+    def runfinished(self):
+        """Checks the status of the job at the scheduler.
+
+        If the scheduler does not know the job (any more), the special file
+        signalising finished run is checked instead.
+        """
+        if self.scheduler.ispending(self):
+            return False
+        jobid = self._getjobid()
+        if jobid is None:
+            return SimpleCalculator.runfinished(self)
+        state = self.scheduler.poll([ jobid ])[jobid]
+        if state == vspsched.JOB_UNKNOWN:
+            return SimpleCalculator.runfinished(self)
+        return state == vspsched.JOB_DONE
+
+    def runcancelled(self):
+        """Checks whether the job had been cancelled at the scheduler."""
+        return self._getjobstate() == vspsched.JOB_CANCELLED
+
+    def cancel(self):
+        """Cancels the job, if it had been already submitted."""
+        jobid = self._getjobid()
+        if jobid is not None:
+            self.scheduler.cancel([ jobid ])
+
+    def _getjobstate(self):
+        """Returns the state of the job at the scheduler.
+
+        Returns:
+            One of the JOB_* constants of valsimp.scheduler or None, if the
+            job had not been submitted.
+        """
+        jobid = self._getjobid()
+        if jobid is None:
+            return None
+        return self.scheduler.poll([ jobid ])[jobid]
+
+    def _getjobid(self):
+        """Returns the id of the job or None, if it had not been submitted."""
+        if self.jobid is None and os.path.isfile(self.jobidfile):
+            with open(self.jobidfile, "r") as fp:
+                self.jobid = fp.read().strip() or None
+        return self.jobid
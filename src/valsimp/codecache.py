@@ -0,0 +1,118 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Cache for compiled Python scripts.
+
+Test suites usually contain many identical or nearly identical ValSimP input
+files. The code cache compiles every distinct script only once per run and
+hands out the same code object for all files with the same content. The
+compiled code can be also stored on disk (keyed by the content hash), so that
+later runs do not have to compile the scripts again.
+"""
+import os
+import hashlib
+import importlib.util
+import marshal
+import tempfile
+import threading
+
+__all__ = [ "CodeCache", ]
+
+
+class CodeCache:
+    """Cache for code objects of compiled scripts."""
+
+    # Suffix of the files with compiled code in the cache directory
+    SUFFIX = ".code"
+
+    def __init__(self, cachedir=None):
+        """Initializes a CodeCache instance.
+
+        Args:
+            cachedir: Optional, directory to store the compiled code in. (def.:
+                code is cached in memory only)
+        """
+        self.cachedir = cachedir
+        self._lock = threading.Lock()
+        self._files = {}
+        self._codes = {}
+
+    def compile(self, fname):
+        """Returns the code object for a script.
+
+        Args:
+            fname: Name of the script.
+
+        Returns:
+            Code object of the compiled script.
+
+        Note:
+            Scripts with identical content share the same code object, so
+            tracebacks may refer to the file name of an other script with the
+            same content.
+        """
+        stat = os.stat(fname)
+        key = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._files.get(fname)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with open(fname, "rb") as fp:
+            source = fp.read()
+        digest = hashlib.sha256(source).hexdigest()
+        with self._lock:
+            code = self._codes.get(digest)
+        if code is None:
+            code = self._load(digest)
+        if code is None:
+            code = compile(source, fname, "exec")
+            self._store(digest, code)
+        with self._lock:
+            self._codes[digest] = code
+            self._files[fname] = (key, code)
+        return code
+
+    def _cachefile(self, digest):
+        """Returns the name of the file for a given content hash."""
+        return os.path.join(self.cachedir, digest + self.SUFFIX)
+
+    def _load(self, digest):
+        """Loads compiled code from the cache directory.
+
+        Args:
+            digest: Content hash of the script.
+
+        Returns:
+            Code object or None, if not found or compiled by an other Python
+            version.
+        """
+        if not self.cachedir:
+            return None
+        magic = importlib.util.MAGIC_NUMBER
+        try:
+            with open(self._cachefile(digest), "rb") as fp:
+                if fp.read(len(magic)) != magic:
+                    return None
+                return marshal.load(fp)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def _store(self, digest, code):
+        """Stores compiled code in the cache directory (if possible).
+
+        Args:
+            digest: Content hash of the script.
+            code: Code object of the compiled script.
+        """
+        if not self.cachedir:
+            return
+        try:
+            os.makedirs(self.cachedir, exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(dir=self.cachedir, prefix=".tmp")
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(importlib.util.MAGIC_NUMBER)
+                marshal.dump(code, fp)
+            os.replace(tmpname, self._cachefile(digest))
+        except OSError:
+            pass
@@ -0,0 +1,445 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Distributed processing of test cases by workers on several machines.
+
+A Coordinator hands the test cases to Worker processes connecting to it via
+TCP or a Unix socket. Each message is a JSON object in one line with its kind
+in the field 'type'. A worker announces the nr. of test cases it processes
+simultaneously (its slots) and gets up to slots + PREFETCH test cases
+assigned, so that it can start the next one without waiting for the
+coordinator. When no unassigned test cases are left, the coordinator steals
+test cases not started yet from the workers with the longest queues and
+hands them to idle workers. The test cases of workers, whose connection broke
+or who had not sent any message (including heartbeats) for some time, are
+assigned to other workers.
+
+Workers process the test cases locally and send the status and logs back, as
+soon as the status store of the test case is updated. The coordinator stores
+them in its own status store.
+
+Messages from worker to coordinator:
+    hello: Registration (fields 'worker' and 'slots').
+    started: Processing of a test case started (field 'testcase').
+    status: Status data of a test case (fields 'testcase', 'status', 'log',
+        'fingerprint', 'timings', 'durations'; see StatusStore.save()).
+    done: Processing of a test case finished (fields 'testcase' and
+        'events' with the console log events).
+    stolen: Answer to a steal request (fields 'testcase' and 'ok').
+    heartbeat: Sign of life.
+
+Messages from coordinator to worker:
+    task: Test case to process (fields 'testcase', 'stored' with the data of
+        the test case in the coordinators status store, 'ctxext' and
+        'actions').
+    steal: Request to hand back a test case not started yet ('testcase').
+    shutdown: All test cases had been processed.
+
+Note:
+    The protocol contains no authentication, coordinator and workers should
+    only be run within trusted networks.
+"""
+import os
+import json
+import socket
+import asyncio
+import threading
+import collections
+import valsimp.io.logger as vsplog
+
+__all__ = [ "parseaddress", "Coordinator", "Worker", ]
+
+# Maximal length of a message in bytes
+MAX_MESSAGE = 256 * 1024 * 1024
+
+
+def parseaddress(address):
+    """Parses the address of a coordinator.
+
+    Args:
+        address: Address in the form 'unix:PATH' for a Unix socket or
+            'HOST:PORT' for TCP (with an empty host meaning all interfaces
+            when listening and the local host when connecting).
+
+    Returns:
+        Tuple (family, address) with family being socket.AF_UNIX or
+        socket.AF_INET and address the path or a (host, port) tuple.
+    """
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, sep, port = address.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError("Invalid address '%s' (HOST:PORT or unix:PATH "
+                         "expected)" % address)
+    return socket.AF_INET, (host, int(port))
+
+
+def _encode(message):
+    """Returns the encoded line of a message."""
+    return (json.dumps(message) + "\n").encode("utf-8")
+
+
+
+class _WorkerState:
+    """State of a connected worker kept by the coordinator."""
+
+    def __init__(self, name, slots, writer):
+        self.name = name
+        self.slots = slots
+        self.writer = writer
+        # Assigned test cases not started yet (in the order of assignment)
+        self.queued = []
+        self.running = set()
+        # Test cases requested back from the worker
+        self.stealing = set()
+
+    def send(self, message):
+        """Sends a message to the worker."""
+        self.writer.write(_encode(message))
+
+    @property
+    def idle(self):
+        """Nr. of slots of the worker without assigned test case."""
+        return self.slots - len(self.running) - len(self.queued)
+
+
+
+class Coordinator:
+    """Hands test cases to connecting workers and collects their results."""
+
+    # Nr. of test cases assigned to a worker beyond its slots
+    PREFETCH = 1
+    # Seconds without message after which a worker is considered dead
+    TIMEOUT = 60.0
+    # Nr. of times a test case is assigned before it is given up
+    MAX_ATTEMPTS = 3
+    # Seconds to wait for the workers to disconnect after the shutdown
+    SHUTDOWN_TIMEOUT = 5.0
+
+    def __init__(self, address, testcases, ctxext, actions, statusstore,
+                 log):
+        """Initializes a Coordinator instance.
+
+        Args:
+            address: Address to listen at (see parseaddress()).
+            testcases: Names of the test cases in processing order.
+            ctxext: Dictionary with the external context passed to the
+                workers.
+            actions: Dictionary with the actions the workers should carry
+                out.
+            statusstore: Status store receiving the results.
+            log: TestLogger for the console messages.
+        """
+        self.address = address
+        self.ctxext = ctxext
+        self.actions = actions
+        self.statusstore = statusstore
+        self.log = log
+        self._pending = collections.deque(testcases)
+        self._remaining = len(self._pending)
+        self._attempts = collections.Counter()
+        self._workers = []
+        self._handlers = set()
+        self._finished = None
+
+    def run(self):
+        """Serves the workers until all test cases had been processed."""
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        """Serves the workers until all test cases had been processed."""
+        self._finished = asyncio.Event()
+        family, address = parseaddress(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(address):
+                os.remove(address)
+            server = await asyncio.start_unix_server(self._handle, address,
+                                                     limit=MAX_MESSAGE)
+        else:
+            server = await asyncio.start_server(
+                self._handle, address[0] or None, address[1],
+                limit=MAX_MESSAGE)
+        self.log.writeline("Coordinator waiting for workers at '%s'"
+                           % self.address)
+        try:
+            if self._remaining:
+                await self._finished.wait()
+            for worker in list(self._workers):
+                worker.send({ "type": "shutdown" })
+            if self._handlers:
+                await asyncio.wait(self._handlers,
+                                   timeout=self.SHUTDOWN_TIMEOUT)
+        finally:
+            server.close()
+            if family == socket.AF_UNIX and os.path.exists(address):
+                os.remove(address)
+
+    async def _handle(self, reader, writer):
+        """Communicates with a connected worker."""
+        worker = None
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.TIMEOUT)
+                if not line:
+                    break
+                message = json.loads(line)
+                if message["type"] == "hello":
+                    worker = _WorkerState(message["worker"], message["slots"],
+                                          writer)
+                    self._workers.append(worker)
+                    self.log.writeline("Worker '%s' connected (%d slots)"
+                                       % (worker.name, worker.slots))
+                elif worker is not None:
+                    self._received(worker, message)
+                self._dispatch()
+        except (asyncio.TimeoutError, ConnectionError, ValueError,
+                KeyError) as exc:
+            if worker is not None:
+                self.log.writeline("Worker '%s' failed: %s"
+                                   % (worker.name, str(exc) or "timeout"),
+                                   level=vsplog.LEVEL_WARNING)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+            if worker is not None:
+                self._workers.remove(worker)
+                self._requeue(worker)
+                self._dispatch()
+
+    def _received(self, worker, message):
+        """Processes a message of a registered worker."""
+        kind = message["type"]
+        testcase = message.get("testcase")
+        if kind == "started":
+            if testcase in worker.queued:
+                worker.queued.remove(testcase)
+            worker.running.add(testcase)
+        elif kind == "status":
+            self.statusstore.save(testcase, message["status"], message["log"],
+                                  message["fingerprint"], message["timings"],
+                                  message["durations"])
+        elif kind == "done":
+            worker.running.discard(testcase)
+            self.log.emit([ vsplog.LogEvent(*event)
+                            for event in message["events"] ])
+            self._setdone()
+        elif kind == "stolen":
+            worker.stealing.discard(testcase)
+            if message["ok"]:
+                worker.queued.remove(testcase)
+                self._attempts[testcase] -= 1
+                self._pending.appendleft(testcase)
+
+    def _setdone(self):
+        """Registers a finished test case."""
+        self._remaining -= 1
+        if not self._remaining:
+            self._finished.set()
+
+    def _requeue(self, worker):
+        """Puts the unfinished test cases of a lost worker back."""
+        lost = worker.queued + sorted(worker.running)
+        for testcase in reversed(lost):
+            if self._attempts[testcase] >= self.MAX_ATTEMPTS:
+                self.log.writeline("%s:\tgiven up after %d attempts"
+                                   % (testcase, self._attempts[testcase]),
+                                   level=vsplog.LEVEL_ERROR)
+                self._setdone()
+            else:
+                self._pending.appendleft(testcase)
+        if lost:
+            self.log.writeline("Worker '%s' lost, %d test case(s) requeued"
+                               % (worker.name, len(lost)),
+                               level=vsplog.LEVEL_WARNING)
+
+    def _dispatch(self):
+        """Assigns pending test cases to the workers and steals for idle ones.
+        """
+        for worker in sorted(self._workers, key=lambda worker: -worker.idle):
+            while (self._pending and worker.idle + self.PREFETCH > 0):
+                testcase = self._pending.popleft()
+                self._attempts[testcase] += 1
+                worker.queued.append(testcase)
+                worker.send({ "type": "task", "testcase": testcase,
+                              "stored": self.statusstore.load(testcase),
+                              "ctxext": self.ctxext,
+                              "actions": self.actions })
+        if self._pending:
+            return
+        idle = sum([ max(0, worker.idle) for worker in self._workers ])
+        stealing = sum([ len(worker.stealing) for worker in self._workers ])
+        while idle > stealing:
+            candidates = [ worker for worker in self._workers
+                           if len(worker.queued) > len(worker.stealing) ]
+            if not candidates:
+                break
+            victim = max(candidates, key=lambda worker: (
+                len(worker.queued) - len(worker.stealing)))
+            testcase = [ testcase for testcase in reversed(victim.queued)
+                         if testcase not in victim.stealing ][0]
+            victim.stealing.add(testcase)
+            victim.send({ "type": "steal", "testcase": testcase })
+            stealing += 1
+
+
+
+class _RemoteStatusStore:
+    """Status store of a worker for a test case processed remotely.
+
+    It delivers the data sent by the coordinator and sends saved data back.
+    """
+
+    def __init__(self, worker, stored):
+        self._worker = worker
+        self._stored = stored
+
+    def load(self, testcase):
+        """Returns the data of the test case sent by the coordinator."""
+        return self._stored
+
+    def clear(self):
+        """Discards the data sent by the coordinator."""
+        self._stored = None
+
+    def save(self, testcase, status, log, fingerprint=None, timings=None,
+             durations=None):
+        """Sends the data of the test case to the coordinator."""
+        self._stored = (status, log, fingerprint, timings or {})
+        self._worker.send({ "type": "status", "testcase": testcase,
+                            "status": status, "log": log,
+                            "fingerprint": fingerprint,
+                            "timings": timings or {},
+                            "durations": durations or {} })
+
+
+
+class Worker:
+    """Processes test cases handed over by a coordinator."""
+
+    # Seconds between subsequent heartbeat messages
+    HEARTBEAT = 10.0
+
+    def __init__(self, address, process, slots=1, name=None):
+        """Initializes a Worker instance.
+
+        Args:
+            address: Address of the coordinator (see parseaddress()).
+            process: Function processing a test case. It is called with the
+                name of the test case, the external context (dictionary), the
+                actions (dictionary) and the status store of the test case
+                and must return the list of the console log events.
+            slots: Optional, nr. of test cases processed simultaneously
+                (def.: 1).
+            name: Optional, name of the worker (def.: host name and process
+                id).
+        """
+        self.address = address
+        self.process = process
+        self.slots = slots
+        self.name = name or "%s:%d" % (socket.gethostname(), os.getpid())
+        self._socket = None
+        self._sendlock = threading.Lock()
+        self._tasks = collections.deque()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._stopevent = threading.Event()
+
+    def run(self):
+        """Processes test cases until the coordinator shuts down."""
+        family, address = parseaddress(self.address)
+        if family == socket.AF_INET:
+            self._socket = socket.create_connection(
+                (address[0] or "localhost", address[1]))
+        else:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(address)
+        self.send({ "type": "hello", "worker": self.name,
+                    "slots": self.slots })
+        threads = [ threading.Thread(target=self._processtasks)
+                    for _ in range(self.slots) ]
+        threads.append(threading.Thread(target=self._sendheartbeats,
+                                        daemon=True))
+        for thread in threads:
+            thread.start()
+        try:
+            with self._socket.makefile("r", encoding="utf-8") as fp:
+                for line in fp:
+                    if not self._received(json.loads(line)):
+                        break
+        finally:
+            with self._condition:
+                self._stopped = True
+                self._tasks.clear()
+                self._condition.notify_all()
+            self._stopevent.set()
+            for thread in threads[:-1]:
+                thread.join()
+            self._socket.close()
+
+    def send(self, message):
+        """Sends a message to the coordinator.
+
+        Messages which can not be sent (coordinator gone) are dropped.
+        """
+        data = _encode(message)
+        with self._sendlock:
+            try:
+                self._socket.sendall(data)
+            except OSError:
+                pass
+
+    def _received(self, message):
+        """Processes a message of the coordinator.
+
+        Returns:
+            False if the worker should stop, True otherwise.
+        """
+        kind = message["type"]
+        if kind == "shutdown":
+            return False
+        with self._condition:
+            if kind == "task":
+                self._tasks.append(message)
+                self._condition.notify()
+            elif kind == "steal":
+                queued = [ task for task in self._tasks
+                           if task["testcase"] == message["testcase"] ]
+                for task in queued:
+                    self._tasks.remove(task)
+                # Answer within the lock, so that the task can not be started
+                # in between
+                self.send({ "type": "stolen", "testcase": message["testcase"],
+                            "ok": bool(queued) })
+        return True
+
+    def _processtasks(self):
+        """Processes the assigned test cases (executed in the slot threads).
+        """
+        while True:
+            with self._condition:
+                while not self._tasks and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                task = self._tasks.popleft()
+                self.send({ "type": "started", "testcase": task["testcase"] })
+            store = _RemoteStatusStore(self, task["stored"])
+            try:
+                events = self.process(task["testcase"], task["ctxext"],
+                                      task["actions"], store)
+            except Exception as exc:
+                events = [ vsplog.LogEvent(
+                    0.0, task["testcase"], None, vsplog.LEVEL_ERROR,
+                    "%s:\tError: %s" % (task["testcase"], str(exc)), 0,
+                    False) ]
+            self.send({ "type": "done", "testcase": task["testcase"],
+                        "events": [ list(event) for event in events ] })
+
+    def _sendheartbeats(self):
+        """Sends heartbeat messages (executed in a background thread)."""
+        while not self._stopevent.wait(self.HEARTBEAT):
+            self.send({ "type": "heartbeat" })
@@ -0,0 +1,267 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Persistent binary cache for parsed tagged files.
+
+Reference files in tagged format do not change between validation runs, so
+parsing them again and again is a waste of time. The cache stores the data
+of a parsed file in binary form: the values of all entries with the same type
+are concatenated into one array, which is saved as a NumPy '.npy' file. The
+taglines and the positions of the entries in the arrays are stored in a
+separate meta file. On a cache hit, the arrays are memory mapped and the
+entries are created as views into them, so no text parsing takes place.
+
+A cached file is valid as long as modification time and size of the source
+file did not change. If they did, the content hash of the source is compared
+with the stored one, so that touched but unchanged files remain valid. The
+cache can be limited in size, in which case the least recently used files
+are evicted.
+"""
+import os
+import hashlib
+import pickle
+import shutil
+import tempfile
+import numpy as np
+import valsimp.files.taggedfile as tf
+
+__all__ = [ "TaggedCache", ]
+
+
+class TaggedCache:
+    """Persistent binary cache for parsed tagged files."""
+
+    # File containing the description of the cached file
+    METAFILE = "meta.pickle"
+    # Version of the cache layout
+    VERSION = 1
+    # Size of the blocks, when calculating the hash of a file
+    HASH_BLOCKSIZE = 1024 * 1024
+
+
+    def __init__(self, cachedir, maxsize=None, workers=None):
+        """Initializes a TaggedCache instance.
+
+        Args:
+            cachedir: Directory where the cache should be stored. (It should
+                not be within the test tree, as the cached files would
+                otherwise become part of the inputs of the test cases.)
+            maxsize: Optional, maximal size of the cache directory in bytes.
+                If the size is exceeded after storing a file, the least
+                recently used files are removed. (def.: no limit)
+            workers: Optional, nr. of processes used to parse large files,
+                which are not in the cache yet. (def.: nr. of CPUs)
+        """
+        self.cachedir = cachedir
+        self.maxsize = maxsize
+        self.workers = workers
+
+
+    def load(self, fname):
+        """Returns the content of a tagged file, using the cache if possible.
+
+        Args:
+            fname: Name of the file with tagged data.
+
+        Returns:
+            TaggedCollection with the entries of the file.
+
+        Note:
+            If the cache can not be written, the file is parsed and returned
+            without being cached.
+        """
+        fname = os.path.abspath(fname)
+        if tf.isbinary(fname):
+            # Binary files are memory mapped directly, caching brings no gain
+            return tf.TaggedCollection(tf.TaggedBinaryReader(fname))
+        stat = os.stat(fname)
+        entrydir = self._entrydir(fname)
+        meta = self._readmeta(entrydir)
+        digest = None
+        if meta is not None and meta["source"] == fname:
+            if (meta["mtime"] != stat.st_mtime_ns
+                    or meta["size"] != stat.st_size):
+                digest = self._digest(fname)
+                if meta["digest"] == digest:
+                    meta["mtime"] = stat.st_mtime_ns
+                    meta["size"] = stat.st_size
+                    self._writemeta(entrydir, meta)
+                else:
+                    meta = None
+            if meta is not None:
+                collection = self._loadentries(entrydir, meta)
+                if collection is not None:
+                    return collection
+        if digest is None:
+            digest = self._digest(fname)
+        collection = tf.parallelload(fname, self.workers)
+        try:
+            self._store(entrydir, fname, stat, digest, collection)
+        except OSError:
+            pass
+        else:
+            self._evict(os.path.dirname(entrydir), entrydir)
+        return collection
+
+
+    def invalidate(self, fname):
+        """Removes a file from the cache.
+
+        Args:
+            fname: Name of the source file.
+        """
+        shutil.rmtree(self._entrydir(os.path.abspath(fname)),
+                      ignore_errors=True)
+
+
+    def _entrydir(self, fname):
+        """Returns the directory for a given (absolute) source file name."""
+        key = hashlib.sha1(fname.encode()).hexdigest()
+        return os.path.join(self.cachedir, key)
+
+
+    def _digest(self, fname):
+        """Returns the content hash of a file."""
+        sha = hashlib.sha256()
+        with open(fname, "rb") as fp:
+            block = fp.read(self.HASH_BLOCKSIZE)
+            while block:
+                sha.update(block)
+                block = fp.read(self.HASH_BLOCKSIZE)
+        return sha.hexdigest()
+
+
+    def _readmeta(self, entrydir):
+        """Returns the meta information of a cached file or None."""
+        try:
+            with open(os.path.join(entrydir, self.METAFILE), "rb") as fp:
+                meta = pickle.load(fp)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if meta.get("version") != self.VERSION:
+            return None
+        return meta
+
+
+    def _writemeta(self, entrydir, meta):
+        """Writes the meta information of a cached file (if possible)."""
+        try:
+            with open(os.path.join(entrydir, self.METAFILE), "wb") as fp:
+                pickle.dump(meta, fp)
+        except OSError:
+            pass
+
+
+    def _loadentries(self, entrydir, meta):
+        """Creates a collection from the arrays in the cache.
+
+        Args:
+            entrydir: Directory of the cached file.
+            meta: Meta information of the cached file.
+
+        Returns:
+            TaggedCollection with entries being views into the memory mapped
+            arrays or None, if the arrays could not be loaded (e.g. because
+            they had been removed).
+        """
+        arrays = {}
+        try:
+            for dtype in meta["dtypes"]:
+                arrays[dtype] = np.load(os.path.join(entrydir,
+                                                     dtype + ".npy"),
+                                        mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        entries = []
+        for tagline, dtype, offset, count in meta["entries"]:
+            if dtype in arrays:
+                data = arrays[dtype][offset:offset + count]
+            else:
+                data = []
+            entries.append(tf.TaggedEntry.fromarray(tagline, data))
+        # Mark entry as recently used for the eviction
+        try:
+            os.utime(os.path.join(entrydir, self.METAFILE))
+        except OSError:
+            pass
+        return tf.TaggedCollection(entries)
+
+
+    def _store(self, entrydir, fname, stat, digest, collection):
+        """Stores a parsed file in the cache.
+
+        The files are written into a temporary directory first, which is then
+        renamed, so that concurrent readers never see incomplete data.
+
+        Args:
+            entrydir: Directory of the cached file.
+            fname: Name of the source file.
+            stat: Result of os.stat() for the source file.
+            digest: Content hash of the source file.
+            collection: Collection with the parsed entries.
+        """
+        parentdir = os.path.dirname(entrydir)
+        os.makedirs(parentdir, exist_ok=True)
+        tmpdir = tempfile.mkdtemp(dir=parentdir, prefix=".tmp")
+        try:
+            blocks = {}
+            offsets = {}
+            entries = []
+            for entry in collection:
+                data = np.ravel(entry.data)
+                offset = offsets.get(entry.dtype, 0)
+                entries.append((entry.tagline, entry.dtype, offset, len(data)))
+                offsets[entry.dtype] = offset + len(data)
+                blocks.setdefault(entry.dtype, []).append(data)
+            dtypes = []
+            for dtype, datalist in blocks.items():
+                if offsets[dtype]:
+                    np.save(os.path.join(tmpdir, dtype + ".npy"),
+                            np.concatenate(datalist))
+                    dtypes.append(dtype)
+            meta = { "version": self.VERSION, "source": fname,
+                     "mtime": stat.st_mtime_ns, "size": stat.st_size,
+                     "digest": digest, "dtypes": dtypes, "entries": entries }
+            with open(os.path.join(tmpdir, self.METAFILE), "wb") as fp:
+                pickle.dump(meta, fp)
+            if os.path.isdir(entrydir):
+                shutil.rmtree(entrydir, ignore_errors=True)
+            os.rename(tmpdir, entrydir)
+        except OSError:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            raise
+
+
+    def _evict(self, cachedir, keep):
+        """Removes least recently used files until cache fits into maxsize.
+
+        Args:
+            cachedir: Cache directory to clean up.
+            keep: Entry directory which should not be removed.
+        """
+        if self.maxsize is None:
+            return
+        cached = []
+        totalsize = 0
+        for name in os.listdir(cachedir):
+            if name.startswith(".tmp"):
+                continue
+            entrydir = os.path.join(cachedir, name)
+            try:
+                lastused = os.stat(os.path.join(entrydir,
+                                                self.METAFILE)).st_mtime
+                size = sum([ os.path.getsize(os.path.join(entrydir, fname))
+                             for fname in os.listdir(entrydir) ])
+            except OSError:
+                continue
+            cached.append((lastused, size, entrydir))
+            totalsize += size
+        cached.sort()
+        for lastused, size, entrydir in cached:
+            if totalsize <= self.maxsize:
+                break
+            if entrydir == keep:
+                continue
+            shutil.rmtree(entrydir, ignore_errors=True)
+            totalsize -= size
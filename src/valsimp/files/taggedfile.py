@@ -30,10 +30,20 @@ Example: 2 dimensional 2x15 real array named eigenlevels_dn
   0.114396736066691E+003  0.127861086132756E+003  0.323973885778375E+003
   0.312550781039824E+003  0.159919603974785E+004  0.109261160350897E+004
 """
+import os
 import re
+import mmap
+import bisect
 import functools as ft
+import concurrent.futures
 import numpy as np
+import multiprocessing
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    shared_memory = None
 import valsimp.io as vspio
+import valsimp.timing as vsptime
 
 ############################################################################
 # Exceptions
@@ -55,6 +65,11 @@ class InvalidEntryError(Exception):
         self.msg = msg
 
 
+    def __reduce__(self):
+        # Keeps line numbers and message when passed between processes
+        return (self.__class__, (self.start, self.end, self.msg))
+
+
 class ConversionError(Exception):
     """Raised if error occurs during conversion from string"""
     pass
@@ -92,21 +107,36 @@ class Converter:
             ConversionError: Any failure at conversion.
         """
         if isinstance(strvalue, list):
-            values = []
-            for line in strvalue:
-                values += line.split()
-        else:
-            values = strvalue.split()
-
-        if self.nolist and len(values) > 1:
-            raise ConversionError("Too many values")
-        result = self.convert(values)
+            strvalue = " ".join(strvalue)
+        result = self.convertstring(strvalue)
         if self.nolist:
+            if len(result) > 1:
+                raise ConversionError("Too many values")
             return result[0]
         else:
             return result
 
 
+    def convertstring(self, text):
+        """Converts whitespace separated values in a string.
+
+        Derived classes may override it to provide a faster conversion than
+        splitting the string into single words.
+
+        Args:
+            text: String (str or bytes) containing the values to convert.
+
+        Returns:
+            List of converted objects.
+
+        Raises:
+            ConversionError: Any problems during conversion.
+        """
+        if isinstance(text, bytes):
+            text = str(text, encoding="ascii")
+        return self.convert(text.split())
+
+
     def convert(self, values):
         """Abstract routine for conversion.
 
@@ -123,15 +153,291 @@ class Converter:
 
 
 
+############################################################################
+# Bulk conversion of numeric blocks
+############################################################################
+
+# Translation table for turning Fortran double precision exponents (and lower
+# case exponents) into upper case 'E'-exponents.
+_EXPONENT_TABLE = bytes.maketrans(b"Dde", b"EEE")
+_EXPONENT_STRTABLE = str.maketrans("Dde", "EEE")
+
+# Character codes used by the fixed width parser
+_CHR_NEWLINE, _CHR_SPACE, _CHR_DOT, _CHR_EXP, _CHR_PLUS, _CHR_MINUS, \
+    _CHR_ZERO = b"\n .E+-0"
+
+# Powers of ten, which are exactly representable as double precision numbers
+_EXACT_POW10 = 10.0**np.arange(23)
+
+# Maximal mantissa, which is exactly representable as double precision number
+_MAX_EXACT_MANTISSA = 2**53
+
+# Blocks shorter than this (in bytes) are not worth the setup of the fixed
+# width parser
+_FIXEDWIDTH_MINSIZE = 4096
+
+# Valid integer and float tokens (checked for the last token of a block)
+_PAT_INT = re.compile(rb"[+-]?\d+")
+_PAT_FLOAT = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)(?:E[+-]?\d+)?")
+
+# Lookup table for whitespace characters
+_SPACE_TABLE = np.zeros(256, dtype=bool)
+_SPACE_TABLE[list(b" \t\n\r\x0b\x0c")] = True
+
+
+def _tobytes(text):
+    """Returns the bytes representation of a str or bytes object."""
+    if isinstance(text, str):
+        return text.encode("ascii")
+    return text
+
+
+def _fromstring(text, dtype):
+    """Converts whitespace separated numbers to an array in one step.
+
+    NumPy stops at the first invalid token and returns the numbers read so
+    far, so the conversion is only accepted if the nr. of numbers equals the
+    nr. of tokens and the last token is a valid number. (The global warning
+    filters must not be changed here, as the function is called from several
+    threads.)
+
+    Args:
+        text: Bytes containing the numbers.
+        dtype: Type of the numbers.
+
+    Returns:
+        One dimensional array with the numbers or None, if the string
+        contains anything else than numbers of the given type.
+    """
+    tokens = text.rsplit(None, 1)
+    # NumPy does not return an empty array for blank strings
+    if not tokens:
+        return np.empty(0, dtype=dtype)
+    pattern = _PAT_INT if dtype is int else _PAT_FLOAT
+    if pattern.fullmatch(tokens[-1]) is None:
+        return None
+    try:
+        result = np.fromstring(text, dtype=dtype, sep=" ")
+    except (ValueError, DeprecationWarning):
+        return None
+    if len(result) != _counttokens(text):
+        return None
+    return result
+
+
+def _counttokens(text):
+    """Returns the nr. of whitespace separated tokens in a bytes object."""
+    space = _SPACE_TABLE[np.frombuffer(text, dtype=np.uint8)]
+    return (int(not space[0])
+            + int(np.count_nonzero(space[:-1] & ~space[1:])))
+
+
+def _combinedigits(digits, shape):
+    """Combines arrays of decimal digits to the numbers they represent.
+
+    Groups of four digits are combined using 16 bit integers, before they are
+    added to the floating point result. The result is exact as long as it is
+    smaller than 2**53.
+
+    Args:
+        digits: List of uint8 arrays with the digits, most significant first.
+        shape: Shape of the digit arrays.
+
+    Returns:
+        Float array with the numbers.
+    """
+    result = np.zeros(shape)
+    for ii in range(0, len(digits), 4):
+        group = digits[ii:ii + 4]
+        value = group[0].astype(np.uint16)
+        for digit in group[1:]:
+            value *= 10
+            value += digit
+        result *= _EXACT_POW10[len(group)]
+        result += value
+    return result
+
+
+def _fixedwidth_floats(chars, nlines, linelen):
+    """Converts lines of fixed width floats in exponential format.
+
+    The lines must contain the same number of tokens, each with the same width
+    and with the decimal point and the exponent at the same position (as
+    written by Fortran with an E or D edit descriptor). At least one digit
+    must follow the decimal point. The digits are
+    combined column by column using array operations. Whenever the mantissa
+    and the power of ten are exactly representable as double precision
+    numbers, the result of the single multiplication or division is correctly
+    rounded, giving the same result as the conversion by the C-library. The
+    remaining (rare) values are converted individually.
+
+    Args:
+        chars: One dimensional uint8 array with the character codes of the
+            lines (each terminated by one newline character).
+        nlines: Number of lines.
+        linelen: Length of each line without the newline character.
+
+    Returns:
+        One dimensional float array with the converted values or None,
+        if the lines do not have the required layout.
+    """
+    block = chars.reshape(nlines, linelen + 1)[:, :linelen]
+
+    # Determine layout from the first line
+    firstline = bytes(block[0])
+    expcols = [ ii for ii, cc in enumerate(firstline) if cc == _CHR_EXP ]
+    ntokens = len(expcols)
+    if not ntokens:
+        return None
+    iexp = expcols[0]
+    idot = firstline.rfind(b".", 0, iexp)
+    expend = iexp + 2
+    while (expend < linelen
+           and _CHR_ZERO <= firstline[expend] <= _CHR_ZERO + 9):
+        expend += 1
+    if idot < 0 or iexp - idot < 2 or expend == iexp + 2:
+        return None
+    width = expcols[1] - iexp if ntokens > 1 else expend
+    tokenstart = expend - width
+    tokenend = tokenstart + ntokens * width
+    if (expcols != list(range(iexp, iexp + ntokens * width, width))
+            or tokenend > linelen
+            or np.any(block[:, tokenend:] != _CHR_SPACE)
+            or np.any(block[:, :max(tokenstart, 0)] != _CHR_SPACE)):
+        return None
+    idot -= tokenstart
+    iexp -= tokenstart
+    shape = (nlines, ntokens)
+
+    def tokencolumn(icol):
+        """Returns the given character column of all tokens."""
+        start = tokenstart + icol
+        if start >= 0:
+            return block[:, start:start + ntokens * width:width]
+        # First token has no leading separator, pad with space.
+        column = np.empty(shape, dtype=np.uint8)
+        column[:, 0] = _CHR_SPACE
+        column[:, 1:] = block[:, start + width:start + ntokens * width:width]
+        return column
+
+    digits = []
+    negative = np.zeros(shape, dtype=bool)
+    started = np.zeros(shape, dtype=bool)
+    for icol in range(idot):
+        column = tokencolumn(icol)
+        digit = column - np.uint8(_CHR_ZERO)
+        isdigit = digit <= 9
+        isspace = column == _CHR_SPACE
+        isminus = column == _CHR_MINUS
+        if not np.all(isdigit | (~started & (isspace | isminus
+                                             | (column == _CHR_PLUS)))):
+            return None
+        started |= ~isspace
+        negative |= isminus
+        if np.any(isdigit):
+            digits.append(digit * isdigit)
+    if np.any(tokencolumn(idot) != _CHR_DOT):
+        return None
+    for icol in range(idot + 1, iexp):
+        digit = tokencolumn(icol) - np.uint8(_CHR_ZERO)
+        if np.any(digit > 9):
+            return None
+        digits.append(digit)
+    mantissa = _combinedigits(digits, shape)
+    if np.any(tokencolumn(iexp) != _CHR_EXP):
+        return None
+    column = tokencolumn(iexp + 1)
+    expnegative = column == _CHR_MINUS
+    if not np.all(expnegative | (column == _CHR_PLUS)):
+        return None
+    digits = []
+    for icol in range(iexp + 2, width):
+        digit = tokencolumn(icol) - np.uint8(_CHR_ZERO)
+        if np.any(digit > 9):
+            return None
+        digits.append(digit)
+    power = _combinedigits(digits, shape).astype(int)
+    power[expnegative] *= -1
+    power -= iexp - idot - 1
+
+    abspower = np.abs(power)
+    exact = (mantissa < _MAX_EXACT_MANTISSA) & (abspower <= 22)
+    scale = _EXACT_POW10[np.minimum(abspower, 22)]
+    result = np.where(power >= 0, mantissa * scale, mantissa / scale)
+    np.negative(result, out=result, where=negative)
+    inexact = np.nonzero(~exact)
+    if len(inexact[0]):
+        tokens = np.stack([ tokencolumn(icol)[inexact]
+                            for icol in range(width) ], axis=1)
+        result[inexact] = tokens.view("S%d" % width).ravel().astype(float)
+    return result.ravel()
+
+
+def _bulk_floats(text):
+    """Converts whitespace separated floats without splitting the string.
+
+    Args:
+        text: Bytes with the floats (Fortran 'D' exponents are allowed).
+
+    Returns:
+        One dimensional float array or None, if conversion failed.
+    """
+    text = text.translate(_EXPONENT_TABLE)
+    if len(text) < _FIXEDWIDTH_MINSIZE:
+        return _fromstring(text, float)
+    if not text.startswith(b"\n"):
+        text = b"\n" + text
+    chars = np.frombuffer(text, dtype=np.uint8)
+    newlines = np.flatnonzero(chars == _CHR_NEWLINE)
+    if len(newlines) < 2:
+        return _fromstring(text, float)
+    linelens = np.diff(newlines) - 1
+    linelen = linelens[0]
+    nlines = len(linelens)
+    if linelens[-1] != linelen:
+        nlines -= 1
+    if not linelen or np.any(linelens[:nlines] != linelen):
+        return _fromstring(text, float)
+    start = newlines[0] + 1
+    end = newlines[nlines]
+    result = _fixedwidth_floats(chars[start:end + 1], nlines, linelen)
+    if result is None:
+        return _fromstring(text, float)
+    if text[end:].strip():
+        rest = _fromstring(text[end:], float)
+        if rest is None:
+            return None
+        result = np.concatenate((result, rest))
+    return result
+
+
+
 class FloatConverter(Converter):
-    """String to float converter."""
+    """String to float converter.
+
+    Exponents written with 'D' (Fortran double precision) are accepted as well.
+    """
+
+    def convertstring(self, text):
+        text = _tobytes(text)
+        result = _bulk_floats(text)
+        if result is None:
+            result = self.convert(str(text, encoding="ascii").split())
+        return result
+
 
     def convert(self, values):
         try:
             ll = np.array(values, dtype=float)
-        except Exception as ex:
-            raise ConversionError("Unable to convert string to float: "
-                                  + str(ex))
+        except ValueError:
+            ll = None
+        if ll is None:
+            try:
+                ll = np.array([ val.translate(_EXPONENT_STRTABLE)
+                                for val in values ], dtype=float)
+            except Exception as ex:
+                raise ConversionError("Unable to convert string to float: "
+                                      + str(ex))
         return ll
 
 
@@ -139,6 +445,14 @@ class FloatConverter(Converter):
 class IntConverter(Converter):
     """String to integer converter."""
 
+    def convertstring(self, text):
+        text = _tobytes(text)
+        result = _fromstring(text, int)
+        if result is None:
+            result = self.convert(str(text, encoding="ascii").split())
+        return result
+
+
     def convert(self, values):
         try:
             ll = np.array(values, dtype=int)
@@ -157,27 +471,22 @@ class ComplexConverter(Converter):
     write statement in Fortran).
     """
 
-    def __call__(self, strvalue):
-        values = strvalue.split()
-        if len(values) % 2:
-            raise ConversionError("Complex converter needs even strings")
-        if self.nolist and len(values) != 2:
-            raise ConversionError("Too many values")
-        result = self.convert(values)
-        if self.nolist:
-            return result[0]
-        else:
-            return result
+    _FLOATCONVERTER = FloatConverter()
+
+    def convertstring(self, text):
+        return self._tocomplex(self._FLOATCONVERTER.convertstring(text))
 
 
     def convert(self, values):
-        try:
-            tmp = np.array(values, dtype=float)
-            ll = tmp[0::2] + 1.0j * tmp[1::2]
-        except Exception as ex:
-            raise ConversionError("Unable to convert string to complex: "
-                                  + str(ex))
-        return ll
+        return self._tocomplex(self._FLOATCONVERTER.convert(values))
+
+
+    @staticmethod
+    def _tocomplex(floats):
+        """Combines subsequent real and imaginary parts to complex numbers."""
+        if len(floats) % 2:
+            raise ConversionError("Complex converter needs even strings")
+        return floats[0::2] + 1.0j * floats[1::2]
 
 
 
@@ -214,6 +523,8 @@ class TaggedEntry:
         data: Converted data belonging to this tag.
     """
 
+    __slots__ = ("tagline", "name", "dtype", "rank", "shape", "data")
+
     # Converter from string for different types
     _CONVERTERS = { "integer" : IntConverter(),
                     "real" : FloatConverter(),
@@ -233,6 +544,41 @@ class TaggedEntry:
             data: String representation of the data. (Either single string
                 or list of strings.)
        """
+        self._settag(tagline)
+        if not self.dtype in self._CONVERTERS:
+            raise InvalidEntryError(msg="Invalid data dtype '%s'" % self.dtype)
+        try:
+            data = self._CONVERTERS[self.dtype](data)
+        except ConversionError as ex:
+            raise InvalidEntryError(msg=str(ex))
+        self._setdata(data)
+
+
+    @classmethod
+    def fromarray(cls, tagline, data):
+        """Creates a TaggedEntry from already converted data.
+
+        Args:
+            tagline: Line containing the tag.
+            data: Array with the data in the order as it would be in the file.
+                It is not copied if it has already the right shape or can be
+                reshaped as a view.
+
+        Returns:
+            TaggedEntry instance.
+        """
+        entry = cls.__new__(cls)
+        entry._settag(tagline)
+        entry._setdata(np.ravel(data))
+        return entry
+
+
+    def _settag(self, tagline):
+        """Sets the attributes describing the tag.
+
+        Args:
+            tagline: Line containing the tag.
+        """
         self.tagline = tagline.strip()
         match = self._PAT_TAGLINE.match(tagline)
         if not match:
@@ -246,12 +592,13 @@ class TaggedEntry:
         else:
             self.shape = ()
 
-        if not self.dtype in self._CONVERTERS:
-            raise InvalidEntryError(msg="Invalid data dtype '%s'" % self.dtype)
-        try:
-            data = self._CONVERTERS[self.dtype](data)
-        except ConversionError as ex:
-            raise InvalidEntryError(msg=str(ex))
+
+    def _setdata(self, data):
+        """Sets the data after checking it against the shape.
+
+        Args:
+            data: One dimensional array with the data.
+        """
         if self.shape:
             if len(self.shape) != self.rank:
                 raise InvalidEntryError(msg="Incompatible rank and shape")
@@ -273,11 +620,109 @@ class TaggedEntry:
 
 
 
+class ScalarEntry:
+    """Tagged entry with a scalar value, stored in a column of a collection.
+
+    It has the same attributes as TaggedEntry, but stores only its column and
+    its position in it. The values of all scalars of the same type are packed
+    into one array in the column, data returns a zero dimensional array
+    with the value.
+    """
+
+    __slots__ = ("_column", "_ind")
+
+    rank = 0
+    shape = ()
+
+    def __init__(self, column, ind):
+        """Initializes a ScalarEntry instance.
+
+        Args:
+            column: _ScalarColumn containing the entry.
+            ind: Position of the entry in the column.
+        """
+        self._column = column
+        self._ind = ind
+
+
+    @property
+    def tagline(self):
+        return self._column.taglines[self._ind]
+
+
+    @property
+    def name(self):
+        return self.tagline[1:].split(":", 1)[0].strip()
+
+
+    @property
+    def dtype(self):
+        return self._column.dtype
+
+
+    @property
+    def data(self):
+        return self._column.values()[self._ind:self._ind + 1].reshape(())
+
+
+    iscomparable = TaggedEntry.iscomparable
+
+    __str__ = TaggedEntry.__str__
+
+
+
+class _ScalarColumn:
+    """Taglines and values of scalar entries with the same type."""
+
+    def __init__(self, dtype, nptype):
+        """Initializes a _ScalarColumn instance.
+
+        Args:
+            dtype: Type of the entries ('real', 'integer', etc.)
+            nptype: NumPy type of the values.
+        """
+        self.dtype = dtype
+        self.taglines = []
+        self._nptype = nptype
+        self._values = np.empty(0, dtype=nptype)
+        self._pending = []
+
+
+    def append(self, entry):
+        """Adds a scalar entry to the column.
+
+        Args:
+            entry: TaggedEntry with rank 0.
+
+        Returns:
+            ScalarEntry representing the added entry.
+        """
+        self.taglines.append(entry.tagline)
+        self._pending.append(entry.data[()])
+        return ScalarEntry(self, len(self.taglines) - 1)
+
+
+    def values(self):
+        """Returns the array with the values of all entries."""
+        if self._pending:
+            self._values = np.concatenate(
+                (self._values, np.array(self._pending, dtype=self._nptype)))
+            self._pending = []
+        return self._values
+
+
+
 class TaggedCollection:
     """Collection of tagged entries.
 
     Provides interface for appending and removing TaggedEntries from a
     collection and for searching tag names using regular expressions.
+
+    The entries are indexed by name, by the beginning of their taglines and by
+    type, rank and shape, so that lookups do not need to visit every entry.
+    The results of matching_taglines() are cached per pattern until the
+    collection is changed. Scalar entries are stored as ScalarEntry instances
+    with the values of the same type packed into one array.
     """
 
     def __init__(self, entries):
@@ -289,6 +734,10 @@ class TaggedCollection:
         """
         self._names = {}
         self._entries = []
+        self._nremoved = 0
+        self._index = None
+        self._matches = {}
+        self._columns = {}
         self.extend(entries)
 
 
@@ -296,28 +745,71 @@ class TaggedCollection:
         """Adds new elements to the collection.
 
         Args:
-            entries: List of TaggedEntries, which should be added.
+            entries: List of TaggedEntries, which should be added. If an
+                entry has the same name as an existing one, get() returns the
+                new entry afterwards.
         """
         for entry in entries:
-            self._names[entry.name] = len(self._names)
-            self._entries.append(entry)
+            self._names[entry.name] = len(self._entries)
+            self._entries.append(self._packed(entry))
+        self._invalidate()
 
 
     def matching_taglines(self, pattern):
         """Returns the entries matching a regular expression.
 
-        The regular expression is matched against the string representation of
-        the tagged entry without its data: '<name>:<dtype>:<rank>:<shape>'
+        The regular expression is matched against the tagline of the entry:
+        '@<name>:<dtype>:<rank>:<shape>'. If the pattern starts with literal
+        text, only the entries whose tagline start with it are matched.
 
         Args:
-            pattern: Compiled regular expression.
+            pattern: Compiled regular expression (or string with it).
 
         Returns:
             List with matching entries.
         """
-        result = [ entry for entry in self._entries
-                   if pattern.match(entry.tagline) ]
-        return result
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+        indices = self._matches.get(pattern)
+        if indices is None:
+            prefix = _literalprefix(pattern)
+            if prefix:
+                candidates = self._getindex().prefixed(prefix)
+            else:
+                candidates = self._indices()
+            indices = [ ii for ii in candidates
+                        if pattern.match(self._entries[ii].tagline) ]
+            self._matches[pattern] = indices
+        return [ self._entry(ii) for ii in indices ]
+
+
+    def select(self, prefix=None, dtype=None, rank=None, shape=None):
+        """Returns the entries with given properties.
+
+        Args:
+            prefix: Optional, beginning of the name of the entries.
+            dtype: Optional, type of the entries ('real', 'integer', etc.).
+            rank: Optional, rank of the entries.
+            shape: Optional, shape of the entries as tuple.
+
+        Returns:
+            List with the entries having all the specified properties.
+        """
+        index = self._getindex()
+        selected = None
+        if prefix is not None:
+            selected = set(index.prefixed("@" + prefix))
+        for key, value in (("dtype", dtype), ("rank", rank),
+                           ("shape", shape)):
+            if value is None:
+                continue
+            if key == "shape":
+                value = tuple(value)
+            found = index.get(key, value)
+            selected = set(found) if selected is None else selected & found
+        if selected is None:
+            return [ self._entry(ii) for ii in self._indices() ]
+        return [ self._entry(ii) for ii in sorted(selected) ]
 
 
     def get(self, name):
@@ -331,7 +823,7 @@ class TaggedCollection:
         """
         ii = self._names.get(name)
         if not ii is None:
-            result = self._entries[ii]
+            result = self._entry(ii)
         else:
             result = None
         return result
@@ -344,9 +836,18 @@ class TaggedCollection:
             name: Name of the entry to delete.
         """
         ii = self._names.pop(name, None)
-        if not ii is None:
-            del self._entries[ii]
-            del self._taglines[ii]
+        if ii is None:
+            return
+        self._entries[ii] = None
+        self._nremoved += 1
+        if 2 * self._nremoved > len(self._entries):
+            self._compact()
+        self._invalidate()
+
+
+    def __len__(self):
+        return len(self._entries) - self._nremoved
+
 
     def __iter__(self):
 
@@ -357,15 +858,162 @@ class TaggedCollection:
                 self.ind = -1
 
             def __next__(self):
+                entries = self.tagged._entries
                 self.ind += 1
-                if self.ind < len(self.tagged._entries):
-                    return self.tagged._entries[self.ind]
+                while self.ind < len(entries) and entries[self.ind] is None:
+                    self.ind += 1
+                if self.ind < len(entries):
+                    return self.tagged._entry(self.ind)
                 else:
                     raise StopIteration
 
         return TaggedCollectionIter(self)
 
 
+    def _entry(self, ind):
+        """Returns the entry at a given position.
+
+        Derived classes may override it to convert entries on access.
+        """
+        return self._entries[ind]
+
+
+    def _packed(self, entry):
+        """Returns the representation of an entry stored in the collection.
+
+        Args:
+            entry: Entry to store.
+
+        Returns:
+            ScalarEntry for converted scalar entries, entry itself otherwise.
+        """
+        if type(entry) is not TaggedEntry or entry.rank != 0:
+            return entry
+        key = (entry.dtype, entry.data.dtype)
+        column = self._columns.get(key)
+        if column is None:
+            column = _ScalarColumn(entry.dtype, entry.data.dtype)
+            self._columns[key] = column
+        return column.append(entry)
+
+
+    def _indices(self):
+        """Returns the positions of all entries not removed."""
+        return [ ii for ii, entry in enumerate(self._entries)
+                 if entry is not None ]
+
+
+    def _getindex(self):
+        """Returns the index of the entries, building it if necessary."""
+        if self._index is None:
+            self._index = _TaglineIndex(self._entries)
+        return self._index
+
+
+    def _invalidate(self):
+        """Drops the index and the cached matches after a change."""
+        self._index = None
+        self._matches = {}
+
+
+    def _compact(self):
+        """Drops the slots of the removed entries."""
+        newpos = {}
+        entries = []
+        for ii, entry in enumerate(self._entries):
+            if entry is not None:
+                newpos[ii] = len(entries)
+                entries.append(entry)
+        self._entries = entries
+        self._names = { name: newpos[ii] for name, ii in self._names.items() }
+        self._nremoved = 0
+
+
+
+class _TaglineIndex:
+    """Index of the entries of a collection by tagline, type, rank, shape."""
+
+    def __init__(self, entries):
+        """Initializes a _TaglineIndex instance.
+
+        Args:
+            entries: List of entries, with None for removed ones.
+        """
+        taglines = sorted([ (entry.tagline, ii)
+                            for ii, entry in enumerate(entries)
+                            if entry is not None ])
+        self._taglines = [ tagline for tagline, ii in taglines ]
+        self._positions = [ ii for tagline, ii in taglines ]
+        self._attrs = { "dtype": {}, "rank": {}, "shape": {} }
+        for ii, entry in enumerate(entries):
+            if entry is None:
+                continue
+            for key, values in self._attrs.items():
+                values.setdefault(getattr(entry, key), set()).add(ii)
+
+
+    def prefixed(self, prefix):
+        """Returns the sorted positions of the entries with a tagline prefix.
+        """
+        first = bisect.bisect_left(self._taglines, prefix)
+        last = first
+        while (last < len(self._taglines)
+               and self._taglines[last].startswith(prefix)):
+            last += 1
+        return sorted(self._positions[first:last])
+
+
+    def get(self, key, value):
+        """Returns the positions of the entries with a given attribute value.
+
+        Args:
+            key: Name of the attribute ('dtype', 'rank' or 'shape').
+            value: Value of the attribute.
+
+        Returns:
+            Set of positions.
+        """
+        return self._attrs[key].get(value, set())
+
+
+
+# Characters with special meaning at the beginning of a regular expression
+_REGEX_SPECIALS = ".^$*+?{}[]()|"
+
+
+def _literalprefix(pattern):
+    """Returns the literal text every string matched by a pattern starts with.
+
+    Args:
+        pattern: Compiled regular expression.
+
+    Returns:
+        Literal prefix of the pattern (empty string if none was found).
+    """
+    text = pattern.pattern
+    if (not isinstance(text, str) or "|" in text
+            or pattern.flags & (re.IGNORECASE | re.VERBOSE)):
+        return ""
+    chars = []
+    pos = 1 if text.startswith("^") else 0
+    while pos < len(text):
+        char = text[pos]
+        step = 1
+        if char == "\\":
+            if pos + 1 >= len(text) or text[pos + 1].isalnum():
+                break
+            char = text[pos + 1]
+            step = 2
+        elif char in _REGEX_SPECIALS:
+            break
+        # Characters followed by a quantifier allowing zero repetitions
+        if text[pos + step:pos + step + 1] in ("*", "?", "{"):
+            break
+        chars.append(char)
+        pos += step
+    return "".join(chars)
+
+
 
 ############################################################################
 # Parses the file containing the data and returns TaggedEntries
@@ -385,17 +1033,37 @@ class TaggedReader:
     def __init__(self, source):
         """Initializes a TaggedReader.
 
+        The reader should be closed via close() (or used as context manager),
+        if it is not iterated until its end.
+
         Args:
             source: File name or file like object with tagged data.
         """
         if hasattr(source, "read"):
             self._fp = source
+            self._ownfile = False
         else:
-            self._fp = vspio.zopen(source, "r")
+            self._fp = vspio.zopen(source, "r", background=True)
+            self._ownfile = True
         dummy, self._lasttagline = self._readnext_tagline()
         self._lasttagline_ind = len(dummy)
 
 
+    def close(self):
+        """Closes the file (if it had been opened by the reader)."""
+        if self._ownfile:
+            self._fp.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.close()
+        return False
+
+
     def _readnext_tagline(self):
         """Read until next tag line.
 
@@ -424,23 +1092,936 @@ class TaggedReader:
     def __next__(self):
         """Next tagged entry."""
         if not self._lasttagline:
+            self.close()
             raise StopIteration
 
         datalines, tagline = self._readnext_tagline()
-        tagline_ind = self._lasttagline_ind + len(datalines)
+        tagline_ind = self._lasttagline_ind + 1 + len(datalines)
+        data = "".join(datalines)
+        vsptime.count("parsed", len(self._lasttagline) + len(data))
         try:
-            result = TaggedEntry(self._lasttagline, datalines)
+            result = TaggedEntry(self._lasttagline, data)
         except InvalidEntryError as ee:
             raise InvalidEntryError(self._lasttagline_ind + 1, tagline_ind,
                                     msg=ee.msg)
 
         self._lasttagline = tagline
-        self._lastagline_ind = tagline_ind
+        self._lasttagline_ind = tagline_ind
 
         return result
 
 
 
+def _readbuffer(source, usemmap=False):
+    """Returns the content of a tagged file as one buffer.
+
+    Args:
+        source: File name or file like object with tagged data.
+        usemmap: If True, uncompressed files given by name are memory mapped
+            instead of being read.
+
+    Returns:
+        Bytes like object with the content of the file.
+    """
+    if hasattr(source, "read"):
+        buf = source.read()
+    elif usemmap and not vspio.iscompressed(source):
+        with open(source, "rb") as fp:
+            if os.fstat(fp.fileno()).st_size:
+                buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buf = b""
+    else:
+        fp = vspio.zopen(source, "rb")
+        buf = fp.read()
+        fp.close()
+    if isinstance(buf, str):
+        buf = buf.encode("ascii")
+    return buf
+
+
+def _taggedblocks(buf):
+    """Generator over the positions of the tagged blocks in a buffer.
+
+    Args:
+        buf: Bytes like object (bytes or mmap) with tagged data.
+
+    Yields:
+        Tuple (start, dataoffset, end) with start being the position of the
+        tagline, dataoffset the position of the newline terminating the
+        tagline and end the position after the data of the block.
+    """
+    if buf[:1] == b"@":
+        start = 0
+    else:
+        start = buf.find(b"\n@") + 1
+        if not start:
+            return
+    while True:
+        dataoffset = buf.find(b"\n", start)
+        if dataoffset < 0:
+            dataoffset = len(buf)
+        ind = buf.find(b"\n@", dataoffset)
+        end = ind + 1 if ind >= 0 else len(buf)
+        yield start, dataoffset, end
+        if ind < 0:
+            return
+        start = end
+
+
+def _convertblock(buf, start, dataoffset, end):
+    """Converts a tagged block of a buffer into a tagged entry.
+
+    Args:
+        buf: Bytes like object with tagged data.
+        start: Position of the tagline.
+        dataoffset: Position of the newline terminating the tagline.
+        end: Position after the data of the block.
+
+    Returns:
+        TaggedEntry with the converted data.
+
+    Raises:
+        InvalidEntryError: If the block is invalid. The line numbers of the
+            block are set in the exception.
+    """
+    tagline = str(buf[start:dataoffset], encoding="ascii")
+    vsptime.count("parsed", end - start)
+    try:
+        return TaggedEntry(tagline, buf[dataoffset:end])
+    except InvalidEntryError as ee:
+        startline = buf[:start].count(b"\n") + 1
+        endline = startline + buf[start:end].count(b"\n")
+        raise InvalidEntryError(startline, endline, msg=ee.msg)
+
+
+
+class TaggedBufferReader:
+    """Iterator over the tagged entries in a file read as one buffer.
+
+    In contrast to TaggedReader, the entire file is read at once and the
+    taglines are located by searching the buffer. The data block between
+    two taglines is then converted as a whole, so that no Python objects are
+    created for the individual values. It is considerably faster for files with
+    large arrays, at the price of keeping the file content in memory.
+    """
+
+    def __init__(self, source):
+        """Initializes a TaggedBufferReader.
+
+        Args:
+            source: File name or file like object with tagged data.
+        """
+        self._buffer = _readbuffer(source)
+        self._blocks = _taggedblocks(self._buffer)
+
+
+    def __iter__(self):
+        """Iterator over tagged entries."""
+        return self
+
+
+    def __next__(self):
+        """Next tagged entry."""
+        start, dataoffset, end = next(self._blocks)
+        return _convertblock(self._buffer, start, dataoffset, end)
+
+
+
+############################################################################
+# Reader delivering the data of the entries in chunks
+############################################################################
+
+# Event types delivered by _streamblocks()
+_EVENT_TAG = 0
+_EVENT_DATA = 1
+
+
+def _streamblocks(fp, chunksize):
+    """Generator over the taglines and the data blocks of a file.
+
+    Args:
+        fp: File like object with tagged data.
+        chunksize: Number of bytes to read at once.
+
+    Yields:
+        Tuples (event, content), with event being _EVENT_TAG, if content is a
+        tagline, and _EVENT_DATA, if content is a block of data lines. Data
+        blocks always contain complete lines and are at most of the size of
+        the chunks read (unless a single line is longer).
+    """
+    buf = b""
+    eof = False
+    while not eof:
+        block = fp.read(chunksize)
+        if isinstance(block, str):
+            block = block.encode("ascii")
+        eof = not block
+        buf += block
+        end = len(buf) if eof else buf.rfind(b"\n") + 1
+        pos = 0
+        while pos < end:
+            if buf.startswith(b"@", pos):
+                lineend = buf.find(b"\n", pos, end)
+                if lineend < 0:
+                    lineend = end
+                yield _EVENT_TAG, str(buf[pos:lineend], encoding="ascii")
+                pos = lineend + 1
+            else:
+                ind = buf.find(b"\n@", pos, end)
+                dataend = ind + 1 if ind >= 0 else end
+                yield _EVENT_DATA, buf[pos:dataend]
+                pos = dataend
+        buf = buf[end:]
+
+
+
+class StreamedEntry(TaggedEntry):
+    """Tagged entry, whose data is delivered in chunks.
+
+    It has the same attributes as TaggedEntry, except data. The data must be
+    read via chunks() before the next entry is requested from the reader.
+    """
+
+    __slots__ = ("_reader",)
+
+    def __init__(self, tagline, reader):
+        """Initializes a StreamedEntry instance.
+
+        Args:
+            tagline: Line containing the tag.
+            reader: TaggedStreamReader delivering the data.
+        """
+        self._settag(tagline)
+        if not self.dtype in self._CONVERTERS:
+            raise InvalidEntryError(msg="Invalid data dtype '%s'" % self.dtype)
+        if len(self.shape) != self.rank:
+            raise InvalidEntryError(msg="Incompatible rank and shape")
+        self._reader = reader
+
+
+    def chunks(self):
+        """Generator over the data of the entry.
+
+        Yields:
+            One dimensional arrays with consecutive parts of the data.
+
+        Raises:
+            InvalidEntryError: If data can not be converted or the number of
+                values does not correspond to the shape.
+        """
+        if self.dtype == "complex":
+            converter = self._CONVERTERS["real"]
+        else:
+            converter = self._CONVERTERS[self.dtype]
+        nvalues = 0
+        leftover = None
+        for block in self._reader._datablocks():
+            vsptime.count("parsed", len(block))
+            try:
+                data = converter.convertstring(block)
+            except ConversionError as ex:
+                raise InvalidEntryError(msg=str(ex))
+            if self.dtype == "complex":
+                if leftover is not None:
+                    data = np.concatenate(([ leftover, ], data))
+                    leftover = None
+                if len(data) % 2:
+                    leftover = data[-1]
+                    data = data[:-1]
+                data = data[0::2] + 1.0j * data[1::2]
+            nvalues += len(data)
+            if len(data):
+                yield data
+        expected = ft.reduce(lambda x,y: x*y, self.shape, 1)
+        if leftover is not None or nvalues != expected:
+            raise InvalidEntryError(msg="Invalid nr. of values")
+
+
+
+class TaggedStreamReader:
+    """Iterator over the tagged entries in a file, delivering data in chunks.
+
+    The file is read chunk by chunk, so that the memory needed does not depend
+    on the size of the file or the size of the entries. The iterator returns
+    StreamedEntry instances, whose data must be consumed via their chunks()
+    method before the next entry is requested. Unconsumed data is skipped.
+    """
+
+    # Default nr. of bytes to read at once
+    CHUNKSIZE = 16 * 1024 * 1024
+
+
+    def __init__(self, source, chunksize=None):
+        """Initializes a TaggedStreamReader.
+
+        The reader should be closed via close() (or used as context manager),
+        if it is not iterated until its end.
+
+        Args:
+            source: File name or file like object with tagged data.
+            chunksize: Optional, nr. of bytes to read at once.
+        """
+        if hasattr(source, "read"):
+            self._fp = source
+            self._ownfile = False
+        else:
+            self._fp = vspio.zopen(source, "rb", background=True)
+            self._ownfile = True
+        self._events = _streamblocks(self._fp, chunksize or self.CHUNKSIZE)
+        self._next = next(self._events, None)
+
+
+    def close(self):
+        """Closes the file (if it had been opened by the reader)."""
+        self._events.close()
+        self._next = None
+        if self._ownfile:
+            self._fp.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.close()
+        return False
+
+
+    def _datablocks(self):
+        """Generator over the data blocks until the next tagline."""
+        while self._next is not None and self._next[0] == _EVENT_DATA:
+            block = self._next[1]
+            self._next = next(self._events, None)
+            yield block
+
+
+    def __iter__(self):
+        """Iterator over streamed entries."""
+        return self
+
+
+    def __next__(self):
+        """Next streamed entry."""
+        for block in self._datablocks():
+            pass
+        if self._next is None:
+            self.close()
+            raise StopIteration
+        tagline = self._next[1]
+        self._next = next(self._events, None)
+        return StreamedEntry(tagline, self)
+
+
+
+############################################################################
+# Collection converting its entries on first access
+############################################################################
+
+class UnconvertedEntry:
+    """Placeholder for a tagged entry, which had not been converted yet.
+
+    Attributes:
+        tagline: The entire tag line as string.
+        name: String with the name of the tag label.
+        dtype: String with the data type (None if tagline is invalid).
+        rank: Integer with the rank of the array (None if tagline is invalid).
+        shape: Tuple with the shape of the array (None if tagline is invalid).
+        offset: Position of the tagline in the file.
+        length: Length of the tagged block (including the tagline).
+    """
+
+    __slots__ = ("tagline", "name", "dtype", "rank", "shape", "offset",
+                 "length")
+
+    def __init__(self, tagline, offset, length):
+        """Initializes an UnconvertedEntry instance.
+
+        Args:
+            tagline: Line containing the tag.
+            offset: Position of the tagline in the file.
+            length: Length of the tagged block (including the tagline).
+        """
+        self.tagline = tagline
+        self.name = tagline[1:].split(":", 1)[0].strip()
+        self.dtype = self.rank = self.shape = None
+        match = TaggedEntry._PAT_TAGLINE.match(tagline.strip())
+        if match:
+            self.dtype = match.group("dtype")
+            self.rank = int(match.group("rank"))
+            self.shape = tuple([ int(s) for s in
+                                 match.group("shape").split(",") if s ])
+        self.offset = offset
+        self.length = length
+
+
+
+class LazyTaggedCollection(TaggedCollection):
+    """Collection of tagged entries, which are converted on first access.
+
+    When created, the file is scanned once for the taglines only. The data of
+    an entry is converted when it is returned by get(), matching_taglines()
+    or during iteration. Uncompressed files are memory mapped, so that only
+    the parts of the file actually needed are read. Files in binary tagged
+    format need no conversion, their entries are views into the buffer.
+    """
+
+    def __init__(self, source):
+        """Initializes a LazyTaggedCollection instance.
+
+        Args:
+            source: File name or file like object with tagged data.
+        """
+        TaggedCollection.__init__(self, [])
+        self._buffer = _readbuffer(source, usemmap=True)
+        buf = self._buffer
+        if isbinary(buf):
+            self.extend(_binaryentries(buf))
+            return
+        self.extend([ UnconvertedEntry(str(buf[start:dataoffset],
+                                           encoding="ascii"),
+                                       start, end - start)
+                      for start, dataoffset, end in _taggedblocks(buf) ])
+
+
+    def _entry(self, ind):
+        """Returns the entry at a given position, converting it if necessary.
+
+        Args:
+            ind: Position of the entry.
+
+        Returns:
+            Converted entry. It is also stored in the collection.
+        """
+        entry = self._entries[ind]
+        if isinstance(entry, UnconvertedEntry):
+            end = entry.offset + entry.length
+            dataoffset = entry.offset + len(entry.tagline)
+            entry = _convertblock(self._buffer, entry.offset, dataoffset, end)
+            entry = self._packed(entry)
+            self._entries[ind] = entry
+        return entry
+
+
+
+############################################################################
+# Binary tagged format
+############################################################################
+
+# Magic line at the beginning of files in binary tagged format
+BINARY_MAGIC = b"@@valsimp-tagged-binary:1\n"
+
+# Alignment of the data blocks in binary tagged files (in bytes)
+BINARY_ALIGNMENT = 16
+
+# Types of the data in binary tagged files
+BINARY_DTYPES = { "integer": np.dtype("<i8"),
+                  "real": np.dtype("<f8"),
+                  "complex": np.dtype("<c16"),
+                  "logical": np.dtype("|b1"),
+                  }
+
+
+def isbinary(source):
+    """Checks whether a file is in binary tagged format.
+
+    Args:
+        source: File name or bytes like object with the content of the file.
+
+    Returns:
+        True if source starts with the magic line of the binary format.
+    """
+    if isinstance(source, str):
+        with vspio.zopen(source, "rb") as fp:
+            source = fp.read(len(BINARY_MAGIC))
+    return source[:len(BINARY_MAGIC)] == BINARY_MAGIC
+
+
+def _alignedoffset(offset):
+    """Returns the first aligned position at or after a given offset."""
+    return -(-offset // BINARY_ALIGNMENT) * BINARY_ALIGNMENT
+
+
+def _binaryentries(buf):
+    """Generator over the entries of a buffer in binary tagged format.
+
+    The format consists of the magic line followed by the entries. Each entry
+    starts with its tagline (same format as for text files), terminated by a
+    newline. Then, starting at the next position aligned to BINARY_ALIGNMENT,
+    the raw values follow as a little endian array of the type given in
+    BINARY_DTYPES. The tagline of the next entry follows directly after the
+    data.
+
+    Args:
+        buf: Bytes like object or one dimensional uint8 array with the content
+            of the file.
+
+    Yields:
+        TaggedEntry instances, whose data are views into the buffer.
+
+    Raises:
+        InvalidEntryError: If the buffer is not in a valid binary format.
+    """
+    if isinstance(buf, np.ndarray):
+        raw = buf
+    else:
+        raw = np.frombuffer(buf, dtype=np.uint8)
+    if bytes(raw[:len(BINARY_MAGIC)]) != BINARY_MAGIC:
+        raise InvalidEntryError(msg="Missing binary tagged format header")
+    pos = len(BINARY_MAGIC)
+    size = len(raw)
+    while pos < size:
+        lineend = pos + bytes(raw[pos:pos + 1024]).find(b"\n")
+        if lineend < pos:
+            raise InvalidEntryError(msg="Invalid tag line at offset %d" % pos)
+        tagline = str(bytes(raw[pos:lineend]), encoding="ascii")
+        entry = TaggedEntry.__new__(TaggedEntry)
+        entry._settag(tagline)
+        dtype = BINARY_DTYPES.get(entry.dtype)
+        if dtype is None:
+            raise InvalidEntryError(msg="Invalid data dtype '%s'"
+                                    % entry.dtype)
+        count = ft.reduce(lambda x,y: x*y, entry.shape, 1)
+        start = _alignedoffset(lineend + 1)
+        end = start + count * dtype.itemsize
+        if end > size:
+            raise InvalidEntryError(msg="Truncated data of entry '%s'"
+                                    % entry.name)
+        entry._setdata(raw[start:end].view(dtype))
+        yield entry
+        pos = end
+
+
+class TaggedBinaryReader:
+    """Iterator over the tagged entries in a file in binary tagged format.
+
+    Uncompressed files given by name are memory mapped and the data of the
+    entries are views into the mapped file, so that no data is copied or
+    converted and only the parts of the file actually used are read.
+    """
+
+    def __init__(self, source):
+        """Initializes a TaggedBinaryReader.
+
+        Args:
+            source: File name or file like object with tagged data.
+        """
+        if (not hasattr(source, "read") and not vspio.iscompressed(source)
+                and os.path.getsize(source)):
+            buf = np.memmap(source, dtype=np.uint8, mode="r")
+        else:
+            buf = _readbuffer(source)
+        self._entries = _binaryentries(buf)
+
+
+    def __iter__(self):
+        """Iterator over tagged entries."""
+        return self
+
+
+    def __next__(self):
+        """Next tagged entry."""
+        return next(self._entries)
+
+
+
+class TaggedWriter:
+    """Writes tagged entries in text or in binary format."""
+
+    # Format and nr. of values per line for the text format
+    _TEXTFORMATS = { "integer": (" %11d", 6),
+                     "real": (" %23.16E", 3),
+                     "complex": (" %23.16E", 4),
+                     "logical": (" %s", 20),
+                     }
+
+    # Nr. of lines formatted at once in text format
+    _LINES_PER_BLOCK = 4096
+
+
+    def __init__(self, target, binary=False):
+        """Initializes a TaggedWriter.
+
+        Args:
+            target: File name or binary file like object to write to.
+            binary: Optional, if True, binary format is written, otherwise
+                text. (def.: False)
+        """
+        if hasattr(target, "write"):
+            self._fp = target
+            self._ownfile = False
+        else:
+            self._fp = vspio.zopen(target, "wb")
+            self._ownfile = True
+        self.binary = binary
+        self._pos = 0
+        if binary:
+            self._write(BINARY_MAGIC)
+
+
+    def close(self):
+        """Closes the file (if it had been opened by the writer)."""
+        if self._ownfile:
+            self._fp.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.close()
+        return False
+
+
+    def write(self, name, data):
+        """Writes an array as tagged entry.
+
+        Args:
+            name: Name of the entry.
+            data: Scalar or array (integer, real, complex or logical).
+        """
+        data = np.asarray(data)
+        if data.dtype == bool:
+            dtype = "logical"
+        elif np.issubdtype(data.dtype, np.integer):
+            dtype = "integer"
+        elif np.issubdtype(data.dtype, np.complexfloating):
+            dtype = "complex"
+        elif np.issubdtype(data.dtype, np.floating):
+            dtype = "real"
+        else:
+            raise InvalidEntryError(msg="Unsupported data type '%s'"
+                                    % data.dtype)
+        tagline = "@%s:%s:%d:%s" % (name, dtype, data.ndim,
+                                     ",".join([ str(nn)
+                                                for nn in data.shape ]))
+        self.writeentry(TaggedEntry.fromarray(tagline, data))
+
+
+    def writeentry(self, entry):
+        """Writes a tagged entry.
+
+        Args:
+            entry: TaggedEntry to write.
+        """
+        self._write(entry.tagline.encode("ascii") + b"\n")
+        if self.binary:
+            padding = _alignedoffset(self._pos) - self._pos
+            self._write(b"\0" * padding)
+            data = np.ascontiguousarray(entry.data,
+                                        dtype=BINARY_DTYPES[entry.dtype])
+            self._write(memoryview(data.reshape(-1).view(np.uint8)))
+        else:
+            self._writetext(entry)
+
+
+    def _writetext(self, entry):
+        """Writes the data of an entry in text format."""
+        values = np.ravel(entry.data)
+        if entry.dtype == "complex":
+            values = np.ravel(np.column_stack((values.real, values.imag)))
+        elif entry.dtype == "logical":
+            values = np.where(values, "T", "F")
+        fmt, perline = self._TEXTFORMATS[entry.dtype]
+        blocksize = perline * self._LINES_PER_BLOCK
+        for start in range(0, len(values), blocksize):
+            block = values[start:start + blocksize].tolist()
+            nfull = len(block) // perline
+            text = ((fmt * perline + "\n") * nfull
+                    + fmt * (len(block) - nfull * perline))
+            text = text % tuple(block)
+            if not text.endswith("\n"):
+                text += "\n"
+            self._write(text.encode("ascii"))
+
+
+    def _write(self, data):
+        """Writes bytes to the file while keeping track of the position."""
+        self._fp.write(data)
+        self._pos += len(data) if isinstance(data, bytes) else data.nbytes
+
+
+############################################################################
+# Parallel conversion of large files
+############################################################################
+
+# Files smaller than this are converted serially by default
+PARALLEL_MINSIZE = 16 * 1024 * 1024
+
+# Minimal nr. of data bytes converted by one task
+_PARALLEL_MINPIECE = 1024 * 1024
+
+# Nr. of tasks per worker process (for load balancing)
+_PARALLEL_TASKS_PER_WORKER = 4
+
+# Converters used for parts of a data block. Complex values are converted as
+# real and imaginary parts and combined after all parts had been converted.
+_PIECE_CONVERTERS = { "integer": IntConverter(),
+                      "real": FloatConverter(),
+                      "complex": FloatConverter(),
+                      "logical": LogicalConverter()
+                      }
+
+
+def parallelload(source, workers=None, minsize=None):
+    """Reads a tagged file by converting its data in parallel processes.
+
+    The buffer is scanned for the taglines first. The data blocks are then
+    split into pieces at line boundaries (large blocks into several pieces)
+    and the pieces are converted by a pool of processes. The workers access
+    the file via memory mapping (or via shared memory, if the file had to be
+    decompressed) and return the converted values in shared memory, from
+    where they are copied into the arrays of the entries.
+
+    Args:
+        source: File name or file like object with tagged data.
+        workers: Optional, nr. of worker processes. (def.: nr. of CPUs)
+        minsize: Optional, files smaller than this (in bytes) are converted
+            serially, as starting the workers would take longer than the
+            conversion. (def.: PARALLEL_MINSIZE)
+
+    Returns:
+        TaggedCollection with the entries of the file.
+
+    Raises:
+        InvalidEntryError: If an entry of the file is invalid.
+    """
+    workers = workers or os.cpu_count() or 1
+    if minsize is None:
+        minsize = PARALLEL_MINSIZE
+    buf = _readbuffer(source, usemmap=True)
+    if isbinary(buf):
+        return TaggedCollection(_binaryentries(buf))
+    if workers < 2 or len(buf) < minsize or shared_memory is None:
+        return TaggedCollection([ _convertblock(buf, *block)
+                                  for block in _taggedblocks(buf) ])
+    blocks = [ (_parsetagline(buf, *block),) + block
+               for block in _taggedblocks(buf) ]
+    tasks = _splitpieces(buf, blocks, workers * _PARALLEL_TASKS_PER_WORKER)
+    vsptime.count("parsed", len(buf))
+    inputshm = None
+    segments = {}
+    # Workers must share the tracker of this process, otherwise the shared
+    # memory they create would be removed when they exit.
+    resource_tracker.ensure_running()
+    try:
+        if isinstance(buf, mmap.mmap):
+            inputname, inshared = os.path.abspath(source), False
+        else:
+            inputshm = shared_memory.SharedMemory(create=True,
+                                                  size=max(len(buf), 1))
+            inputshm.buf[:len(buf)] = buf
+            inputname, inshared = inputshm.name, True
+        with concurrent.futures.ProcessPoolExecutor(
+                workers, mp_context=_poolcontext()) as pool:
+            futures = [ pool.submit(_convertpieces, inputname, inshared, task)
+                        for task in tasks ]
+            # All futures are collected before an error is raised, as the
+            # segments of the successful tasks must be removed as well.
+            results = []
+            error = None
+            for future in futures:
+                try:
+                    segname, pieceresults = future.result()
+                except Exception as ex:
+                    error = error or ex
+                    continue
+                segments[segname] = shared_memory.SharedMemory(segname)
+                results += [ (segments[segname],) + result
+                             for result in pieceresults ]
+        if error is not None:
+            raise error
+        entries = _assembleentries(buf, blocks, tasks, results)
+    finally:
+        for segment in segments.values():
+            segment.close()
+            segment.unlink()
+        if inputshm is not None:
+            inputshm.close()
+            inputshm.unlink()
+    return TaggedCollection(entries)
+
+
+def _poolcontext():
+    """Returns the multiprocessing context for the worker processes.
+
+    The caller may run several threads (e.g. the test case workers and the
+    log writer), so the workers are not forked from it directly.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _blocklines(buf, start, end):
+    """Returns the line numbers (first, after last) of a part of a buffer."""
+    startline = buf[:start].count(b"\n") + 1
+    return startline, startline + buf[start:end].count(b"\n")
+
+
+def _parsetagline(buf, start, dataoffset, end):
+    """Returns an entry without data, initialized from a tagline.
+
+    Raises:
+        InvalidEntryError: If the tagline is invalid. The line numbers of the
+            block are set in the exception.
+    """
+    entry = TaggedEntry.__new__(TaggedEntry)
+    try:
+        entry._settag(str(buf[start:dataoffset], encoding="ascii"))
+        if entry.dtype not in _PIECE_CONVERTERS:
+            raise InvalidEntryError(msg="Invalid data dtype '%s'"
+                                    % entry.dtype)
+    except InvalidEntryError as ee:
+        raise InvalidEntryError(*_blocklines(buf, start, end), msg=ee.msg)
+    return entry
+
+
+def _splitpieces(buf, blocks, ntasks):
+    """Splits the data blocks into pieces and distributes them on tasks.
+
+    Args:
+        buf: Bytes like object with tagged data.
+        blocks: List of tuples (entry, start, dataoffset, end) describing the
+            blocks of the buffer.
+        ntasks: Desired nr. of tasks.
+
+    Returns:
+        List of tasks, each being a list of pieces (start, end, dtype, iblock)
+        with start and end being the range of the piece in the buffer and
+        iblock the index of the block it belongs to.
+    """
+    totalsize = sum([ end - dataoffset for _, _, dataoffset, end in blocks ])
+    tasksize = max(totalsize // ntasks, _PARALLEL_MINPIECE)
+    tasks = []
+    task = []
+    tasklen = 0
+    for iblock, (entry, start, dataoffset, end) in enumerate(blocks):
+        piecestart = dataoffset
+        while True:
+            pieceend = end
+            if end - piecestart > tasksize - tasklen:
+                lineend = buf.find(b"\n", piecestart + tasksize - tasklen, end)
+                if lineend >= 0:
+                    pieceend = lineend + 1
+            task.append((piecestart, pieceend, entry.dtype, iblock))
+            tasklen += pieceend - piecestart
+            if tasklen >= tasksize:
+                tasks.append(task)
+                task = []
+                tasklen = 0
+            if pieceend == end:
+                break
+            piecestart = pieceend
+    if task:
+        tasks.append(task)
+    return tasks
+
+
+def _convertpieces(inputname, inshared, pieces):
+    """Converts pieces of a tagged file (executed in the worker processes).
+
+    Args:
+        inputname: Name of the file or of the shared memory with the data.
+        inshared: True if inputname is the name of a shared memory.
+        pieces: List of pieces (start, end, dtype, iblock) to convert.
+
+    Returns:
+        Tuple (segname, results) with segname being the name of the shared
+        memory containing the converted values and results a list with a
+        tuple (offset, count, dtype) for each piece, giving the position of
+        the values in the shared memory, their number and their type.
+
+    Raises:
+        InvalidEntryError: If a piece could not be converted. The line numbers
+            of the piece are set in the exception.
+    """
+    if inshared:
+        inputshm = shared_memory.SharedMemory(inputname)
+        buf = inputshm.buf
+    else:
+        with open(inputname, "rb") as fp:
+            buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        arrays = []
+        for start, end, dtype, iblock in pieces:
+            text = bytes(buf[start:end])
+            try:
+                arrays.append(_PIECE_CONVERTERS[dtype].convertstring(text))
+            except ConversionError as ex:
+                raise InvalidEntryError(*_blocklines(bytes(buf[:end]), start,
+                                                     end),
+                                        msg=str(ex))
+    finally:
+        if inshared:
+            del buf
+            inputshm.close()
+        else:
+            buf.close()
+    size = sum([ array.nbytes for array in arrays ])
+    segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    results = []
+    offset = 0
+    try:
+        for array in arrays:
+            target = np.ndarray(array.shape, array.dtype, buffer=segment.buf,
+                                offset=offset)
+            target[:] = array
+            del target
+            results.append((offset, len(array), array.dtype.str))
+            offset += array.nbytes
+    except BaseException:
+        segment.close()
+        segment.unlink()
+        raise
+    segname = segment.name
+    segment.close()
+    return segname, results
+
+
+def _assembleentries(buf, blocks, tasks, results):
+    """Creates the entries from the converted pieces.
+
+    Args:
+        buf: Bytes like object with tagged data.
+        blocks: List of tuples (entry, start, dataoffset, end) describing the
+            blocks of the buffer.
+        tasks: List of tasks as returned by _splitpieces().
+        results: List of tuples (segment, offset, count, dtype) for every
+            piece of every task, with segment being the shared memory with
+            the converted values of the piece.
+
+    Returns:
+        List of TaggedEntry instances.
+    """
+    blockpieces = [ [] for _ in blocks ]
+    pieces = [ piece for task in tasks for piece in task ]
+    for piece, result in zip(pieces, results):
+        blockpieces[piece[3]].append(result)
+    entries = []
+    for (entry, start, dataoffset, end), converted in zip(blocks,
+                                                          blockpieces):
+        count = sum([ result[2] for result in converted ])
+        data = np.empty(count, dtype=converted[0][3])
+        pos = 0
+        for segment, offset, npiece, dtype in converted:
+            data[pos:pos + npiece] = np.ndarray(npiece, dtype,
+                                                buffer=segment.buf,
+                                                offset=offset)
+            pos += npiece
+        try:
+            if entry.dtype == "complex":
+                data = ComplexConverter._tocomplex(data)
+            entry._setdata(data)
+        except (ConversionError, InvalidEntryError) as ex:
+            msg = ex.msg if isinstance(ex, InvalidEntryError) else str(ex)
+            raise InvalidEntryError(*_blocklines(buf, start, end), msg=msg)
+        entries.append(entry)
+    return entries
+
+
 if __name__ == "__main__":
     import io
 
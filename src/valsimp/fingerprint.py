@@ -0,0 +1,124 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Fingerprints of the inputs of test cases.
+
+The fingerprint of a test case is a hash over the content of all files and
+directories it depends on (input files, executables, reference data, etc.)
+and over additional values (e.g. context variables). If the fingerprint did
+not change since the last run, the results of the last run are still valid.
+
+As hashing large files (e.g. executables) is expensive, the hash of every
+file is cached together with its size and modification time. The file is
+only hashed again, if any of those changed.
+"""
+import os
+import hashlib
+import threading
+
+__all__ = [ "Fingerprinter", ]
+
+
+class Fingerprinter:
+    """Calculates fingerprints using a persistent cache for the file hashes."""
+
+    # Size of the blocks, when calculating the hash of a file
+    HASH_BLOCKSIZE = 1024 * 1024
+
+    def __init__(self, store=None):
+        """Initializes a Fingerprinter instance.
+
+        Args:
+            store: Optional, StatusStore to use as persistent cache for the
+                file hashes. (def.: hashes are cached in memory only)
+        """
+        self.store = store
+        self._lock = threading.Lock()
+        self._hashes = None
+        self._newhashes = []
+
+    def fingerprint(self, paths, values=()):
+        """Returns the fingerprint for given files and values.
+
+        Args:
+            paths: Files or directories to include. Directories are included
+                recursively, non-existing paths are included by name only.
+            values: Optional, strings to include.
+
+        Returns:
+            Fingerprint as hexadecimal string.
+        """
+        sha = hashlib.sha256()
+        for path in paths:
+            sha.update(("path %s %s\n" % (path, self.pathdigest(path)))
+                       .encode())
+        for value in values:
+            sha.update(("value %s\n" % value).encode())
+        self.flush()
+        return sha.hexdigest()
+
+    def pathdigest(self, path):
+        """Returns the hash of a file or a directory (with its content).
+
+        Args:
+            path: Name of the file or directory.
+
+        Returns:
+            Hash as hexadecimal string ('missing' if path does not exist).
+        """
+        if os.path.isdir(path):
+            sha = hashlib.sha256()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for fname in sorted(files):
+                    absname = os.path.join(root, fname)
+                    relname = os.path.relpath(absname, path)
+                    sha.update(("%s %s\n" % (relname,
+                                             self.filedigest(absname)))
+                               .encode())
+            return sha.hexdigest()
+        elif os.path.exists(path):
+            return self.filedigest(path)
+        else:
+            return "missing"
+
+    def filedigest(self, fname):
+        """Returns the hash of a file, using the cache if possible.
+
+        Args:
+            fname: Name of the file.
+
+        Returns:
+            Hash as hexadecimal string.
+        """
+        fname = os.path.abspath(fname)
+        stat = os.stat(fname)
+        key = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if self._hashes is None:
+                self._hashes = {}
+                if self.store:
+                    self._hashes.update(self.store.loadfilehashes())
+            cached = self._hashes.get(fname)
+        if cached is not None and cached[:2] == key:
+            return cached[2]
+        sha = hashlib.sha256()
+        with open(fname, "rb") as fp:
+            block = fp.read(self.HASH_BLOCKSIZE)
+            while block:
+                sha.update(block)
+                block = fp.read(self.HASH_BLOCKSIZE)
+        digest = sha.hexdigest()
+        with self._lock:
+            self._hashes[fname] = key + (digest,)
+            self._newhashes.append((fname,) + key + (digest,))
+        return digest
+
+    def flush(self):
+        """Writes the newly calculated file hashes into the store."""
+        with self._lock:
+            newhashes = self._newhashes
+            self._newhashes = []
+        if newhashes and self.store:
+            self.store.savefilehashes(newhashes)
@@ -0,0 +1,177 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Content addressed store for input files shared between test cases.
+
+Every file added to the store is kept there only once, under the name of its
+content hash, no matter from how many test directories it had been added.
+The working directories of the test cases then get links to the stored files
+instead of own copies. The stored files are read-only, so that a calculation
+trying to modify a linked file fails instead of corrupting the store.
+
+The hashes of the source files are cached by their size and modification
+time (see Fingerprinter), so unchanged files are not read again.
+"""
+import os
+import stat
+import hashlib
+import tempfile
+import valsimp.fingerprint as vspfp
+import valsimp.timing as vsptime
+
+__all__ = [ "InputStore", ]
+
+
+class InputStore:
+    """Content addressed store for input files."""
+
+    # Size of the blocks, when copying a file into the store
+    COPY_BLOCKSIZE = 1024 * 1024
+
+    def __init__(self, storedir, fingerprinter=None):
+        """Initializes an InputStore instance.
+
+        Args:
+            storedir: Directory of the store.
+            fingerprinter: Optional, Fingerprinter used to obtain (cached)
+                file hashes. (def.: new Fingerprinter without persistent
+                hash cache)
+        """
+        self.storedir = storedir
+        self.fingerprinter = fingerprinter or vspfp.Fingerprinter()
+
+    def add(self, fname):
+        """Adds a file to the store, if its content is not stored yet.
+
+        Args:
+            fname: Name of the file.
+
+        Returns:
+            Name of the stored file.
+        """
+        storedname = self._storedname(self.fingerprinter.filedigest(fname))
+        if os.path.isfile(storedname):
+            return storedname
+        return self._store(fname)
+
+    def flush(self):
+        """Saves the newly calculated file hashes in the persistent cache."""
+        self.fingerprinter.flush()
+
+    def hardlinked(self, dirnames):
+        """Returns the stored files, which are hard linked within directories.
+
+        Args:
+            dirnames: List of directories to search (e.g. working directories
+                of test cases).
+
+        Returns:
+            Set with the names of the stored files.
+        """
+        if not os.path.isdir(self.storedir):
+            return set()
+        inodes = set()
+        for dirname in dirnames:
+            for root, dirs, files in os.walk(dirname):
+                for fname in files:
+                    try:
+                        fstat = os.lstat(os.path.join(root, fname))
+                    except OSError:
+                        continue
+                    if stat.S_ISREG(fstat.st_mode) and fstat.st_nlink > 1:
+                        inodes.add((fstat.st_dev, fstat.st_ino))
+        if not inodes:
+            return set()
+        linked = set()
+        for absname in self._storedfiles():
+            try:
+                fstat = os.stat(absname)
+            except OSError:
+                continue
+            if (fstat.st_dev, fstat.st_ino) in inodes:
+                linked.add(absname)
+        return linked
+
+    def prune(self, candidates=None):
+        """Removes stored files, which are not hard linked anywhere else.
+
+        Args:
+            candidates: Optional, names of the stored files to check (e.g.
+                as returned by hardlinked() before the linking directories
+                had been removed). (def.: all stored files)
+
+        Returns:
+            Nr. of bytes freed.
+
+        Note:
+            Stored files which are only referenced by symbolic links are
+            removed as well, if they are checked.
+        """
+        if not os.path.isdir(self.storedir):
+            return 0
+        if candidates is None:
+            candidates = self._storedfiles()
+        freed = 0
+        for absname in candidates:
+            try:
+                fstat = os.stat(absname)
+                if fstat.st_nlink == 1:
+                    os.remove(absname)
+                    freed += fstat.st_size
+            except OSError:
+                continue
+            # Remove the directory of the hash prefix, once it is empty
+            try:
+                os.rmdir(os.path.dirname(absname))
+            except OSError:
+                pass
+        return freed
+
+    def _storedfiles(self):
+        """Returns the names of all files in the store."""
+        stored = []
+        for root, dirs, files in os.walk(self.storedir):
+            stored += [ os.path.join(root, fname) for fname in files
+                        if not fname.startswith(".tmp") ]
+        return stored
+
+    def _storedname(self, digest):
+        """Returns the name of the stored file with a given hash."""
+        return os.path.join(self.storedir, digest[:2], digest[2:])
+
+    def _store(self, fname):
+        """Copies a file into the store.
+
+        The file is copied into a temporary file and hashed at the same time,
+        so the stored file is always named after the hash of its actual
+        content, even if the source file changed in the meantime.
+
+        Args:
+            fname: Name of the file.
+
+        Returns:
+            Name of the stored file.
+        """
+        os.makedirs(self.storedir, exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=self.storedir, prefix=".tmp")
+        try:
+            sha = hashlib.sha256()
+            with open(fname, "rb") as fsource, os.fdopen(fd, "wb") as ftarget:
+                block = fsource.read(self.COPY_BLOCKSIZE)
+                while block:
+                    sha.update(block)
+                    ftarget.write(block)
+                    vsptime.count("copied", len(block))
+                    block = fsource.read(self.COPY_BLOCKSIZE)
+            execbits = os.stat(fname).st_mode & 0o111
+            os.chmod(tmpname, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+                     | execbits)
+            storedname = self._storedname(sha.hexdigest())
+            os.makedirs(os.path.dirname(storedname), exist_ok=True)
+            os.replace(tmpname, storedname)
+        except BaseException:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+        return storedname
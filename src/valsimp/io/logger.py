@@ -2,13 +2,54 @@
 # This file is part of the ValSimP package.
 # See the packages LICENSE file for copyright and licensing conditions.
 ###############################################################################
+"""Logging of test related events.
+
+A TestLogger turns its calls into structured events (LogEvent), which are
+handed over to a sink. Sinks are renderers writing the events immediately in
+a given format (TextRenderer for the indented text, JSONLinesRenderer for a
+machine readable format), an EventBuffer collecting them, or a LogWriter,
+which queues them and passes them in batches from a single background thread
+to several renderers. The indentation level and the current test case and
+action are kept separately for each thread, so a logger can be shared by
+test cases processed in different threads.
+"""
 import sys
+import json
+import time
+import queue
+import threading
+import collections
 import valsimp as vsp
 
+__all__ = [ "LEVEL_INFO", "LEVEL_WARNING", "LEVEL_ERROR", "LogEvent",
+            "TestLogger", "TextRenderer", "JSONLinesRenderer", "EventBuffer",
+            "LogWriter", ]
+
 REPORT_SEPARATOR = "-"*79
 REPORT_HEADER = ("%s\n%-40s %-12s %-12s %-12s\n%s"
                  % (REPORT_SEPARATOR, "testcase", "prepare", "run", "test",
                     REPORT_SEPARATOR))
+REPORT_HEADER_TIMING = ("%s\n%-30s %-12s %-12s %-12s %9s\n%s"
+                        % (REPORT_SEPARATOR, "testcase", "prepare", "run",
+                           "test", "time [s]", REPORT_SEPARATOR))
+
+# Levels of the events
+LEVEL_INFO = "info"
+LEVEL_WARNING = "warning"
+LEVEL_ERROR = "error"
+
+# Structured log event
+#   time: Time of the event in seconds since the epoch.
+#   testcase: Name of the test case (None if not within an action).
+#   phase: Action being performed (None if not within an action).
+#   level: Level of the event (one of the LEVEL_* constants).
+#   message: Text of the event (may contain several lines).
+#   depth: Indentation level in the text output.
+#   breakline: Whether the lines should be broken in the text output to fit
+#       to the line width.
+LogEvent = collections.namedtuple(
+    "LogEvent", "time testcase phase level message depth breakline")
+
 
 class TestLogger:
     """Simple class for logging test related events"""
@@ -22,58 +63,75 @@ class TestLogger:
                    vsp.STATUS_NOTRUN: "Not run",
                    vsp.STATUS_NOTFINISHED: "Not finished",
                  }
+    RESULT_LEVEL = { vsp.STATUS_OK: LEVEL_INFO,
+                     vsp.STATUS_FAILED: LEVEL_ERROR,
+                     vsp.STATUS_ERROR: LEVEL_ERROR,
+                   }
 
-    def __init__(self, fp=None):
+    def __init__(self, fp=None, sink=None):
         """Initializes TestLogger instance.
 
         Args:
-            fp: Optional, file object in which log should be written
-                (def.: stdout)
+            fp: Optional, file object in which log should be written as
+                indented text (def.: stdout)
+            sink: Optional, object with an emit() method receiving the list
+                of events (e.g. a LogWriter). If specified, fp is ignored.
         """
-        if fp:
-            self.fp = fp
-        else:
-            self.fp = sys.stdout
-        self._indentlevel = 0
-        self._setindent()
+        if sink is None:
+            sink = TextRenderer(fp or sys.stdout, self.LINEWIDTH,
+                                self.INDENTWIDTH)
+        self.sink = sink
+        self._state = threading.local()
+
+    def emit(self, events):
+        """Passes already created events to the sink of the logger.
+
+        Args:
+            events: List of LogEvent instances (e.g. collected by an
+                EventBuffer). They are kept together in the output.
+        """
+        if events:
+            self.sink.emit(events)
 
-    def write(self, txt, breakline=False):
+    def flush(self):
+        """Flushes the sink of the logger (if it supports flushing)."""
+        flush = getattr(self.sink, "flush", None)
+        if flush:
+            flush()
+
+    def write(self, txt, breakline=False, level=LEVEL_INFO):
         """Writes the given string (line by line) into the log.
 
         Args:
             txt: Text to write.
             breakline: Optional, if set to True, lines are broken to fit
                 to the line width with current indentation taken into account.
+            level: Optional, level of the event (def.: LEVEL_INFO).
         """
-        self.writelines(txt.split("\n"), breakline)
+        self.sink.emit([ self._event(txt, level, breakline) ])
 
-    def writeline(self, line, breakline=False):
+    def writeline(self, line, breakline=False, level=LEVEL_INFO):
         """Writes the given line into the log.
 
         Args:
             line: Line to write.
             breakline: Optional, if set to True, lines are broken to fit
                 to the line width with current indentation taken into account.
+            level: Optional, level of the event (def.: LEVEL_INFO).
         """
-        if breakline:
-            lines = self._breakline(line)
-        else:
-            lines = [ line, ]
-        for curline in lines:
-            self.fp.write(self._indent)
-            self.fp.write(curline)
-            self.fp.write("\n")
+        self.sink.emit([ self._event(line, level, breakline) ])
 
-    def writelines(self, lines, breakline=False):
+    def writelines(self, lines, breakline=False, level=LEVEL_INFO):
         """Writes given lines into the log.
 
         Args:
             lines: List of lines to write.
             breakline: Optional, if set to True, lines are broken to fit
                 to the line width with current indentation taken into account.
+            level: Optional, level of the events (def.: LEVEL_INFO).
         """
-        for line in lines:
-            self.writeline(line, breakline)
+        self.sink.emit([ self._event(line, level, breakline)
+                         for line in lines ])
 
     def teststart(self, testcase, action):
         """Indicates the start of a given test action in the log.
@@ -84,6 +142,9 @@ class TestLogger:
             testcase: Name of the test case.
             action: Name of the action being performed.
         """
+        state = self._getstate()
+        state.testcase = testcase
+        state.phase = action
         self.writeline("%s:\t%s:\tstarted..." % (testcase, action))
         self.increaseindent()
 
@@ -100,14 +161,23 @@ class TestLogger:
         """
         self.decreaseindent()
         resultstr = self.RESULT_STR.get(result, "UNKNOWN")
-        self.writeline("%s:\t%s:\t%s" % (testcase, action, resultstr))
+        level = self.RESULT_LEVEL.get(result, LEVEL_WARNING)
+        state = self._getstate()
+        state.testcase = testcase
+        state.phase = action
+        events = [ self._event("%s:\t%s:\t%s" % (testcase, action, resultstr),
+                               level) ]
         if msg:
-            self.increaseindent()
-            self.write(msg, breakline=True)
-            self.decreaseindent()
+            state.indentlevel += 1
+            events.append(self._event(msg, level, True))
+            state.indentlevel -= 1
+        state.testcase = None
+        state.phase = None
+        self.sink.emit(events)
 
 
-    def testsummary(self, testcase, status_prepare, status_run, status_test):
+    def testsummary(self, testcase, status_prepare, status_run, status_test,
+                    walltime=None):
         """Prints a summary of a given test case (as a line of a table).
 
         Args:
@@ -115,11 +185,40 @@ class TestLogger:
             status_prepare: Status of the preparation.
             status_run: Status of the run.
             status_test: Status of the test.
+            walltime: Optional, total wall clock time of the actions in
+                seconds. If specified, it is printed in an additional column
+                (see REPORT_HEADER_TIMING).
+        """
+        if walltime is None:
+            self.writeline("%-40s %-12s %-12s %-12s"
+                       % (testcase, self.RESULT_STR[status_prepare],
+                          self.RESULT_STR[status_run],
+                          self.RESULT_STR[status_test]))
+        else:
+            self.writeline("%-30s %-12s %-12s %-12s %9.1f"
+                           % (testcase, self.RESULT_STR[status_prepare],
+                              self.RESULT_STR[status_run],
+                              self.RESULT_STR[status_test], walltime))
+
+    def testtiming(self, testcase, timings):
+        """Prints the resources used by the actions of a test case.
+
+        Args:
+            testcase: Name of the testcase.
+            timings: List of (action, result) tuples with the name of the
+                action and the dictionary of the measured quantities (see
+                PhaseTimer).
         """
-        self.writeline("%-40s %-12s %-12s %-12s"
-                   % (testcase, self.RESULT_STR[status_prepare],
-                      self.RESULT_STR[status_run],
-                      self.RESULT_STR[status_test]))
+        total = sum([ result["wall"] for action, result in timings ])
+        self.writeline("%-40s %9.1f s" % (testcase, total))
+        self.increaseindent()
+        for action, result in timings:
+            line = "%-10s wall %9.2f s" % (action, result["wall"])
+            if result.get("childcpu") is not None:
+                line += "   child cpu %9.2f s" % result["childcpu"]
+            line += "   cpu %9.2f s" % result["cpu"]
+            self.writeline(line)
+        self.decreaseindent()
 
     def testheader(self, testcase):
         """Prints a header for a given testcase
@@ -127,9 +226,8 @@ class TestLogger:
         Args:
             testcase: Test for which the header should be printed.
         """
-        self.writeline("=" * self.LINEWIDTH)
-        self.writeline("==  " + testcase)
-        self.writeline("=" * self.LINEWIDTH)
+        self.writelines([ "=" * self.LINEWIDTH, "==  " + testcase,
+                          "=" * self.LINEWIDTH ])
 
     def testblock_open(self, line=""):
         """Opens a subblock in the test log (increase indentation).
@@ -157,11 +255,7 @@ class TestLogger:
         Args:
             msg: Message to print together with the success indication.
         """
-        lines = self._breakline(msg, 72)
-        lines[-1] = (lines[-1]
-                     + " " * (72 - len(lines[-1]) - self._indentwidth)
-                     + "[Ok]")
-        self.writelines(lines)
+        self._testoutcome(msg, "[Ok]", LEVEL_INFO)
 
     def testfailure(self, msg):
         """Indicates failure of a given testing action.
@@ -169,42 +263,220 @@ class TestLogger:
         Args:
             msg: Message to print together with the failure indication.
         """
-        lines = self._breakline(msg, 72)
-        lines[-1] = (lines[-1]
-                     + " " * (72 - len(lines[-1]) - self._indentwidth)
-                     + "[FAILED]")
-        self.writelines(lines)
+        self._testoutcome(msg, "[FAILED]", LEVEL_ERROR)
 
     def increaseindent(self):
         """Increases indentation level by one."""
-        self._indentlevel += 1
-        self._setindent()
+        self._getstate().indentlevel += 1
 
     def decreaseindent(self):
         """Decreases indentation level by one."""
-        if self._indentlevel:
-            self._indentlevel -= 1
-            self._setindent()
+        state = self._getstate()
+        if state.indentlevel:
+            state.indentlevel -= 1
+
+    def _testoutcome(self, msg, indicator, level):
+        """Prints a message with an indicator at the end of its last line."""
+        indentwidth = self._getstate().indentlevel * self.INDENTWIDTH
+        lines = _breakline(msg, 72 - indentwidth)
+        lines[-1] = (lines[-1] + " " * (72 - len(lines[-1]) - indentwidth)
+                     + indicator)
+        self.writelines(lines, level=level)
+
+    def _getstate(self):
+        """Returns the logging state of the current thread."""
+        state = self._state
+        if not hasattr(state, "indentlevel"):
+            state.indentlevel = 0
+            state.testcase = None
+            state.phase = None
+        return state
+
+    def _event(self, message, level, breakline=False):
+        """Creates an event in the state of the current thread."""
+        state = self._getstate()
+        return LogEvent(time.time(), state.testcase, state.phase, level,
+                        message, state.indentlevel, bool(breakline))
+
+
+
+class TextRenderer:
+    """Renders events as indented text (the traditional log format)."""
+
+    def __init__(self, fp, linewidth=TestLogger.LINEWIDTH,
+                 indentwidth=TestLogger.INDENTWIDTH):
+        """Initializes a TextRenderer instance.
+
+        Args:
+            fp: File object to write into.
+            linewidth: Optional, width of the lines broken to fit.
+            indentwidth: Optional, nr. of spaces per indentation level.
+        """
+        self.fp = fp
+        self.linewidth = linewidth
+        self.indentwidth = indentwidth
+
+    def emit(self, events):
+        """Writes events with one write operation.
+
+        Args:
+            events: List of LogEvent instances.
+        """
+        self.fp.write("".join([ self._render(event) for event in events ]))
+
+    def flush(self):
+        """Flushes the file object."""
+        self.fp.flush()
+
+    def _render(self, event):
+        """Returns the text of an event."""
+        if not event.depth and not event.breakline:
+            return event.message + "\n"
+        indentwidth = event.depth * self.indentwidth
+        indent = " " * indentwidth
+        lines = event.message.split("\n")
+        if event.breakline:
+            width = self.linewidth - indentwidth
+            lines = [ piece for line in lines
+                      for piece in _breakline(line, width) ]
+        return "".join([ indent + line + "\n" for line in lines ])
 
-    def _setindent(self):
-        """Updates variables depending on the indentation level."""
-        self._indentwidth = self._indentlevel * self.INDENTWIDTH
-        self._indent = " " * self._indentwidth
 
-    def _breakline(self, line, width=None):
-        """Breaks a line into peaces to fit onto the screen.
+
+class JSONLinesRenderer:
+    """Renders events as JSON objects (one per line)."""
+
+    def __init__(self, fp):
+        """Initializes a JSONLinesRenderer instance.
 
         Args:
-            line: Line to split.
-            width: Optional, width of the screen. If not specified default
-                screen line width is taken.
+            fp: File object to write into.
+        """
+        self.fp = fp
+
+    def emit(self, events):
+        """Writes events with one write operation.
 
-        Return:
-            List of lines, with lenghts shorter than the screen line width
-            minus the length of the current indentation string.
+        Args:
+            events: List of LogEvent instances.
         """
-        if width:
-            ll = width - self._indentwidth
-        else:
-            ll = self.LINEWIDTH - self._indentwidth
-        return [ line[ii:ii+ll] for ii in range(0, len(line), ll) ]
+        self.fp.write("".join(
+            [ json.dumps({ "time": event.time, "testcase": event.testcase,
+                           "phase": event.phase, "level": event.level,
+                           "message": event.message }) + "\n"
+              for event in events ]))
+
+    def flush(self):
+        """Flushes the file object."""
+        self.fp.flush()
+
+
+
+class EventBuffer:
+    """Sink collecting the events in memory.
+
+    Attributes:
+        events: List of the collected events.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, events):
+        """Appends events to the collected ones."""
+        self.events += events
+
+
+
+class LogWriter:
+    """Sink passing the events to renderers from a background thread.
+
+    Emitting an event only puts it into a queue, which needs no lock held by
+    the writer thread. The writer thread takes all queued events at once and
+    passes them as one batch to each renderer, flushing the renderers after
+    each batch.
+    """
+
+    # Maximal nr. of emit() calls rendered as one batch
+    BATCHSIZE = 1000
+
+    def __init__(self, renderers):
+        """Initializes a LogWriter instance and starts the writer thread.
+
+        Args:
+            renderers: List of renderers (e.g. TextRenderer,
+                JSONLinesRenderer).
+        """
+        self.renderers = renderers
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writeevents, daemon=True)
+        self._thread.start()
+
+    def emit(self, events):
+        """Queues events for being rendered.
+
+        Args:
+            events: List of LogEvent instances. They are kept together in the
+                output.
+        """
+        self._queue.put(events)
+
+    def flush(self):
+        """Waits until all events emitted so far had been rendered."""
+        if self._thread.is_alive():
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait()
+
+    def close(self):
+        """Renders all emitted events and stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _writeevents(self):
+        """Renders the queued events (executed in the background)."""
+        running = True
+        while running:
+            items = [ self._queue.get() ]
+            try:
+                while len(items) < self.BATCHSIZE:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            events = []
+            markers = []
+            for item in items:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    events += item
+            for renderer in list(self.renderers):
+                try:
+                    if events:
+                        renderer.emit(events)
+                    renderer.flush()
+                except Exception as exc:
+                    # Renderer is dropped to avoid repeating the message
+                    self.renderers.remove(renderer)
+                    try:
+                        sys.stderr.write("Log renderer failed: %s\n" % exc)
+                    except OSError:
+                        pass
+            for marker in markers:
+                marker.set()
+
+
+def _breakline(line, width):
+    """Breaks a line into peaces of a given width.
+
+    Args:
+        line: Line to split.
+        width: Maximal length of the pieces.
+
+    Return:
+        List of lines, with lengths not exceeding the width.
+    """
+    return [ line[ii:ii+width] for ii in range(0, len(line), width) ]
@@ -0,0 +1,266 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Streaming writers for the reports about the processed test cases.
+
+The writers receive the test cases one by one and write each of them out
+immediately, so that the memory needed does not grow with the number of test
+cases. The log of a test case is loaded only if a writer needs it.
+"""
+import re
+import json
+from xml.sax.saxutils import escape, quoteattr
+import valsimp as vsp
+import valsimp.timing as vsptime
+import valsimp.io.logger as vsplog
+
+__all__ = [ "RESULT_PASSED", "RESULT_FAILED", "RESULT_ERROR", "RESULT_NOTRUN",
+            "TestcaseReport", "summarize", "ReportWriter", "TextReportWriter",
+            "JUnitReportWriter", "JSONLinesReportWriter", ]
+
+# Overall results of a test case
+RESULT_PASSED = "passed"
+RESULT_FAILED = "failed"
+RESULT_ERROR = "error"
+RESULT_NOTRUN = "notrun"
+
+# Names of the status values in the machine readable reports
+STATUS_NAMES = { vsp.STATUS_OK: "ok",
+                 vsp.STATUS_FAILED: "failed",
+                 vsp.STATUS_ERROR: "error",
+                 vsp.STATUS_INTERRUPTED: "interrupted",
+                 vsp.STATUS_NOTRUN: "notrun",
+                 vsp.STATUS_NOTFINISHED: "notfinished",
+               }
+
+# Characters not allowed in XML documents
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class TestcaseReport:
+    """Data of a test case needed by the report writers.
+
+    Attributes:
+        name: Name of the test case.
+        status: Dictionary mapping the names of the actions to their status
+            (in the order of execution).
+        timings: Dictionary mapping the names of the actions to the dictionary
+            of their measured quantities (see PhaseTimer).
+    """
+
+    def __init__(self, name, status, timings, getlog):
+        """Initializes a TestcaseReport instance.
+
+        Args:
+            name: Name of the test case.
+            status: Dictionary mapping the names of the actions to their
+                status.
+            timings: Dictionary mapping the names of the actions to their
+                measured quantities.
+            getlog: Function without arguments returning the log text of the
+                test case. It is called at most once, when the log is needed.
+        """
+        self.name = name
+        self.status = status
+        self.timings = timings
+        self._getlog = getlog
+        self._log = None
+
+    @property
+    def log(self):
+        """Log text of the test case (loaded on first access)."""
+        if self._log is None:
+            self._log = self._getlog() or ""
+        return self._log
+
+    def clearlog(self):
+        """Frees the loaded log (it is loaded again on next access)."""
+        self._log = None
+
+    @property
+    def time(self):
+        """Total wall clock time of the actions in seconds."""
+        return vsptime.totaltime(self.timings)
+
+    @property
+    def result(self):
+        """Overall result of the test case (one of the RESULT_* constants)."""
+        values = self.status.values()
+        if any([ stat in (vsp.STATUS_ERROR, vsp.STATUS_INTERRUPTED)
+                 for stat in values ]):
+            return RESULT_ERROR
+        if vsp.STATUS_FAILED in values:
+            return RESULT_FAILED
+        if all([ stat == vsp.STATUS_OK for stat in values ]):
+            return RESULT_PASSED
+        return RESULT_NOTRUN
+
+    @property
+    def message(self):
+        """Short message describing the first unsuccessful action or ''."""
+        for action, stat in self.status.items():
+            if stat != vsp.STATUS_OK:
+                return "%s: %s" % (action, vsplog.TestLogger.RESULT_STR.get(
+                    stat, "UNKNOWN"))
+        return ""
+
+
+def summarize(reports):
+    """Counts the test cases with the various overall results.
+
+    Args:
+        reports: Iterable over TestcaseReport instances.
+
+    Returns:
+        Dictionary with the nr. of test cases ('tests'), the nr. of test cases
+        with each of the RESULT_* results and the total wall clock time
+        ('time').
+    """
+    summary = { "tests": 0, RESULT_PASSED: 0, RESULT_FAILED: 0,
+                RESULT_ERROR: 0, RESULT_NOTRUN: 0, "time": 0.0 }
+    for report in reports:
+        summary["tests"] += 1
+        summary[report.result] += 1
+        summary["time"] += report.time
+    return summary
+
+
+class ReportWriter:
+    """Abstract report writer.
+
+    The report is written via one begin() call, one write() call for each
+    test case and a final end() call.
+    """
+
+    def __init__(self, fp):
+        """Initializes a ReportWriter instance.
+
+        Args:
+            fp: File object to write the report into.
+        """
+        self.fp = fp
+
+    def begin(self, summary):
+        """Starts the report.
+
+        Args:
+            summary: Summary of all test cases in the report (see
+                summarize()).
+        """
+        pass
+
+    def write(self, report):
+        """Writes the report of a test case.
+
+        Args:
+            report: TestcaseReport instance.
+        """
+        raise NotImplementedError
+
+    def end(self):
+        """Finishes the report."""
+        pass
+
+
+class TextReportWriter(ReportWriter):
+    """Writes the log of each test case under a header."""
+
+    def __init__(self, fp, log=None):
+        """Initializes a TextReportWriter instance.
+
+        Args:
+            fp: File object to write the report into.
+            log: Optional, TestLogger to write the report into instead of fp.
+        """
+        ReportWriter.__init__(self, fp)
+        self._log = log or vsplog.TestLogger(fp)
+
+    def write(self, report):
+        self._log.testheader(report.name)
+        self._log.write(report.log)
+
+
+class JUnitReportWriter(ReportWriter):
+    """Writes the report in the JUnit XML format understood by CI servers.
+
+    Test cases are written as testcase elements of one testsuite. The log is
+    included only for test cases which had not passed.
+    """
+
+    # Name of the test suite
+    SUITE_NAME = "valsimp"
+
+    def begin(self, summary):
+        counts = ('tests="%d" failures="%d" errors="%d" skipped="%d" '
+                  'time="%.3f"' % (summary["tests"], summary[RESULT_FAILED],
+                                   summary[RESULT_ERROR],
+                                   summary[RESULT_NOTRUN], summary["time"]))
+        self.fp.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.fp.write('<testsuites %s>\n' % counts)
+        self.fp.write('  <testsuite name=%s %s>\n'
+                      % (quoteattr(self.SUITE_NAME), counts))
+
+    def write(self, report):
+        package, _, name = report.name.rpartition("/")
+        classname = self.SUITE_NAME
+        if package:
+            classname += "." + package.replace("/", ".")
+        self.fp.write('    <testcase classname=%s name=%s time="%.3f">\n'
+                      % (quoteattr(classname), quoteattr(name), report.time))
+        if report.timings:
+            self.fp.write('      <properties>\n')
+            for action, result in report.timings.items():
+                self.fp.write('        <property name=%s value="%.3f"/>\n'
+                              % (quoteattr("time." + action), result["wall"]))
+            self.fp.write('      </properties>\n')
+        result = report.result
+        if result != RESULT_PASSED:
+            message = quoteattr(report.message)
+            if result == RESULT_NOTRUN:
+                self.fp.write('      <skipped message=%s/>\n' % message)
+            else:
+                tag = "failure" if result == RESULT_FAILED else "error"
+                self.fp.write('      <%s message=%s>%s</%s>\n'
+                              % (tag, message, _xmltext(report.log), tag))
+        self.fp.write('    </testcase>\n')
+
+    def end(self):
+        self.fp.write('  </testsuite>\n</testsuites>\n')
+
+
+class JSONLinesReportWriter(ReportWriter):
+    """Writes one JSON object per line for each test case.
+
+    Each test case is represented by an object with the type 'testcase'. The
+    log is included only for test cases which had not passed. The last line
+    contains an object with the type 'summary'.
+    """
+
+    def begin(self, summary):
+        self._summary = summary
+
+    def write(self, report):
+        record = { "type": "testcase", "testcase": report.name,
+                   "result": report.result,
+                   "status": dict([ (action, STATUS_NAMES.get(stat,
+                                                              "unknown"))
+                                    for action, stat
+                                    in report.status.items() ]),
+                   "time": report.time, "timings": report.timings }
+        if report.result != RESULT_PASSED:
+            record["message"] = report.message
+            record["log"] = report.log
+        self.fp.write(json.dumps(record))
+        self.fp.write("\n")
+
+    def end(self):
+        record = { "type": "summary" }
+        record.update(self._summary)
+        self.fp.write(json.dumps(record))
+        self.fp.write("\n")
+
+
+def _xmltext(text):
+    """Returns text escaped for XML character data."""
+    return escape(_XML_INVALID.sub("", text))
@@ -2,24 +2,209 @@
 # This file is part of the ValSimP package.
 # See the packages LICENSE file for copyright and licensing conditions.
 ###############################################################################
+import io
+import bz2
 import gzip
+import lzma
+import queue
+import threading
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
 
-__all__ = ["zopen", ]
+__all__ = ["zopen", "iscompressed", ]
 
 
+# Size of the blocks read at once in block reading mode
+READ_BLOCKSIZE = 1024 * 1024
+# Nr. of decompressed blocks the background thread may read in advance
+BACKGROUND_BLOCKS = 4
 
+# Suffixes of compressed files and the modules to open them with
+COMPRESSORS = { ".gz": gzip, ".bz2": bz2, ".xz": lzma, ".zst": zstd }
 
-def zopen(fname, mode):
-    """Opens a file with gzip if it ends on '.gz', otherwise normal.
+
+def iscompressed(fname):
+    """Checks whether zopen() would decompress a file with a given name.
+
+    Args:
+        fname: Name of the file.
+
+    Returns:
+        True if file is opened via a decompressor, False otherwise.
+    """
+    return _compressor(fname) is not None
+
+
+def _compressor(fname):
+    """Returns the suffix of a compressed file or None."""
+    for suffix in COMPRESSORS:
+        if fname.endswith(suffix):
+            return suffix
+    return None
+
+
+def _zopen(fname, suffix, mode):
+    """Opens a compressed file.
+
+    Args:
+        fname: Name of the file to open.
+        suffix: Suffix determining the compression format.
+        mode: File operation mode string. Compressed files are opened in
+            binary mode, unless text mode ('t') is requested explicitely.
+
+    Returns:
+        File like object.
+    """
+    module = COMPRESSORS[suffix]
+    if module is None:
+        raise OSError("Module 'zstandard' needed to open file '%s'" % fname)
+    if "t" not in mode and "b" not in mode:
+        mode += "b"
+    return module.open(fname, mode)
+
+
+def zopen(fname, mode, blocksize=None, background=False):
+    """Opens a file with the appropriate decompressor, otherwise normal.
+
+    Files ending on '.gz', '.bz2' and '.xz' are opened via the corresponding
+    modules of the standard library, files ending on '.zst' via the zstd
+    module of the standard library (Python 3.14 or newer) or the zstandard
+    module, if available.
 
     Args:
         fname: Name of the file to open.
         mode: File operation mode string.
+        blocksize: Optional, nr. of bytes read at once from the file, when
+            it is opened for reading. (def.: default buffer size or
+            READ_BLOCKSIZE if background is True)
+        background: If True, compressed files opened for reading are
+            decompressed in a background thread, so that decompression
+            overlaps with the processing of the data. (def.: False)
 
     Returns:
         File like object.
     """
-    if fname.endswith(".gz"):
-        return gzip.open(fname, mode)
-    else:
+    suffix = _compressor(fname)
+    reading = "r" in mode and "+" not in mode
+    if suffix is None:
+        if reading and blocksize:
+            return open(fname, mode, buffering=blocksize)
         return open(fname, mode)
+    if not reading or not (blocksize or background):
+        return _zopen(fname, suffix, mode)
+    blocksize = blocksize or READ_BLOCKSIZE
+    fp = _zopen(fname, suffix, "rb")
+    if background:
+        fp = _BackgroundReader(fp, blocksize, BACKGROUND_BLOCKS)
+    fp = io.BufferedReader(fp, buffer_size=blocksize)
+    if "t" in mode:
+        fp = io.TextIOWrapper(fp)
+    return fp
+
+
+class _BackgroundReader(io.RawIOBase):
+    """Reads blocks from a file in a background thread.
+
+    The decompressors of the standard library release the global interpreter
+    lock while decompressing, so decompression in the background thread
+    runs in parallel to the processing in the main thread.
+    """
+
+    def __init__(self, fp, blocksize, nblocks):
+        """Initializes a _BackgroundReader instance.
+
+        Args:
+            fp: File like object to read from. It is closed, when the
+                reader is closed.
+            blocksize: Nr. of bytes to read at once.
+            nblocks: Maximal nr. of blocks read in advance.
+        """
+        io.RawIOBase.__init__(self)
+        self._fp = fp
+        self._blocks = queue.Queue(nblocks)
+        self._block = memoryview(b"")
+        self._eof = False
+        self._stop = threading.Event()
+        # The thread must not reference the reader, so that the reader can be
+        # finalized (and thereby closed) when it is not used any more.
+        self._thread = threading.Thread(
+            target=_readblocks, args=(fp, blocksize, self._blocks, self._stop),
+            daemon=True)
+        self._thread.start()
+
+
+    def readable(self):
+        """Returns True, as the reader can be read."""
+        return True
+
+
+    def readinto(self, buffer):
+        """Reads bytes into a preallocated bytes like object.
+
+        Returns:
+            Nr. of bytes read (0 at the end of the file).
+        """
+        if not self._block:
+            if self._eof:
+                return 0
+            item = self._blocks.get()
+            if isinstance(item, Exception):
+                self._eof = True
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._block = memoryview(item)
+        nbytes = min(len(buffer), len(self._block))
+        buffer[:nbytes] = self._block[:nbytes]
+        self._block = self._block[nbytes:]
+        return nbytes
+
+
+    def close(self):
+        """Stops the background thread and closes the file."""
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._fp.close()
+        io.RawIOBase.close(self)
+
+
+
+def _readblocks(fp, blocksize, blocks, stop):
+    """Reads the blocks of a file (executed in the background thread).
+
+    Args:
+        fp: File like object to read from.
+        blocksize: Nr. of bytes to read at once.
+        blocks: Queue receiving the blocks, an empty block at the end of the
+            file and the exception if reading failed.
+        stop: Event signalising that reading should be stopped.
+    """
+    try:
+        block = fp.read(blocksize)
+        while block and _putblock(blocks, block, stop):
+            block = fp.read(blocksize)
+        _putblock(blocks, b"", stop)
+    except Exception as exc:
+        _putblock(blocks, exc, stop)
+
+
+def _putblock(blocks, item, stop):
+    """Puts an item into the queue, unless reading had been stopped.
+
+    Returns:
+        True if item had been put into the queue, False otherwise.
+    """
+    while not stop.is_set():
+        try:
+            blocks.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
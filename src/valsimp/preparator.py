@@ -2,35 +2,160 @@
 # This file is part of the ValSimP package.
 # See the packages LICENSE file for copyright and licensing conditions.
 ###############################################################################
+import os
 import os.path
+import fcntl
+import fnmatch
 import shutil
 import valsimp as vsp
+import valsimp.timing as vsptime
+
+# Possible ways of transfering the input files into the working directory
+MODE_COPY = "copy"
+MODE_HARDLINK = "hardlink"
+MODE_REFLINK = "reflink"
+MODE_SYMLINK = "symlink"
+
+# Request code of the ioctl() call for cloning a file (see linux/fs.h)
+_FICLONE = 0x40049409
+
 
 class SimplePreparator(vsp.Preparator):
-    """Simple preparator, copying files and directories between directories."""
+    """Simple preparator, copying files and directories between directories.
+
+    Instead of copying, the input files can be also hard linked, reflinked
+    (cloned on filesystems supporting copy on write) or symlinked into the
+    working directory. If a file can not be linked (e.g. because input and
+    working directory are on different filesystems), it is copied.
+
+    If an input store is specified, the input files are added to the store
+    and linked from there, so that files with identical content are stored
+    only once, no matter how many test cases use them. Hard and symbolic
+    links share the data with the linked file, so they are only created to
+    the read-only files of the store, never to the files of the test tree.
+    Without store, files are reflinked or copied instead. Files which are
+    modified during the calculation must be marked as writable, in order to
+    be copied.
+    """
 
     INPDIR = "input"
+    MODES = (MODE_COPY, MODE_HARDLINK, MODE_REFLINK, MODE_SYMLINK)
 
-    def __init__(self, inputdir, workdir):
+    def __init__(self, inputdir, workdir, mode=None, writable=None,
+                 log=None, store=None):
         """Initializes SimpePreparator instance.
 
         Args:
             inputdir: Directory, where the input files/directories can be found.
             workdir: Target directory, where all entries in inputdir should be
                 copied to.
+            mode: Optional, way of transfering the files, one of MODES.
+                Without store, MODE_HARDLINK and MODE_SYMLINK behave as
+                MODE_REFLINK. (def.: MODE_HARDLINK if store is specified,
+                MODE_COPY otherwise)
+            writable: Optional, list of shell patterns matching the (relative)
+                names of the files, which should be always copied.
+            log: Optional, logger to report the nr. of linked files and the
+                bytes saved.
+            store: Optional, InputStore to link the files from.
         """
+        if mode is None:
+            mode = MODE_HARDLINK if store else MODE_COPY
+        if mode not in self.MODES:
+            raise ValueError("Invalid preparation mode '%s'" % mode)
         self.inpdir = inputdir
         self.workdir = workdir
+        self.mode = mode
+        self.writable = writable or []
+        self.log = log
+        self.store = store
+        self.bytessaved = 0
 
     def prepare(self):
-        """Copies all files/directories from input to working directory."""
-        for relname in os.listdir(self.inpdir):
-            absname = os.path.join(self.inpdir, relname)
-            if os.path.isdir(absname):
-                shutil.copytree(absname, self.workdir)
-            else:
-                shutil.copy(absname, self.workdir)
+        """Transfers all files/directories from input to working directory."""
+        self.bytessaved = 0
+        nlinked = 0
+        for root, dirs, files in os.walk(self.inpdir, followlinks=True):
+            reldir = os.path.relpath(root, self.inpdir)
+            targetdir = os.path.normpath(os.path.join(self.workdir, reldir))
+            os.makedirs(targetdir, exist_ok=True)
+            for fname in files:
+                source = os.path.join(root, fname)
+                target = os.path.join(targetdir, fname)
+                if os.path.lexists(target):
+                    os.remove(target)
+                relname = os.path.normpath(os.path.join(reldir, fname))
+                if (self.mode != MODE_COPY and not self.iswritable(relname)
+                        and self._link(source, target)):
+                    nlinked += 1
+                    self.bytessaved += os.path.getsize(source)
+                else:
+                    shutil.copy(source, target)
+                    vsptime.count("copied", os.path.getsize(target))
+        if self.store:
+            self.store.flush()
+        if self.log and self.mode != MODE_COPY:
+            self.log.writeline("%d file(s) linked (%s), %.1f MB saved"
+                               % (nlinked, self.mode, self.bytessaved / 1e6))
+
+    def iswritable(self, relname):
+        """Checks whether a file has to be copied as it may be modified.
+
+        Args:
+            relname: Name of the file relative to the input directory.
+
+        Returns:
+            True if the name matches any of the writable patterns.
+        """
+        for pattern in self.writable:
+            if fnmatch.fnmatch(relname, pattern):
+                return True
+        return False
 
     def cleanup(self):
         """Does not do any special cleanup action."""
         pass
+
+    def dependencies(self):
+        """Returns the input directory."""
+        return [ self.inpdir, ]
+
+    def _link(self, source, target):
+        """Links a file according to the mode of the preparator.
+
+        Args:
+            source: Name of the input file.
+            target: Name of the file to create.
+
+        Returns:
+            True if the file could be linked, False otherwise.
+        """
+        try:
+            if self.store:
+                source = self.store.add(source)
+            if not self.store or self.mode == MODE_REFLINK:
+                _reflink(source, target)
+            elif self.mode == MODE_HARDLINK:
+                os.link(source, target)
+            else:
+                os.symlink(os.path.abspath(source), target)
+        except OSError:
+            if os.path.lexists(target):
+                os.remove(target)
+            return False
+        return True
+
+
+def _reflink(source, target):
+    """Creates a copy on write clone of a file.
+
+    Args:
+        source: Name of the file to clone.
+        target: Name of the clone.
+
+    Raises:
+        OSError: If the filesystem does not support cloning.
+    """
+    with open(source, "rb") as fsource, open(target, "wb") as ftarget:
+        fcntl.ioctl(ftarget.fileno(), _FICLONE, fsource.fileno())
+    shutil.copymode(source, target)
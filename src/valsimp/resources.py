@@ -0,0 +1,272 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Resources needed by the calculations and their allocation on the node.
+
+Calculators declare the cores, the memory and the GPUs their calculation
+needs via a Resources instance. A ResourcePool represents the budget of the
+local node: a calculation is only admitted, if its request fits into the
+resources not allocated by the other running calculations. Waiting requests
+are granted in the order of their arrival, but a smaller request may overtake
+a larger one, if it fits into the free resources (backfilling). To prevent the
+starvation of large requests, a request can be overtaken only a limited
+number of times, afterwards no further requests are granted until it fits.
+"""
+import os
+import asyncio
+import threading
+import contextlib
+
+__all__ = [ "Resources", "ResourcePool", "physicalmemory", ]
+
+
+class Resources:
+    """Resources needed by a calculation.
+
+    Attributes:
+        cores: Nr. of cores used by the calculation (e.g. nr. of MPI processes
+            times the nr. of threads per process).
+        memory: Memory used by the calculation in MB.
+        gpus: Nr. of GPUs used by the calculation.
+        threads: Nr. of threads each process of the calculation should use
+            or None. If set, calculators pass it to the program via the
+            environment variable OMP_NUM_THREADS.
+    """
+
+    def __init__(self, cores=1, memory=0, gpus=0, threads=None):
+        """Initializes a Resources instance.
+
+        Args:
+            cores: Optional, nr. of cores used by the calculation (def.: 1).
+            memory: Optional, memory used by the calculation in MB (def.: 0).
+            gpus: Optional, nr. of GPUs used by the calculation (def.: 0).
+            threads: Optional, nr. of threads per process (def.: None).
+        """
+        if cores < 0 or memory < 0 or gpus < 0:
+            raise ValueError("Negative resource request")
+        if threads is not None and threads < 1:
+            raise ValueError("Invalid nr. of threads %d" % threads)
+        self.cores = cores
+        self.memory = memory
+        self.gpus = gpus
+        self.threads = threads
+
+    def __str__(self):
+        txt = "%d core(s), %d MB" % (self.cores, self.memory)
+        if self.gpus:
+            txt += ", %d GPU(s)" % self.gpus
+        return txt
+
+    def __repr__(self):
+        return ("Resources(cores=%r, memory=%r, gpus=%r, threads=%r)"
+                % (self.cores, self.memory, self.gpus, self.threads))
+
+
+def physicalmemory():
+    """Returns the physical memory of the node in MB or None if unknown."""
+    try:
+        return (os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+                // (1024 * 1024))
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class ResourcePool:
+    """Budget of resources shared by the calculations on the local node.
+
+    Requests can be allocated from worker threads via acquire() or
+    reserved(), and from coroutines via aacquire() or areserved().
+    """
+
+    # Nr. of times a waiting request may be overtaken by smaller ones
+    MAX_OVERTAKES = 10
+
+    def __init__(self, cores=None, memory=None, gpus=None):
+        """Initializes a ResourcePool instance.
+
+        Args:
+            cores: Optional, nr. of available cores (def.: no limit).
+            memory: Optional, available memory in MB (def.: no limit).
+            gpus: Optional, nr. of available GPUs (def.: no limit).
+        """
+        self.capacity = { "cores": cores, "memory": memory, "gpus": gpus }
+        self._used = { "cores": 0, "memory": 0, "gpus": 0 }
+        self._waiting = []
+        self._lock = threading.Lock()
+
+    def clamp(self, request):
+        """Limits a request to the capacity of the pool.
+
+        A calculation needing more resources than available in total could
+        otherwise never be started. With the limited request it is started as
+        soon as it can run alone.
+
+        Args:
+            request: Resources instance.
+
+        Returns:
+            Resources instance not exceeding the capacity.
+        """
+        values = {}
+        for name, capacity in self.capacity.items():
+            value = getattr(request, name)
+            values[name] = value if capacity is None else min(value, capacity)
+        return Resources(threads=request.threads, **values)
+
+    def used(self):
+        """Returns the currently allocated resources.
+
+        Returns:
+            Dictionary mapping the resource names ('cores', 'memory', 'gpus')
+            to the allocated amounts.
+        """
+        with self._lock:
+            return dict(self._used)
+
+    def acquire(self, request):
+        """Allocates resources, waiting until they are free.
+
+        Args:
+            request: Resources instance with the needed resources.
+
+        Returns:
+            Allocated resources (the request limited by clamp()). They must be
+            handed back via release().
+        """
+        request = self.clamp(request)
+        granted = threading.Event()
+        ticket = _Ticket(request, granted.set)
+        self._enqueue(ticket)
+        try:
+            granted.wait()
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+        return request
+
+    async def aacquire(self, request):
+        """Allocates resources without blocking the event loop.
+
+        Args:
+            request: Resources instance with the needed resources.
+
+        Returns:
+            Allocated resources (the request limited by clamp()). They must be
+            handed back via release().
+        """
+        request = self.clamp(request)
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        wakeup = lambda: loop.call_soon_threadsafe(_setgranted, granted)
+        ticket = _Ticket(request, wakeup)
+        self._enqueue(ticket)
+        try:
+            await granted
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+        return request
+
+    def release(self, allocated):
+        """Hands back allocated resources.
+
+        Args:
+            allocated: Resources as returned by acquire() or aacquire().
+        """
+        with self._lock:
+            for name in self._used:
+                self._used[name] -= getattr(allocated, name)
+            self._grant()
+
+    @contextlib.contextmanager
+    def reserved(self, request):
+        """Context manager holding resources while its block is executed.
+
+        Args:
+            request: Resources instance with the needed resources.
+        """
+        allocated = self.acquire(request)
+        try:
+            yield allocated
+        finally:
+            self.release(allocated)
+
+    @contextlib.asynccontextmanager
+    async def areserved(self, request):
+        """Asynchronous context manager holding resources within its block.
+
+        Args:
+            request: Resources instance with the needed resources.
+        """
+        allocated = await self.aacquire(request)
+        try:
+            yield allocated
+        finally:
+            self.release(allocated)
+
+    def _enqueue(self, ticket):
+        """Appends a ticket to the waiting ones and grants what fits."""
+        with self._lock:
+            self._waiting.append(ticket)
+            self._grant()
+
+    def _withdraw(self, ticket):
+        """Withdraws the ticket of an interrupted request.
+
+        Resources which had been already granted to it are handed back.
+        """
+        with self._lock:
+            if ticket.granted:
+                for name in self._used:
+                    self._used[name] -= getattr(ticket.request, name)
+            else:
+                self._waiting.remove(ticket)
+            self._grant()
+
+    def _fits(self, request):
+        """Checks whether a request fits into the free resources."""
+        for name, capacity in self.capacity.items():
+            if (capacity is not None
+                    and self._used[name] + getattr(request, name) > capacity):
+                return False
+        return True
+
+    def _grant(self):
+        """Grants the waiting requests fitting into the free resources.
+
+        Must be called with the lock being held.
+        """
+        skipped = []
+        for ticket in list(self._waiting):
+            if self._fits(ticket.request):
+                for name in self._used:
+                    self._used[name] += getattr(ticket.request, name)
+                self._waiting.remove(ticket)
+                ticket.granted = True
+                ticket.wakeup()
+                for other in skipped:
+                    other.overtaken += 1
+            elif ticket.overtaken >= self.MAX_OVERTAKES:
+                break
+            else:
+                skipped.append(ticket)
+
+
+
+class _Ticket:
+    """Resource request waiting in a ResourcePool."""
+
+    __slots__ = ("request", "wakeup", "granted", "overtaken")
+
+    def __init__(self, request, wakeup):
+        self.request = request
+        self.wakeup = wakeup
+        self.granted = False
+        self.overtaken = 0
+
+
+def _setgranted(future):
+    """Marks the future of a waiting coroutine as granted."""
+    if not future.done():
+        future.set_result(None)
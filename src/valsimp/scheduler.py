@@ -0,0 +1,353 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Batch queue schedulers for running calculations.
+
+A scheduler submits jobs (a working directory and a command line each) to a
+batch queue system. Jobs enqueued by the calculators are collected and
+submitted together as one job array when the scheduler is flushed, so the
+per submission overhead of the queue system has to be paid only once. The
+status of the jobs is polled in bulk.
+
+The LocalScheduler implements a queue on the local machine: each job array is
+executed by a detached background process, running at most a given number of
+jobs (over all arrays) at the same time. It can be used on machines without a
+queue system or as a template for the interface to a real one.
+"""
+import os
+import sys
+import time
+import errno
+import fcntl
+import pickle
+import tempfile
+import threading
+import subprocess as sp
+import concurrent.futures
+import valsimp as vsp
+import valsimp.calculator as vspcalc
+
+__all__ = [ "JOB_UNKNOWN", "JOB_PENDING", "JOB_RUNNING", "JOB_DONE",
+            "JOB_CANCELLED", "JOB_FAILED", "Scheduler", "LocalScheduler", ]
+
+# Possible states of a job
+JOB_UNKNOWN = -1
+JOB_PENDING = 0
+JOB_RUNNING = 1
+JOB_DONE = 2
+JOB_CANCELLED = 3
+JOB_FAILED = 4
+
+
+class Scheduler:
+    """Abstract scheduler with batched submission of enqueued jobs.
+
+    Derived classes must implement submit(), poll() and cancel(). Calculators
+    hand their jobs over via enqueue(), which defers the submission until
+    flush() is called (either explicitly or by polling an enqueued job) or
+    the number of enqueued jobs reaches the batch size.
+    """
+
+    def __init__(self, batchsize=None):
+        """Initializes a Scheduler instance.
+
+        Args:
+            batchsize: Optional, nr. of enqueued jobs triggering the
+                submission of a job array. (def.: no limit)
+        """
+        self.batchsize = batchsize
+        self._pending = []
+        self._lock = threading.RLock()
+
+    def submit(self, jobs):
+        """Submits jobs as one job array.
+
+        Args:
+            jobs: List of (workdir, cmdline) tuples.
+
+        Returns:
+            List with the id of each job.
+        """
+        raise NotImplementedError
+
+    def poll(self, jobids):
+        """Returns the status of several jobs.
+
+        Args:
+            jobids: List of job ids.
+
+        Returns:
+            Dictionary with the job ids as keys and their state (one of the
+            JOB_* constants) as values.
+        """
+        raise NotImplementedError
+
+    def cancel(self, jobids):
+        """Cancels jobs, which are pending or running.
+
+        Args:
+            jobids: List of job ids.
+        """
+        raise NotImplementedError
+
+    def enqueue(self, calculator):
+        """Enqueues the job of a calculator for the next submission.
+
+        Args:
+            calculator: Calculator with attributes workdir and cmdline and
+                with a method submitted(jobid), which is called after the
+                job had been submitted.
+        """
+        with self._lock:
+            self._pending.append(calculator)
+            if self.batchsize and len(self._pending) >= self.batchsize:
+                self.flush()
+
+    def ispending(self, calculator):
+        """Checks whether a calculator had been enqueued but not submitted."""
+        with self._lock:
+            return calculator in self._pending
+
+    def flush(self):
+        """Submits all enqueued jobs as one job array."""
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+            if not pending:
+                return
+            jobids = self.submit([ (calc.workdir, calc.cmdline)
+                                   for calc in pending ])
+            for calc, jobid in zip(pending, jobids):
+                calc.submitted(jobid)
+
+
+
+class LocalScheduler(Scheduler):
+    """Scheduler running job arrays in background processes.
+
+    Each job array is stored in a directory within the spool directory. A
+    detached process is started for every array, which executes the jobs and
+    marks their progress by status files in the array directory. Polling
+    the jobs of an array therefore needs only one directory listing. The
+    number of simultaneously running jobs is limited over all arrays by
+    a set of lock files (slots).
+    """
+
+    # File containing the jobs of an array
+    JOBFILE = "jobs.pickle"
+    # File containing the output of the process executing the array
+    LOGFILE = "runner.log"
+    # Suffixes of the status files of the jobs
+    RUNNING_SUFFIX = ".running"
+    DONE_SUFFIX = ".done"
+    CANCELLED_SUFFIX = ".cancelled"
+    FAILED_SUFFIX = ".failed"
+    # Suffix of the file requesting the cancellation of a job
+    CANCEL_SUFFIX = ".cancel"
+    # Directory within the spool directory containing the slot lock files
+    SLOTDIR = "slots"
+    # Seconds between checks for free slots and for cancelled jobs
+    WAIT_INTERVAL = 0.2
+
+    def __init__(self, spooldir, maxjobs=None, batchsize=None,
+                 pollinterval=1.0):
+        """Initializes a LocalScheduler instance.
+
+        Args:
+            spooldir: Directory for storing the job arrays.
+            maxjobs: Optional, maximal nr. of jobs running at the same time.
+                (def.: nr. of processors)
+            batchsize: Optional, nr. of enqueued jobs triggering the
+                submission of a job array. (def.: no limit)
+            pollinterval: Optional, seconds for which the status of a job
+                array is reused by poll() before the array directory is
+                listed again. (def.: 1.0)
+        """
+        Scheduler.__init__(self, batchsize)
+        self.spooldir = spooldir
+        self.maxjobs = maxjobs or os.cpu_count() or 1
+        self.pollinterval = pollinterval
+        self._listings = {}
+
+    def submit(self, jobs):
+        """Stores the jobs as an array and starts its execution.
+
+        Args:
+            jobs: List of (workdir, cmdline) tuples.
+
+        Returns:
+            List with the id ('arrayid.index') of each job.
+        """
+        os.makedirs(self.spooldir, exist_ok=True)
+        arraydir = tempfile.mkdtemp(dir=self.spooldir, prefix="array")
+        arrayid = os.path.basename(arraydir)
+        with open(os.path.join(arraydir, self.JOBFILE), "wb") as fp:
+            pickle.dump({ "maxjobs": self.maxjobs, "jobs": jobs }, fp)
+        env = dict(os.environ)
+        pkgdir = os.path.dirname(os.path.dirname(os.path.abspath(
+            vsp.__file__)))
+        env["PYTHONPATH"] = os.pathsep.join(
+            [ pkgdir ] + [ path for path in [ env.get("PYTHONPATH") ]
+                           if path ])
+        with open(os.path.join(arraydir, self.LOGFILE), "w") as fp:
+            sp.Popen([ sys.executable, "-m", __name__, arraydir ],
+                     stdin=sp.DEVNULL, stdout=fp, stderr=sp.STDOUT,
+                     close_fds=True, start_new_session=True, env=env)
+        return [ "%s.%d" % (arrayid, ii) for ii in range(len(jobs)) ]
+
+    def poll(self, jobids):
+        """Returns the status of several jobs.
+
+        Args:
+            jobids: List of job ids.
+
+        Returns:
+            Dictionary with the job ids as keys and their state (one of the
+            JOB_* constants) as values.
+        """
+        states = {}
+        for jobid in jobids:
+            arrayid, _, index = jobid.rpartition(".")
+            names = self._listing(arrayid)
+            if names is None:
+                states[jobid] = JOB_UNKNOWN
+            elif index + self.CANCELLED_SUFFIX in names:
+                states[jobid] = JOB_CANCELLED
+            elif index + self.FAILED_SUFFIX in names:
+                states[jobid] = JOB_FAILED
+            elif index + self.DONE_SUFFIX in names:
+                states[jobid] = JOB_DONE
+            elif index + self.RUNNING_SUFFIX in names:
+                states[jobid] = JOB_RUNNING
+            else:
+                states[jobid] = JOB_PENDING
+        return states
+
+    def cancel(self, jobids):
+        """Cancels jobs, which are pending or running.
+
+        Args:
+            jobids: List of job ids.
+        """
+        for jobid in jobids:
+            arrayid, _, index = jobid.rpartition(".")
+            try:
+                open(os.path.join(self.spooldir, arrayid,
+                                  index + self.CANCEL_SUFFIX), "w").close()
+            except OSError:
+                pass
+            with self._lock:
+                self._listings.pop(arrayid, None)
+
+    def _listing(self, arrayid):
+        """Returns the (possibly cached) file names in an array directory.
+
+        Args:
+            arrayid: Id of the job array.
+
+        Returns:
+            Set of file names or None, if array does not exist.
+        """
+        with self._lock:
+            now = time.monotonic()
+            listing = self._listings.get(arrayid)
+            if listing is not None and now - listing[0] < self.pollinterval:
+                return listing[1]
+            try:
+                names = set(os.listdir(os.path.join(self.spooldir, arrayid)))
+            except OSError:
+                names = None
+            self._listings[arrayid] = (now, names)
+            return names
+
+
+
+def _acquireslot(slotdir, maxjobs, cancelfile):
+    """Waits for a free slot for running a job.
+
+    Args:
+        slotdir: Directory with the slot lock files.
+        maxjobs: Nr. of slots.
+        cancelfile: File signalising that the job had been cancelled.
+
+    Returns:
+        File object holding the lock of the slot or None, if the job had been
+        cancelled while waiting.
+    """
+    while True:
+        if os.path.exists(cancelfile):
+            return None
+        for islot in range(maxjobs):
+            fp = open(os.path.join(slotdir, "%d.lock" % islot), "a")
+            try:
+                fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as ex:
+                fp.close()
+                if ex.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+            else:
+                return fp
+        time.sleep(LocalScheduler.WAIT_INTERVAL)
+
+
+def _runjob(arraydir, slotdir, maxjobs, index, workdir, cmdline):
+    """Runs one job of an array, once a slot is available.
+
+    Args:
+        arraydir: Directory of the job array.
+        slotdir: Directory with the slot lock files.
+        maxjobs: Nr. of slots.
+        index: Index of the job within the array.
+        workdir: Working directory of the job.
+        cmdline: Command line of the job.
+    """
+    sched = LocalScheduler
+    statusbase = os.path.join(arraydir, str(index))
+    cancelfile = statusbase + sched.CANCEL_SUFFIX
+    slot = _acquireslot(slotdir, maxjobs, cancelfile)
+    if slot is None:
+        open(statusbase + sched.CANCELLED_SUFFIX, "w").close()
+        return
+    try:
+        open(statusbase + sched.RUNNING_SUFFIX, "w").close()
+        calc = vspcalc.SimpleCalculator(workdir, cmdline)
+        returncode = calc.execute(lambda: os.path.exists(cancelfile),
+                                  sched.WAIT_INTERVAL)
+        if returncode is None:
+            open(statusbase + sched.CANCELLED_SUFFIX, "w").close()
+        else:
+            with open(statusbase + sched.DONE_SUFFIX, "w") as fp:
+                fp.write("%d\n" % returncode)
+    finally:
+        slot.close()
+
+
+def _runarray(arraydir):
+    """Executes the jobs of an array stored by LocalScheduler.submit().
+
+    Args:
+        arraydir: Directory of the job array.
+    """
+    with open(os.path.join(arraydir, LocalScheduler.JOBFILE), "rb") as fp:
+        array = pickle.load(fp)
+    maxjobs = array["maxjobs"]
+    slotdir = os.path.join(os.path.dirname(arraydir), LocalScheduler.SLOTDIR)
+    os.makedirs(slotdir, exist_ok=True)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxjobs)
+    futures = [ executor.submit(_runjob, arraydir, slotdir, maxjobs, index,
+                                workdir, cmdline)
+                for index, (workdir, cmdline) in enumerate(array["jobs"]) ]
+    for index, future in enumerate(futures):
+        try:
+            future.result()
+        except Exception as ex:
+            sys.stderr.write("Job %d: %s\n" % (index, str(ex)))
+            failedfile = str(index) + LocalScheduler.FAILED_SUFFIX
+            with open(os.path.join(arraydir, failedfile), "w") as fp:
+                fp.write("%s\n" % str(ex))
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    _runarray(sys.argv[1])
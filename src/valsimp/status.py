@@ -0,0 +1,307 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Persistent store for the status of the test cases.
+
+The status of the actions (together with the resources they used), the log
+and the fingerprint of all test cases are kept in one SQLite database under
+the work root. The database serves also as persistent cache for the file
+hashes needed to calculate the fingerprints. Every update is carried out in a
+transaction, so that simultaneous writers (threads of the same process or
+different processes) can not corrupt the data. The status of any number of
+test cases can be retrieved together, without a query for each of them.
+
+Additionally, the wall clock times of the last executions of each action are
+kept as history (even if the test case is removed), so that the duration of
+the next execution can be estimated.
+"""
+import json
+import sqlite3
+import threading
+
+__all__ = [ "StatusStore", ]
+
+
+class StatusStore:
+    """Status store for test cases based on an SQLite database."""
+
+    # Seconds to wait for a lock held by an other process
+    TIMEOUT = 60.0
+    # Version of the database layout
+    VERSION = 1
+    # Nr. of durations kept in the history for each test case and action
+    HISTORY_LENGTH = 5
+    # Maximal nr. of test case names passed as parameters to one query
+    MAX_PARAMETERS = 500
+
+    _SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS testcases ("
+        " name TEXT PRIMARY KEY, log TEXT NOT NULL DEFAULT '',"
+        " fingerprint TEXT)",
+        "CREATE TABLE IF NOT EXISTS status ("
+        " testcase TEXT NOT NULL REFERENCES testcases(name) ON DELETE CASCADE,"
+        " action TEXT NOT NULL, status INTEGER NOT NULL, timing TEXT,"
+        " PRIMARY KEY (testcase, action))",
+        "CREATE TABLE IF NOT EXISTS filehashes ("
+        " path TEXT PRIMARY KEY, size INTEGER NOT NULL,"
+        " mtime INTEGER NOT NULL, digest TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS durations ("
+        " id INTEGER PRIMARY KEY, testcase TEXT NOT NULL,"
+        " action TEXT NOT NULL, wall REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS durations_testcase"
+        " ON durations (testcase, action)",
+    ]
+
+    def __init__(self, fname):
+        """Initializes a StatusStore instance.
+
+        Args:
+            fname: Name of the database file. It is created if not present.
+        """
+        self.fname = fname
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(fname, timeout=self.TIMEOUT,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        with self._transaction() as cursor:
+            for statement in self._SCHEMA:
+                cursor.execute(statement)
+            cursor.execute("PRAGMA user_version = %d" % self.VERSION)
+
+    def close(self):
+        """Closes the database."""
+        with self._lock:
+            self._db.close()
+
+    def load(self, testcase):
+        """Returns the stored data of a test case.
+
+        Args:
+            testcase: Name of the test case.
+
+        Returns:
+            Tuple (status, log, fingerprint, timings) with a dictionary
+            mapping the actions to their status, the log text, the fingerprint
+            of the inputs and a dictionary mapping the actions to the
+            resources they used (see PhaseTimer), or None if the test case is
+            not stored.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT log, fingerprint, action, status, timing "
+                "FROM testcases "
+                "LEFT JOIN status ON status.testcase = testcases.name "
+                "WHERE name = ?", (testcase,)).fetchall()
+        if not rows:
+            return None
+        result = ({}, rows[0][0], rows[0][1], {})
+        for _, _, action, status, timing in rows:
+            if action is not None:
+                result[0][action] = status
+            if timing is not None:
+                result[3][action] = json.loads(timing)
+        return result
+
+    def loadall(self, testcases=None, logs=True):
+        """Returns the stored data of several test cases together.
+
+        Args:
+            testcases: Optional, names of the test cases (def.: all stored
+                test cases).
+            logs: Optional, whether the logs should be loaded as well. If
+                False, the log of each test case is returned as None and can
+                be loaded separately via loadlog(). (def.: True)
+
+        Returns:
+            Dictionary mapping the name of each stored test case to a tuple
+            (status, log, fingerprint, timings) as returned by load(). Test
+            cases not present in the store are omitted.
+        """
+        query = ("SELECT name, %s, fingerprint, action, status, timing "
+                 "FROM testcases "
+                 "LEFT JOIN status ON status.testcase = testcases.name"
+                 % ("log" if logs else "NULL"))
+        rows = self._select(query, "name", testcases)
+        result = {}
+        for name, log, fingerprint, action, status, timing in rows:
+            if name not in result:
+                result[name] = ({}, log, fingerprint, {})
+            if action is not None:
+                result[name][0][action] = status
+            if timing is not None:
+                result[name][3][action] = json.loads(timing)
+        return result
+
+    def loadlog(self, testcase):
+        """Returns the stored log of a test case.
+
+        Args:
+            testcase: Name of the test case.
+
+        Returns:
+            Log text or None if the test case is not stored.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT log FROM testcases WHERE name = ?",
+                                   (testcase,)).fetchone()
+        return None if row is None else row[0]
+
+    def save(self, testcase, status, log, fingerprint=None, timings=None,
+             durations=None):
+        """Stores the data of a test case.
+
+        Args:
+            testcase: Name of the test case.
+            status: Dictionary mapping the actions to their status.
+            log: Log text of the test case.
+            fingerprint: Optional, fingerprint of the inputs of the test case.
+            timings: Optional, dictionary mapping the actions to the resources
+                they used. Actions not contained have no timing stored.
+            durations: Optional, dictionary mapping actions to the wall clock
+                time of their recent execution, which is added to the
+                history.
+        """
+        timings = timings or {}
+        with self._transaction() as cursor:
+            cursor.execute("INSERT OR IGNORE INTO testcases (name) VALUES (?)",
+                           (testcase,))
+            cursor.execute("UPDATE testcases SET log = ?, fingerprint = ? "
+                           "WHERE name = ?", (log, fingerprint, testcase))
+            cursor.executemany(
+                "INSERT OR REPLACE INTO status "
+                "(testcase, action, status, timing) VALUES (?, ?, ?, ?)",
+                [ (testcase, action, stat, _tojson(timings.get(action)))
+                  for action, stat in status.items() ])
+            for action, wall in (durations or {}).items():
+                cursor.execute("INSERT INTO durations (testcase, action, wall)"
+                               " VALUES (?, ?, ?)", (testcase, action, wall))
+                cursor.execute(
+                    "DELETE FROM durations WHERE testcase = ? AND action = ?"
+                    " AND id NOT IN (SELECT id FROM durations"
+                    " WHERE testcase = ? AND action = ?"
+                    " ORDER BY id DESC LIMIT ?)",
+                    (testcase, action, testcase, action, self.HISTORY_LENGTH))
+
+    def loaddurations(self, testcases=None):
+        """Returns the history of the durations of several test cases.
+
+        Args:
+            testcases: Optional, names of the test cases (def.: all test
+                cases with history).
+
+        Returns:
+            Dictionary mapping the name of each test case with history to a
+            dictionary, which maps the actions to the list of their recorded
+            wall clock times (most recent first).
+        """
+        rows = self._select("SELECT testcase, action, wall FROM durations",
+                            "testcase", testcases, " ORDER BY id DESC")
+        result = {}
+        for testcase, action, wall in rows:
+            result.setdefault(testcase, {}).setdefault(action, []).append(wall)
+        return result
+
+    def remove(self, testcase):
+        """Removes a test case from the store.
+
+        Args:
+            testcase: Name of the test case.
+        """
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM testcases WHERE name = ?", (testcase,))
+
+    def loadfilehashes(self):
+        """Returns all cached file hashes.
+
+        Returns:
+            Dictionary mapping absolute file names to tuples (size, mtime,
+            digest), where mtime is the modification time in nanoseconds.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT path, size, mtime, digest "
+                                    "FROM filehashes").fetchall()
+        return dict([ (row[0], row[1:]) for row in rows ])
+
+    def savefilehashes(self, hashes):
+        """Stores file hashes in the cache.
+
+        Args:
+            hashes: List of (path, size, mtime, digest) tuples.
+        """
+        with self._transaction() as cursor:
+            cursor.executemany("INSERT OR REPLACE INTO filehashes "
+                               "(path, size, mtime, digest) "
+                               "VALUES (?, ?, ?, ?)", hashes)
+
+    def _select(self, query, column, testcases, suffix=""):
+        """Executes a query, restricted to given test cases if specified.
+
+        Args:
+            query: Query without WHERE clause.
+            column: Column containing the name of the test case.
+            testcases: Names of the test cases or None for all test cases.
+            suffix: Optional, clause appended to the query after the
+                restriction (e.g. ORDER BY).
+
+        Returns:
+            List of the selected rows. If the test cases are specified, the
+            order set by suffix only applies to the rows of each test case.
+        """
+        if testcases is None:
+            with self._lock:
+                return self._db.execute(query + suffix).fetchall()
+        names = sorted(set(testcases))
+        rows = []
+        with self._lock:
+            for start in range(0, len(names), self.MAX_PARAMETERS):
+                chunk = names[start:start + self.MAX_PARAMETERS]
+                rows += self._db.execute(
+                    "%s WHERE %s IN (%s)%s"
+                    % (query, column, ",".join([ "?" ] * len(chunk)), suffix),
+                    chunk).fetchall()
+        return rows
+
+    def _transaction(self):
+        """Returns a context manager executing its block in a transaction."""
+        return _Transaction(self._db, self._lock)
+
+
+
+def _tojson(value):
+    """Returns the JSON representation of a value (None for None)."""
+    if value is None:
+        return None
+    return json.dumps(value)
+
+
+
+class _Transaction:
+    """Context manager for a write transaction on an SQLite connection."""
+
+    def __init__(self, db, lock):
+        self._db = db
+        self._lock = lock
+        self._cursor = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._cursor = self._db.cursor()
+            self._cursor.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self._lock.release()
+            raise
+        return self._cursor
+
+    def __exit__(self, exctype, excvalue, traceback):
+        try:
+            if exctype is None:
+                self._cursor.execute("COMMIT")
+            else:
+                self._cursor.execute("ROLLBACK")
+        finally:
+            self._cursor.close()
+            self._lock.release()
+        return False
@@ -2,6 +2,7 @@
 # This file is part of the ValSimP package.
 # See the packages LICENSE file for copyright and licensing conditions.
 ###############################################################################
+import asyncio
 import valsimp as vsp
 
 class SimpleTestcase(vsp.Testcase):
@@ -35,6 +36,32 @@ class SimpleTestcase(vsp.Testcase):
         """Calls the calculators runfinished() method."""
         return self.calculator.runfinished()
 
+    async def arun(self):
+        """Calls the calculators arun() method.
+
+        If the calculator has no arun() method, its run() method is called in
+        a worker thread.
+        """
+        arun = getattr(self.calculator, "arun", None)
+        if arun:
+            await arun()
+        else:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.calculator.run)
+
+    async def waitfinished(self, interval=1.0):
+        """Calls the calculators waitfinished() method.
+
+        If the calculator has no waitfinished() method, its runfinished()
+        method is polled instead.
+        """
+        waitfinished = getattr(self.calculator, "waitfinished", None)
+        if waitfinished:
+            await waitfinished(interval)
+        else:
+            while not self.calculator.runfinished():
+                await asyncio.sleep(interval)
+
     def test(self):
         """Calls the testers test() method."""
         return self.tester.test()
@@ -42,3 +69,24 @@ class SimpleTestcase(vsp.Testcase):
     def cleanup(self):
         """Calls the preparators cleanup() method."""
         self.preparator.cleanup()
+
+    def resources(self):
+        """Calls the calculators resources() method.
+
+        Returns None (default resources), if the calculator has no
+        resources() method.
+        """
+        getresources = getattr(self.calculator, "resources", None)
+        return getresources() if getresources else None
+
+    def dependencies(self):
+        """Collects the dependencies of preparator, calculator and tester.
+
+        Components without a dependencies() method do not contribute.
+        """
+        deps = []
+        for component in (self.preparator, self.calculator, self.tester):
+            getdeps = getattr(component, "dependencies", None)
+            if getdeps:
+                deps += getdeps()
+        return deps
@@ -2,6 +2,9 @@
 # This file is part of the ValSimP package.
 # See the packages LICENSE file for copyright and licensing conditions.
 ###############################################################################
+import re
+import numpy as np
+import valsimp.files.taggedfile as tf
 
 class SimpleTester:
     """Abstract tester class for testers with the same initialization."""
@@ -18,3 +21,312 @@ class SimpleTester:
 
     def test(self):
         raise NotImplementedError
+
+    def dependencies(self):
+        """Returns the files the test depends on (def.: empty list)."""
+        return []
+
+
+
+class TaggedTester(SimpleTester):
+    """Tester comparing the entries of a tagged result file with a reference.
+
+    Every entry of the reference file must be present in the result file with
+    the same type and shape. Numerical entries pass, if the deviation of each
+    element is not larger than abstol + reltol * |reference value|. Logical
+    entries must be equal.
+    """
+
+    def __init__(self, *, log, abstol, reference, result, reltol=0.0,
+                 tolerances=None, cache=None):
+        """Initializes a TaggedTester instance.
+
+        Keywords:
+           log: Logger object for messages during testing.
+           abstol: Default absolute tolerance for differences.
+           reference: Name of the tagged file with the reference data.
+           result: Name of the tagged file with the results.
+           reltol: Default relative tolerance for differences (def.: 0.0)
+           tolerances: List of (pattern, abstol, reltol) tuples, specifying
+               the tolerances for the entries whose name matches the regular
+               expression pattern. The first matching pattern is used,
+               entries not matching any pattern get the default tolerances.
+           cache: TaggedCache object to use when reading the reference file.
+        """
+        SimpleTester.__init__(self, log=log, abstol=abstol)
+        self.reference = reference
+        self.result = result
+        self.reltol = reltol
+        self.tolerances = [ (re.compile(pattern), atol, rtol)
+                            for pattern, atol, rtol in (tolerances or []) ]
+        self.cache = cache
+
+
+    def test(self):
+        """Compares the entries of the result file with the reference.
+
+        Returns:
+            True if all entries are within tolerance, False otherwise.
+        """
+        if self.cache:
+            reference = self.cache.load(self.reference)
+        else:
+            reference = tf.LazyTaggedCollection(self.reference)
+        result = tf.LazyTaggedCollection(self.result)
+        passed = True
+        for refentry in reference:
+            entry = result.get(refentry.name)
+            if entry is None:
+                self.log.testfailure("%s: missing" % refentry.name)
+                passed = False
+            elif not refentry.iscomparable(entry):
+                self.log.testfailure("%s: incompatible (%s vs. %s)"
+                                     % (refentry.name, entry.tagline,
+                                        refentry.tagline))
+                passed = False
+            else:
+                passed = self.compare(refentry, entry) and passed
+        return passed
+
+
+    def dependencies(self):
+        """Returns the reference file."""
+        return [ self.reference, ]
+
+
+    def gettolerances(self, name):
+        """Returns the tolerances for a given entry.
+
+        Args:
+            name: Name of the entry.
+
+        Returns:
+            Tuple (abstol, reltol).
+        """
+        for pattern, abstol, reltol in self.tolerances:
+            if pattern.match(name):
+                return abstol, reltol
+        return self.abstol, self.reltol
+
+
+    def compare(self, refentry, entry):
+        """Compares two comparable entries and logs the result.
+
+        Args:
+            refentry: Entry with the reference data.
+            entry: Entry with the data to check.
+
+        Returns:
+            True if entry is within tolerance, False otherwise.
+        """
+        abstol, reltol = self.gettolerances(refentry.name)
+        stats = self._deviations(np.ravel(refentry.data), np.ravel(entry.data),
+                                 abstol, reltol)
+        return self._report(refentry, *stats)
+
+
+    @staticmethod
+    def _deviations(ref, res, abstol, reltol):
+        """Determines deviations between two one dimensional arrays.
+
+        Args:
+            ref: Reference values.
+            res: Values to check.
+            abstol: Absolute tolerance.
+            reltol: Relative tolerance.
+
+        Returns:
+            Tuple (nfailed, imax, maxdiff) with the nr. of values out of
+            tolerance, the index of the maximal deviation and the maximal
+            deviation. (For logical values, imax is the index of the first
+            difference and maxdiff is zero.)
+        """
+        if not ref.size:
+            return 0, 0, 0.0
+        if ref.dtype == bool:
+            failed = ref != res
+            return np.count_nonzero(failed), np.argmax(failed), 0.0
+        # NaNs only match NaNs and infinities only equal infinities at the
+        # same position
+        matching = (np.isnan(ref) & np.isnan(res)) | (ref == res)
+        with np.errstate(invalid="ignore"):
+            diff = np.abs(res - ref).astype(float, copy=False)
+            diff[matching] = 0.0
+            tolerance = abstol + reltol * np.abs(ref)
+        # The tolerance is meaningless for infinite reference values
+        failed = (~(diff <= tolerance) | np.isinf(ref)) & ~matching
+        nfailed = np.count_nonzero(failed)
+        if nfailed:
+            diff[np.isnan(diff)] = np.inf
+        imax = np.argmax(diff)
+        return nfailed, imax, diff[imax]
+
+
+    def _report(self, refentry, nfailed, imax, maxdiff):
+        """Logs the result of a comparison.
+
+        Args:
+            refentry: Entry with the reference data.
+            nfailed: Nr. of values out of tolerance.
+            imax: Flat index of the maximal deviation (or of the first
+                difference for logical values).
+            maxdiff: Maximal deviation.
+
+        Returns:
+            True if all values were within tolerance, False otherwise.
+        """
+        if 0 in refentry.shape:
+            self.log.testsuccess("%s: empty" % refentry.name)
+            return True
+        ind = self._indexstr(np.unravel_index(imax, refentry.shape))
+        if refentry.dtype == "logical":
+            if nfailed:
+                self.log.testfailure("%s: %d value(s) differ, first at %s"
+                                     % (refentry.name, nfailed, ind))
+            else:
+                self.log.testsuccess("%s: equal" % refentry.name)
+            return not nfailed
+        msg = "%s: max. deviation %.3E at %s" % (refentry.name, maxdiff, ind)
+        if nfailed:
+            self.log.testfailure("%s, %d value(s) out of tolerance"
+                                 % (msg, nfailed))
+        else:
+            self.log.testsuccess(msg)
+        return not nfailed
+
+
+    @staticmethod
+    def _indexstr(ind):
+        """Returns the string representation of an array index."""
+        return "(%s)" % ",".join([ str(ii) for ii in ind ])
+
+
+
+class StreamingTaggedTester(TaggedTester):
+    """Tagged tester, comparing the files without loading them into memory.
+
+    Reference and result files are read in parallel, entry by entry and for
+    large entries chunk by chunk, keeping only the running statistics of the
+    deviations. The memory needed is therefore independent of the file size.
+    The entries must appear in the same order in both files. Additional
+    entries in the result file are skipped, reference entries which can not
+    be found in the remaining part of the result file are reported as
+    missing.
+    """
+
+    def __init__(self, *, log, abstol, reference, result, reltol=0.0,
+                 tolerances=None, chunksize=None):
+        """Initializes a StreamingTaggedTester instance.
+
+        Keywords:
+           log: Logger object for messages during testing.
+           abstol: Default absolute tolerance for differences.
+           reference: Name of the tagged file with the reference data.
+           result: Name of the tagged file with the results.
+           reltol: Default relative tolerance for differences (def.: 0.0)
+           tolerances: Tolerances for specific entries (see TaggedTester).
+           chunksize: Nr. of bytes to read at once from each file.
+        """
+        TaggedTester.__init__(self, log=log, abstol=abstol,
+                              reference=reference, result=result,
+                              reltol=reltol, tolerances=tolerances)
+        self.chunksize = chunksize
+
+
+    def test(self):
+        """Compares the entries of the result file with the reference.
+
+        Returns:
+            True if all entries are within tolerance, False otherwise.
+        """
+        with tf.TaggedStreamReader(self.reference, self.chunksize) as ref:
+            with tf.TaggedStreamReader(self.result, self.chunksize) as res:
+                return self._comparestreams(ref, res)
+
+
+    def _comparestreams(self, reference, result):
+        """Compares the entries delivered by two stream readers.
+
+        Args:
+            reference: TaggedStreamReader for the reference file.
+            result: TaggedStreamReader for the result file.
+
+        Returns:
+            True if all entries are within tolerance, False otherwise.
+        """
+        passed = True
+        entry = next(result, None)
+        for refentry in reference:
+            while entry is not None and entry.name != refentry.name:
+                entry = next(result, None)
+            if entry is None:
+                self.log.testfailure("%s: missing" % refentry.name)
+                passed = False
+            elif not refentry.iscomparable(entry):
+                self.log.testfailure("%s: incompatible (%s vs. %s)"
+                                     % (refentry.name, entry.tagline,
+                                        refentry.tagline))
+                passed = False
+            else:
+                passed = self.compare(refentry, entry) and passed
+            entry = next(result, None)
+        return passed
+
+
+    def compare(self, refentry, entry):
+        """Compares two comparable streamed entries and logs the result.
+
+        Args:
+            refentry: Streamed entry with the reference data.
+            entry: Streamed entry with the data to check.
+
+        Returns:
+            True if entry is within tolerance, False otherwise.
+        """
+        abstol, reltol = self.gettolerances(refentry.name)
+        nfailed = 0
+        imax = 0
+        maxdiff = -1.0
+        offset = 0
+        for ref, res in _alignedchunks(refentry.chunks(), entry.chunks()):
+            chunkfailed, chunkimax, chunkmax = self._deviations(
+                ref, res, abstol, reltol)
+            if refentry.dtype == "logical":
+                if chunkfailed and not nfailed:
+                    imax = offset + chunkimax
+            elif chunkmax > maxdiff:
+                imax = offset + chunkimax
+                maxdiff = chunkmax
+            nfailed += chunkfailed
+            offset += len(ref)
+        return self._report(refentry, nfailed, imax, max(maxdiff, 0.0))
+
+
+
+def _alignedchunks(chunks1, chunks2):
+    """Generator delivering pairs of equally long parts of two data streams.
+
+    Args:
+        chunks1: Iterator over the 1D array chunks of the first stream.
+        chunks2: Iterator over the 1D array chunks of the second stream.
+
+    Yields:
+        Tuple of two 1D arrays with the same length.
+
+    Raises:
+        InvalidEntryError: If the streams contain different nr. of values.
+    """
+    data1 = data2 = np.empty(0)
+    while True:
+        if not len(data1):
+            data1 = next(chunks1, None)
+        if not len(data2):
+            data2 = next(chunks2, None)
+        if data1 is None or data2 is None:
+            break
+        nn = min(len(data1), len(data2))
+        yield data1[:nn], data2[:nn]
+        data1 = data1[nn:]
+        data2 = data2[nn:]
+    if data1 is not None or data2 is not None:
+        raise tf.InvalidEntryError(msg="Different nr. of values")
@@ -0,0 +1,148 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Persistent index of the directories in a test tree.
+
+Matching test case patterns with glob() lists every directory along the
+patterns, which can take long on large test trees on network filesystems.
+The index stores the subdirectories of every directory listed once together
+with the modification time of the directory. As adding, removing or renaming
+an entry changes the modification time of its parent directory, a directory
+has to be listed again only if its modification time changed, otherwise one
+stat() call is sufficient.
+"""
+import os
+import re
+import glob
+import pickle
+import fnmatch
+import tempfile
+
+__all__ = [ "TestIndex", ]
+
+# Characters making a pattern component a shell pattern
+_MAGIC = re.compile("[*?[]")
+
+
+class TestIndex:
+    """Persistent index of the directories in a test tree."""
+
+    # Version of the index file layout
+    VERSION = 1
+
+    def __init__(self, fname, testroot):
+        """Initializes a TestIndex instance.
+
+        Args:
+            fname: Name of the file storing the index. If it does not exist or
+                can not be read, the index starts empty.
+            testroot: Root directory of the test tree.
+        """
+        self.fname = fname
+        self.testroot = os.path.abspath(testroot)
+        self._entries = {}
+        self._changed = False
+        try:
+            with open(fname, "rb") as fp:
+                stored = pickle.load(fp)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return
+        if (stored.get("version") == self.VERSION
+                and stored.get("testroot") == self.testroot):
+            self._entries = stored["entries"]
+
+    def save(self):
+        """Writes the index into its file, if it had been changed.
+
+        Note:
+            If the file can not be written, the method silently returns.
+        """
+        if not self._changed:
+            return
+        try:
+            dirname = os.path.dirname(os.path.abspath(self.fname))
+            os.makedirs(dirname, exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(dir=dirname, prefix=".tmp")
+            with os.fdopen(fd, "wb") as fp:
+                pickle.dump({ "version": self.VERSION,
+                              "testroot": self.testroot,
+                              "entries": self._entries }, fp)
+            os.replace(tmpname, self.fname)
+        except OSError:
+            return
+        self._changed = False
+
+    def subdirs(self, reldir):
+        """Returns the subdirectories of a directory in the test tree.
+
+        Args:
+            reldir: Directory relative to the test root ("" for the root).
+
+        Returns:
+            Sorted list with the names of the subdirectories or an empty list,
+            if the directory does not exist.
+        """
+        absdir = os.path.join(self.testroot, reldir)
+        try:
+            mtime = os.stat(absdir).st_mtime_ns
+        except OSError:
+            if self._entries.pop(reldir, None) is not None:
+                self._changed = True
+            return []
+        entry = self._entries.get(reldir)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+        try:
+            with os.scandir(absdir) as it:
+                subdirs = sorted([ item.name for item in it
+                                   if item.is_dir() ])
+        except OSError:
+            subdirs = []
+        self._entries[reldir] = (mtime, subdirs)
+        self._changed = True
+        return subdirs
+
+    def glob(self, pattern):
+        """Returns the test directories matching a pattern.
+
+        The pattern is matched in the same way as by glob.glob(), but only
+        directories are returned.
+
+        Args:
+            pattern: Shell pattern relative to the test root.
+
+        Returns:
+            Sorted list with the matching directories relative to the test
+            root.
+        """
+        components = [ comp for comp in pattern.split("/") if comp ]
+        if (os.path.isabs(pattern) or not components
+                or [ comp for comp in components if comp in (".", "..") ]):
+            # Patterns leaving the test tree are not covered by the index
+            matches = glob.glob(os.path.join(self.testroot, pattern))
+            return sorted([ os.path.relpath(match, self.testroot)
+                            for match in matches if os.path.isdir(match) ])
+        reldirs = [ "", ]
+        for comp in components:
+            newdirs = []
+            for reldir in reldirs:
+                newdirs += [ os.path.join(reldir, name)
+                             for name in self._match(self.subdirs(reldir),
+                                                     comp) ]
+            reldirs = newdirs
+        return sorted(reldirs)
+
+    @staticmethod
+    def _match(names, pattern):
+        """Returns the names matching one component of a pattern.
+
+        As in glob.glob(), names starting with a dot are only matched by
+        patterns starting with a dot.
+        """
+        if not _MAGIC.search(pattern):
+            return [ name for name in names if name == pattern ]
+        regexp = re.compile(fnmatch.translate(pattern))
+        hidden = pattern.startswith(".")
+        return [ name for name in names
+                 if regexp.match(name) and (hidden or name[0] != ".") ]
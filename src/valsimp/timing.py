@@ -0,0 +1,189 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+"""Measurement of the resources used by the actions of the test cases.
+
+A PhaseTimer measures the wall clock time, the CPU time of the calling
+thread, the CPU time of the child processes (e.g. the simulation started by
+the calculator) and the peak memory usage while an action is carried out.
+Components can report the nr. of bytes they copied or parsed via count(),
+which is attributed to the timer active in the calling thread.
+
+Note:
+    CPU time and peak memory of the child processes are process wide
+    quantities. When several test cases are processed simultaneously, they
+    may contain contributions of the other test cases.
+"""
+import sys
+import csv
+import json
+import time
+import threading
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = [ "PhaseTimer", "count", "totaltime", "expectedtime", "slowest",
+            "writereport", ]
+
+# Quantities measured for each action
+FIELDS = ("wall", "cpu", "childcpu", "maxrss", "childmaxrss", "bytescopied",
+          "bytesparsed")
+
+# Factor converting ru_maxrss into bytes (it is given in kB on Linux)
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+# Timer receiving the byte counts of the current thread
+_active = threading.local()
+
+
+def count(kind, nbytes):
+    """Adds bytes to a counter of the timer active in the current thread.
+
+    Args:
+        kind: Kind of the bytes ('copied' or 'parsed').
+        nbytes: Nr. of bytes to add.
+    """
+    timer = getattr(_active, "timer", None)
+    if timer is not None:
+        timer.counters["bytes" + kind] += nbytes
+
+
+class PhaseTimer:
+    """Context manager measuring the resources used within its block.
+
+    Attributes:
+        result: Dictionary with the measured quantities (see FIELDS) after the
+            block had been left, None before. Times are given in seconds,
+            memory and counters in bytes. Quantities which can not be measured
+            on the current platform are None.
+        counters: Byte counters filled via count() while the block is active.
+    """
+
+    def __init__(self, counting=True):
+        """Initializes a PhaseTimer instance.
+
+        Args:
+            counting: Optional, whether the timer should receive the byte
+                counts of the current thread. It should be turned off, if
+                several timers are active in the same thread in an interleaved
+                way (e.g. in coroutines). (def.: True)
+        """
+        self.counting = counting
+        self.result = None
+        self.counters = { "bytescopied": 0, "bytesparsed": 0 }
+        self._previous = None
+        self._start = None
+
+
+    def __enter__(self):
+        if self.counting:
+            self._previous = getattr(_active, "timer", None)
+            _active.timer = self
+        self._start = (time.perf_counter(), time.thread_time(),
+                       _childcpu())
+        return self
+
+
+    def __exit__(self, exctype, excvalue, traceback):
+        wall, cpu, childcpu = self._start
+        if self.counting:
+            _active.timer = self._previous
+        self.result = { "wall": time.perf_counter() - wall,
+                        "cpu": time.thread_time() - cpu,
+                        "childcpu": None, "maxrss": None,
+                        "childmaxrss": None }
+        if resource is not None:
+            self.result["childcpu"] = _childcpu() - childcpu
+            self.result["maxrss"] = (resource.getrusage(resource.RUSAGE_SELF)
+                                     .ru_maxrss * _MAXRSS_UNIT)
+            self.result["childmaxrss"] = (
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+                * _MAXRSS_UNIT)
+        self.result.update(self.counters)
+        return False
+
+
+def _childcpu():
+    """Returns the CPU time used by the terminated child processes so far."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def totaltime(timings):
+    """Returns the total wall clock time of the actions of a test case.
+
+    Args:
+        timings: Dictionary mapping the actions to their measured quantities.
+
+    Returns:
+        Sum of the wall clock times in seconds.
+    """
+    return sum([ result["wall"] for result in timings.values() if result ])
+
+
+def expectedtime(durations):
+    """Estimates the wall clock time of the next execution of a test case.
+
+    Args:
+        durations: Dictionary mapping the actions to the lists of their
+            recorded wall clock times (as delivered by the status store).
+
+    Returns:
+        Sum of the median recorded times of the actions in seconds or None if
+        no times had been recorded.
+    """
+    walls = [ sorted(times) for times in durations.values() if times ]
+    if not walls:
+        return None
+    return sum([ (times[(len(times) - 1) // 2] + times[len(times) // 2]) / 2.0
+                 for times in walls ])
+
+
+def slowest(timings, nslowest):
+    """Returns the test cases with the largest total wall clock time.
+
+    Args:
+        timings: List of (testcase, timings) tuples, with timings being a
+            dictionary mapping the actions to their measured quantities.
+        nslowest: Nr. of test cases to return.
+
+    Returns:
+        List of (testcase, timings) tuples in descending order of the total
+        wall clock time.
+    """
+    ordered = sorted(timings, key=lambda item: totaltime(item[1]),
+                     reverse=True)
+    return ordered[:nslowest]
+
+
+def writereport(fname, timings):
+    """Writes a machine readable report about the measured quantities.
+
+    Args:
+        fname: Name of the report file. If it ends on '.csv', a CSV file with
+            one line per test case and action is written, otherwise a JSON
+            file.
+        timings: List of (testcase, timings) tuples, with timings being a
+            dictionary mapping the actions to their measured quantities.
+    """
+    if fname.endswith(".csv"):
+        with open(fname, "w", newline="") as fp:
+            writer = csv.writer(fp)
+            writer.writerow(("testcase", "action") + FIELDS)
+            for testcase, actions in timings:
+                for action, result in actions.items():
+                    writer.writerow([ testcase, action ]
+                                    + [ result.get(field)
+                                        for field in FIELDS ])
+    else:
+        report = [ { "testcase": testcase, "total": totaltime(actions),
+                     "actions": actions }
+                   for testcase, actions in timings ]
+        with open(fname, "w") as fp:
+            json.dump({ "testcases": report }, fp, indent=2)
+            fp.write("\n")
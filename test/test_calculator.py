@@ -0,0 +1,38 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+import os
+import asyncio
+import valsimp as vsp
+import valsimp.calculator as vspcalc
+
+
+class RunOnlyCalculator(vsp.Calculator):
+    """Calculator implementing only the synchronous interface."""
+
+    def __init__(self, workdir):
+        self.finishfile = os.path.join(workdir, "finished")
+
+    def run(self):
+        open(self.finishfile, "w").close()
+
+    def runfinished(self):
+        return os.path.exists(self.finishfile)
+
+
+def test_default_arun(tmp_path):
+    calculator = RunOnlyCalculator(str(tmp_path))
+    assert not calculator.runfinished()
+    asyncio.run(calculator.arun())
+    assert calculator.runfinished()
+    asyncio.run(asyncio.wait_for(calculator.waitfinished(0.01), 10.0))
+
+
+def test_simplecalculator_arun(tmp_path):
+    (tmp_path / "STDIN").write_text("hello\n")
+    calculator = vspcalc.SimpleCalculator(str(tmp_path), [ "cat", ])
+    asyncio.run(calculator.arun())
+    assert calculator.runfinished()
+    assert (tmp_path / "STDOUT").read_text() == "hello\n"
+    asyncio.run(asyncio.wait_for(calculator.waitfinished(0.01), 10.0))
@@ -0,0 +1,48 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+import os
+import sys
+import subprocess
+
+ROOTDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DRIVER = os.path.join(ROOTDIR, "bin", "valsimp")
+
+# Test case object implementing only the synchronous interface
+PLAIN_TESTCASE = """import os
+class PlainTestcase:
+    def prepare(self):
+        os.makedirs(ctx.workdir, exist_ok=True)
+    def run(self):
+        open(os.path.join(ctx.workdir, "finished"), "w").close()
+    def runfinished(self):
+        return os.path.exists(os.path.join(ctx.workdir, "finished"))
+    def test(self):
+        return True
+    def cleanup(self):
+        pass
+testcase = PlainTestcase()
+"""
+
+
+def _rundriver(*args):
+    """Runs the driver script and returns the completed process."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [ os.path.join(ROOTDIR, "src"), env.get("PYTHONPATH", "") ])
+    return subprocess.run([ sys.executable, DRIVER ] + list(args), env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          universal_newlines=True, timeout=120)
+
+
+def test_async_plain_testcase(tmp_path):
+    testdir = tmp_path / "tests" / "plain"
+    testdir.mkdir(parents=True)
+    (testdir / "valsimp.in").write_text(PLAIN_TESTCASE)
+    workroot = tmp_path / "work"
+    process = _rundriver("-t", str(tmp_path / "tests"), "-w", str(workroot),
+                         "--async", "plain")
+    assert process.returncode == 0, process.stdout
+    assert "plain:\trunning:\tOK" in process.stdout
+    assert (workroot / "plain" / "finished").exists()
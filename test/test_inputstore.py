@@ -0,0 +1,79 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+import os
+import stat
+import filecmp
+import valsimp.inputstore as vspis
+
+
+def _inputfiles(dirname, contents):
+    """Creates files with given contents and returns their names."""
+    os.makedirs(dirname, exist_ok=True)
+    fnames = []
+    for ii, content in enumerate(contents):
+        fname = os.path.join(dirname, "file%d" % ii)
+        with open(fname, "w") as fp:
+            fp.write(content)
+        fnames.append(fname)
+    return fnames
+
+
+def test_add(tmp_path):
+    store = vspis.InputStore(str(tmp_path / "store"))
+    fnames = _inputfiles(str(tmp_path / "input"), [ "abc", "abc", "def" ])
+    stored = [ store.add(fname) for fname in fnames ]
+    assert stored[0] == stored[1] != stored[2]
+    for fname, storedname in zip(fnames, stored):
+        assert storedname.startswith(store.storedir + os.sep)
+        assert filecmp.cmp(fname, storedname, shallow=False)
+        assert not os.stat(storedname).st_mode & stat.S_IWUSR
+    assert store.add(fnames[0]) == stored[0]
+
+
+def test_prune(tmp_path):
+    store = vspis.InputStore(str(tmp_path / "store"))
+    fnames = _inputfiles(str(tmp_path / "input"), [ "abc", "defgh" ])
+    stored = [ store.add(fname) for fname in fnames ]
+    os.link(stored[0], str(tmp_path / "linked"))
+    assert store.prune() == 5
+    assert os.path.exists(stored[0])
+    assert not os.path.exists(stored[1])
+    os.remove(str(tmp_path / "linked"))
+    assert store.prune() == 3
+    assert not os.path.exists(stored[0])
+
+
+def test_prune_cleaned(tmp_path):
+    store = vspis.InputStore(str(tmp_path / "store"))
+    fnames = _inputfiles(str(tmp_path / "input"), [ "abc", "defgh", "ij" ])
+    stored = [ store.add(fname) for fname in fnames ]
+    workdirs = [ tmp_path / "work1", tmp_path / "work2" ]
+    for workdir in workdirs:
+        workdir.mkdir()
+    os.link(stored[0], str(workdirs[0] / "shared"))
+    os.link(stored[0], str(workdirs[1] / "shared"))
+    os.link(stored[1], str(workdirs[0] / "own"))
+    (workdirs[0] / "output").write_text("result")
+    unused = store.hardlinked([ str(workdirs[0]), ])
+    assert unused == set(stored[:2])
+    for fname in os.listdir(str(workdirs[0])):
+        os.remove(str(workdirs[0] / fname))
+    # The file not linked from the cleaned directory is not checked
+    assert store.prune(unused) == 5
+    assert os.path.exists(stored[0]) and os.path.exists(stored[2])
+    assert not os.path.exists(stored[1])
+    assert not os.path.exists(os.path.dirname(stored[1]))
+    assert store.prune() == 2
+
+
+def test_missing_store(tmp_path):
+    store = vspis.InputStore(str(tmp_path / "store"))
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    os.link(_inputfiles(str(tmp_path / "input"), [ "abc", ])[0],
+            str(workdir / "linked"))
+    assert store.hardlinked([ str(workdir), ]) == set()
+    assert store.prune() == 0
+    assert not os.path.exists(store.storedir)
@@ -0,0 +1,110 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+import time
+import pytest
+import valsimp.scheduler as vspsched
+
+# Seconds to wait for the jobs to reach their final state
+TIMEOUT = 30.0
+
+# The processes executing the job arrays are detached on purpose
+detached = pytest.mark.filterwarnings(
+    "ignore:subprocess .* is still running:ResourceWarning")
+
+
+class RecordingScheduler(vspsched.Scheduler):
+    """Scheduler recording the submitted job arrays."""
+
+    def __init__(self, batchsize=None):
+        vspsched.Scheduler.__init__(self, batchsize)
+        self.arrays = []
+
+    def submit(self, jobs):
+        self.arrays.append(jobs)
+        return [ "%d.%d" % (len(self.arrays), ii) for ii in range(len(jobs)) ]
+
+
+class QueuedJob:
+    """Job as enqueued by a calculator."""
+
+    def __init__(self, workdir):
+        self.workdir = workdir
+        self.cmdline = [ "true", ]
+        self.jobid = None
+
+    def submitted(self, jobid):
+        self.jobid = jobid
+
+
+def _waitjobs(scheduler, jobids, finalstates):
+    """Polls the jobs until all of them reached one of the final states."""
+    deadline = time.monotonic() + TIMEOUT
+    while True:
+        states = scheduler.poll(jobids)
+        if (all([ state in finalstates for state in states.values() ])
+                or time.monotonic() > deadline):
+            return states
+        time.sleep(0.05)
+
+
+def test_batched_submission():
+    scheduler = RecordingScheduler(batchsize=2)
+    jobs = [ QueuedJob("job%d" % ii) for ii in range(3) ]
+    scheduler.enqueue(jobs[0])
+    assert scheduler.ispending(jobs[0]) and not scheduler.arrays
+    scheduler.enqueue(jobs[1])
+    scheduler.enqueue(jobs[2])
+    assert scheduler.arrays == [ [ ("job0", [ "true", ]),
+                                   ("job1", [ "true", ]) ] ]
+    assert scheduler.ispending(jobs[2])
+    scheduler.flush()
+    assert not scheduler.ispending(jobs[2])
+    assert [ job.jobid for job in jobs ] == [ "1.0", "1.1", "2.0" ]
+    scheduler.flush()
+    assert len(scheduler.arrays) == 2
+
+
+@detached
+def test_local_jobs(tmp_path):
+    workdirs = [ tmp_path / "job0", tmp_path / "job1" ]
+    for workdir in workdirs:
+        workdir.mkdir()
+    scheduler = vspsched.LocalScheduler(str(tmp_path / "spool"), maxjobs=1,
+                                        pollinterval=0.0)
+    jobids = scheduler.submit([ (str(workdir), [ "sh", "-c", "echo ok > out" ])
+                                for workdir in workdirs ])
+    states = _waitjobs(scheduler, jobids, [ vspsched.JOB_DONE, ])
+    assert list(states.values()) == [ vspsched.JOB_DONE ] * 2
+    for workdir in workdirs:
+        assert (workdir / "out").read_text() == "ok\n"
+    assert scheduler.poll([ "array_unknown.0", ]) \
+        == { "array_unknown.0": vspsched.JOB_UNKNOWN }
+
+
+@detached
+def test_cancelled_jobs(tmp_path):
+    workdirs = [ tmp_path / "job0", tmp_path / "job1" ]
+    for workdir in workdirs:
+        workdir.mkdir()
+    scheduler = vspsched.LocalScheduler(str(tmp_path / "spool"), maxjobs=1,
+                                        pollinterval=0.0)
+    jobids = scheduler.submit(
+        [ (str(workdirs[0]), [ "sleep", "60" ]),
+          (str(workdirs[1]), [ "sh", "-c", "echo ok > out" ]) ])
+    _waitjobs(scheduler, jobids[:1], [ vspsched.JOB_RUNNING, ])
+    # The second job is still waiting for the slot of the first one
+    scheduler.cancel(jobids)
+    states = _waitjobs(scheduler, jobids, [ vspsched.JOB_CANCELLED, ])
+    assert list(states.values()) == [ vspsched.JOB_CANCELLED ] * 2
+    assert not (workdirs[1] / "out").exists()
+
+
+@detached
+def test_failed_jobs(tmp_path):
+    scheduler = vspsched.LocalScheduler(str(tmp_path / "spool"),
+                                        pollinterval=0.0)
+    jobids = scheduler.submit([ (str(tmp_path / "missing"), [ "true", ]) ])
+    states = _waitjobs(scheduler, jobids, [ vspsched.JOB_FAILED, ])
+    assert states == { jobids[0]: vspsched.JOB_FAILED }
@@ -0,0 +1,81 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+import threading
+import valsimp.status as vspstat
+
+
+def test_save_and_load(tmp_path):
+    store = vspstat.StatusStore(str(tmp_path / "status.db"))
+    store.save("a/b", { "prepare": 0, "run": 1 }, "log a/b")
+    store.save("c", { "prepare": 0 }, "log c")
+    assert store.load("a/b")[:2] == ({ "prepare": 0, "run": 1 }, "log a/b")
+    assert store.load("d") is None
+    store.save("a/b", { "run": 0, "test": 2 }, "new log")
+    assert store.load("a/b")[:2] == ({ "prepare": 0, "run": 0, "test": 2 },
+                                     "new log")
+    store.remove("a/b")
+    assert store.load("a/b") is None
+    store.save("a/b", {}, "")
+    assert store.load("a/b")[:2] == ({}, "")
+    store.close()
+    store = vspstat.StatusStore(str(tmp_path / "status.db"))
+    assert store.load("c")[:2] == ({ "prepare": 0 }, "log c")
+    store.close()
+
+
+def test_loadall(tmp_path):
+    store = vspstat.StatusStore(str(tmp_path / "status.db"))
+    for ii in range(5):
+        store.save("case%d" % ii, { "run": ii }, "log %d" % ii)
+    result = store.loadall()
+    assert sorted(result) == [ "case%d" % ii for ii in range(5) ]
+    assert result["case3"][:2] == ({ "run": 3 }, "log 3")
+    result = store.loadall([ "case1", "case4", "missing" ])
+    assert sorted(result) == [ "case1", "case4" ]
+    assert result["case4"][:2] == ({ "run": 4 }, "log 4")
+    assert store.loadall([]) == {}
+    store.close()
+
+
+def test_threads(tmp_path):
+    store = vspstat.StatusStore(str(tmp_path / "status.db"))
+
+    def savecases(ithread):
+        for ii in range(20):
+            store.save("case%d.%d" % (ithread, ii), { "run": ii }, "")
+
+    threads = [ threading.Thread(target=savecases, args=(ii,))
+                for ii in range(4) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store.loadall()) == 80
+    store.close()
+
+
+def test_chunked_queries(tmp_path, monkeypatch):
+    monkeypatch.setattr(vspstat.StatusStore, "MAX_PARAMETERS", 3)
+    store = vspstat.StatusStore(str(tmp_path / "status.db"))
+    for ii in range(10):
+        store.save("case%d" % ii, { "run": ii }, "log %d" % ii,
+                   durations={ "run": float(ii) })
+    for wall in range(10):
+        store.save("case0", { "run": 0 }, "log 0",
+                   durations={ "run": 100.0 + wall, "test": 1.0 })
+    names = [ "case%d" % ii for ii in (8, 1, 2, 5, 1, 7, 3) ] + [ "none", ]
+    result = store.loadall(names)
+    assert sorted(result) == [ "case%d" % ii for ii in (1, 2, 3, 5, 7, 8) ]
+    assert result["case7"][:2] == ({ "run": 7 }, "log 7")
+    result = store.loadall(names, logs=False)
+    assert result["case7"][:2] == ({ "run": 7 }, None)
+    assert store.loadlog("case7") == "log 7"
+    durations = store.loaddurations([ "case0", "case6", "none" ])
+    assert durations == {
+        "case0": { "run": [ 109.0, 108.0, 107.0, 106.0, 105.0 ],
+                   "test": [ 1.0 ] * vspstat.StatusStore.HISTORY_LENGTH },
+        "case6": { "run": [ 6.0 ] } }
+    assert len(store.loaddurations()) == 10
+    store.close()
@@ -0,0 +1,84 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+import numpy as np
+import pytest
+import valsimp.files.taggedfile as tf
+
+
+def _fortranblock(values, perline, fmt="%23.15E"):
+    """Returns the values formatted like Fortran output with perline values."""
+    lines = []
+    for ii in range(0, len(values), perline):
+        lines.append("".join([ fmt % val for val in values[ii:ii + perline] ]))
+    return "\n".join(lines) + "\n"
+
+
+def test_fixedwidth_floats():
+    rng = np.random.default_rng(42)
+    values = (rng.standard_normal(3000)
+              * 10.0**rng.integers(-40, 40, size=3000))
+    values[:5] = [ 0.0, -1.0, 1e-99, -1.7e+99, 123.456 ]
+    # Complete lines and a trailing line with less values
+    text = _fortranblock(values, 4)
+    result = tf.FloatConverter().convertstring(text)
+    expected = np.array([ float(token) for token in text.split() ])
+    assert np.array_equal(result, expected)
+    assert np.allclose(result, values, rtol=1e-15, atol=0.0)
+    # Three digit exponents
+    text = _fortranblock([ 1e-300, -1.7e+300, 2.5e-120 ], 2, "%24.15E")
+    result = tf.FloatConverter().convertstring(text)
+    assert np.array_equal(result, [ 1e-300, -1.7e+300, 2.5e-120 ])
+
+
+def test_fixedwidth_floats_inexact():
+    # Mantissas with more digits than exactly representable
+    text = _fortranblock([ 1.0 / 3.0, -2.0 / 3.0, np.pi, 1e22 / 7.0 ], 2,
+                         "%28.19E")
+    result = tf.FloatConverter().convertstring(text)
+    assert np.array_equal(result,
+                          np.array([ float(token) for token in text.split() ]))
+
+
+def test_fortran_exponents():
+    text = "  0.1000D+01 -0.2500D-01\n  0.3000d+02  0.4000E+00\n"
+    result = tf.FloatConverter().convertstring(text)
+    assert np.array_equal(result, [ 1.0, -0.025, 30.0, 0.4 ])
+    text = "1.0D0 2\n -3.5d-1\n"
+    result = tf.FloatConverter().convertstring(text)
+    assert np.array_equal(result, [ 1.0, 2.0, -0.35 ])
+
+
+def test_free_format_floats():
+    text = "1.0 2.5e3\n  -7 0.125\n3.0e-2\n"
+    result = tf.FloatConverter().convertstring(text)
+    assert np.array_equal(result, [ 1.0, 2500.0, -7.0, 0.125, 0.03 ])
+
+
+def test_invalid_floats():
+    with pytest.raises(tf.ConversionError):
+        tf.FloatConverter().convertstring("1.0 2.0\n3.0 abc\n")
+
+
+def test_integers():
+    result = tf.IntConverter().convertstring(" 1 -2\n  3\n")
+    assert np.array_equal(result, [ 1, -2, 3 ])
+    with pytest.raises(tf.ConversionError):
+        tf.IntConverter().convertstring("1 2.5\n")
+
+
+def test_blank_blocks():
+    assert tf.FloatConverter().convertstring("\n   \n").shape == (0,)
+    assert tf.IntConverter().convertstring("").shape == (0,)
+    assert tf.ComplexConverter().convertstring("  \n").shape == (0,)
+
+
+def test_partial_bulk_conversion():
+    # NumPy stops silently at invalid tokens in the middle of the string
+    assert tf._fromstring(b"1.0 2.0 abc 4.0\n", float) is None
+    assert tf._fromstring(b"1.0 2.0 3.0x", float) is None
+    assert tf._fromstring(b"1 2 3.5 4", int) is None
+    assert np.array_equal(tf._fromstring(b"\t1 2\n 3 \n", int), [ 1, 2, 3 ])
+    with pytest.raises(tf.ConversionError):
+        tf.FloatConverter().convertstring("1.0 2.0 abc 4.0\n")
@@ -0,0 +1,29 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+import os
+import asyncio
+import valsimp.testcase as vsptc
+
+
+class PlainCalculator:
+    """Calculator without asynchronous methods and not derived from
+    Calculator."""
+
+    def __init__(self, workdir):
+        self.finishfile = os.path.join(workdir, "finished")
+
+    def run(self):
+        open(self.finishfile, "w").close()
+
+    def runfinished(self):
+        return os.path.exists(self.finishfile)
+
+
+def test_async_fallback(tmp_path):
+    testcase = vsptc.SimpleTestcase(None, PlainCalculator(str(tmp_path)),
+                                    None)
+    asyncio.run(testcase.arun())
+    assert testcase.runfinished()
+    asyncio.run(asyncio.wait_for(testcase.waitfinished(0.01), 10.0))
@@ -0,0 +1,121 @@
+###############################################################################
+# This file is part of the ValSimP package.
+# See the packages LICENSE file for copyright and licensing conditions.
+###############################################################################
+import io
+import numpy as np
+import valsimp.io.logger as vsplog
+import valsimp.tester as vsptester
+
+TAGGED_REFERENCE = """@energy           :real:1:3
+  1.0 2.0 1000.0
+@forces           :real:2:2,2
+  0.5 -0.5 nan 0.25
+@converged        :logical:1:2
+  T F
+@niter            :integer:1:1
+  12
+"""
+
+TAGGED_EMPTY = """@empty_real       :real:1:0
+@empty_logical    :logical:2:3,0
+@values           :real:1:2
+  1.0 2.0
+"""
+
+
+def _runtester(tmp_path, reference, result, **kwargs):
+    """Compares two tagged texts and returns the result and the log."""
+    reffile = tmp_path / "reference.tag"
+    resfile = tmp_path / "result.tag"
+    reffile.write_text(reference)
+    resfile.write_text(result)
+    fp = io.StringIO()
+    tester = vsptester.TaggedTester(log=vsplog.TestLogger(fp),
+                                    reference=str(reffile),
+                                    result=str(resfile), **kwargs)
+    return tester.test(), fp.getvalue()
+
+
+def test_identical_files(tmp_path):
+    passed, log = _runtester(tmp_path, TAGGED_REFERENCE, TAGGED_REFERENCE,
+                             abstol=0.0)
+    assert passed
+    assert "converged: equal" in log
+
+
+def test_tolerances(tmp_path):
+    result = TAGGED_REFERENCE.replace("1000.0", "1000.5")
+    passed, log = _runtester(tmp_path, TAGGED_REFERENCE, result, abstol=1e-8)
+    assert not passed
+    assert "energy: max. deviation 5.000E-01 at (2), 1 value(s)" in log
+    passed, _ = _runtester(tmp_path, TAGGED_REFERENCE, result, abstol=1e-8,
+                           reltol=1e-3)
+    assert passed
+    passed, _ = _runtester(tmp_path, TAGGED_REFERENCE, result, abstol=1e-8,
+                           tolerances=[ ("ener", 1.0, 0.0) ])
+    assert passed
+    passed, _ = _runtester(tmp_path, TAGGED_REFERENCE, result, abstol=1.0,
+                           tolerances=[ ("energy", 0.0, 0.0),
+                                        ("e", 1.0, 0.0) ])
+    assert not passed
+
+
+def test_nans(tmp_path):
+    result = TAGGED_REFERENCE.replace("nan", "0.0")
+    passed, log = _runtester(tmp_path, TAGGED_REFERENCE, result, abstol=1.0)
+    assert not passed
+    assert "forces: max. deviation INF at (1,0)" in log
+
+
+def test_logical_values(tmp_path):
+    result = TAGGED_REFERENCE.replace("T F", "T T")
+    passed, log = _runtester(tmp_path, TAGGED_REFERENCE, result, abstol=1.0)
+    assert not passed
+    assert "converged: 1 value(s) differ, first at (1)" in log
+
+
+def test_missing_and_incompatible_entries(tmp_path):
+    result = TAGGED_REFERENCE.replace("@niter", "@nsteps").replace(
+        ":real:1:3\n  1.0 2.0 1000.0", ":real:1:2\n  1.0 2.0")
+    passed, log = _runtester(tmp_path, TAGGED_REFERENCE, result, abstol=1.0)
+    assert not passed
+    assert "niter: missing" in log
+    assert "energy: incompatible" in log
+
+
+def test_empty_entries(tmp_path):
+    reference = tmp_path / "reference.tag"
+    result = tmp_path / "result.tag"
+    reference.write_text(TAGGED_EMPTY)
+    result.write_text(TAGGED_EMPTY)
+    fp = io.StringIO()
+    tester = vsptester.TaggedTester(log=vsplog.TestLogger(fp), abstol=1e-8,
+                                    reference=str(reference),
+                                    result=str(result))
+    assert tester.test()
+    log = fp.getvalue()
+    assert "empty_real: empty" in log
+    assert "empty_logical: empty" in log
+
+
+def test_empty_streamed_entries(tmp_path):
+    reference = tmp_path / "reference.tag"
+    result = tmp_path / "result.tag"
+    reference.write_text(TAGGED_EMPTY)
+    result.write_text(TAGGED_EMPTY)
+    tester = vsptester.StreamingTaggedTester(
+        log=vsplog.TestLogger(io.StringIO()), abstol=1e-8,
+        reference=str(reference), result=str(result))
+    assert tester.test()
+
+
+def test_infinities():
+    deviations = vsptester.TaggedTester._deviations
+    inf = float("inf")
+    nfailed, _, maxdiff = deviations(np.array([ inf, -inf, 1.0 ]),
+                                     np.array([ inf, -inf, 1.0 ]), 1e-8, 0.0)
+    assert nfailed == 0 and maxdiff == 0.0
+    nfailed, imax, _ = deviations(np.array([ 1.0, inf, inf ]),
+                                  np.array([ 1.0, -inf, 2.0 ]), 1e-8, 1e-3)
+    assert nfailed == 2 and imax in (1, 2)